@@ -8,7 +8,7 @@ from app.models import Base
 
 config = context.config
 
-fileConfig(config.config_file_name)
+fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 target_metadata = Base.metadata
 
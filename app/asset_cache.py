@@ -0,0 +1,218 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.redis_client import get_redis
+from app.single_flight import SingleFlight
+
+# Rough per-entry overhead of the key, tuple and OrderedDict node, counted on
+# top of the body so that many tiny entries cannot exceed the budget.
+ENTRY_OVERHEAD = 200
+
+
+class LocalAssetTier:
+    # One entry per user: the rendered body for the newest data version seen.
+    # Least recently used users are evicted once the bodies take more than
+    # max_bytes.
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, user_id: int, version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id: int, version: int, body: bytes) -> None:
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            current = self._entries.get(user_id)
+            if current is not None:
+                if current[0] > version:
+                    return
+                self.bytes -= len(current[1]) + ENTRY_OVERHEAD
+            self._entries[user_id] = (version, body)
+            self._entries.move_to_end(user_id)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= len(evicted) + ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def delete(self, user_id: int) -> None:
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self.bytes -= len(entry[1]) + ENTRY_OVERHEAD
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedAssetTier:
+    # Shared between workers through Redis, one key per user whose value is
+    # "<version>\n<body>", so invalidating a user is a single DEL.
+
+    def __init__(self, client, ttl: float, prefix: str = "cwd:assets:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, user_id: int, version: int) -> Optional[bytes]:
+        raw = self.client.get(f"{self.prefix}{user_id}")
+        if not raw:
+            return None
+        stored_version, _, body = raw.partition("\n")
+        if stored_version != str(version):
+            return None
+        return body.encode()
+
+    def set(self, user_id: int, version: int, body: bytes) -> None:
+        self.client.set(
+            f"{self.prefix}{user_id}",
+            f"{version}\n{body.decode()}",
+            ex=max(int(self.ttl), 1),
+        )
+
+    def delete(self, user_id: int) -> None:
+        self.client.delete(f"{self.prefix}{user_id}")
+
+
+class AssetCache:
+    """The rendered `GET /assets/` body per user and data version.
+
+    Every write, and every rebuild of the derived tables, bumps the data
+    version, so an entry is not served for data it does not reflect;
+    committed writes also drop the user's entries so memory is not held by
+    versions nobody will ask for.
+    Concurrent misses for the same user and version in one worker share a
+    single computation.
+    """
+
+    def __init__(self, local: Optional[LocalAssetTier], shared=None):
+        self.local = local
+        self.shared = shared
+        self._loads = SingleFlight()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def enabled(self) -> bool:
+        return self.local is not None or self.shared is not None
+
+    async def get_or_compute(
+        self, user_id: int, version: int, compute: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        if self.local is not None:
+            body = self.local.get(user_id, version)
+            if body is not None:
+                self.local_hits += 1
+                return body
+        key = (user_id, version)
+        task = self._loads.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self._loads.start(
+                [key], lambda: self._load(user_id, version, compute)
+            )
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id, version, compute) -> bytes:
+        if self.shared is not None:
+            body = self.shared.get(user_id, version)
+            if body is not None:
+                self.shared_hits += 1
+                if self.local is not None:
+                    self.local.set(user_id, version, body)
+                return body
+        self.misses += 1
+        body = await compute()
+        if self.local is not None:
+            self.local.set(user_id, version, body)
+        if self.shared is not None:
+            self.shared.set(user_id, version, body)
+        return body
+
+    def invalidate(self, user_id: int) -> None:
+        self.invalidations += 1
+        if self.local is not None:
+            self.local.delete(user_id)
+        if self.shared is not None:
+            self.shared.delete(user_id)
+
+    def clear(self) -> None:
+        if self.local is not None:
+            self.local.clear()
+
+    def stats(self) -> dict:
+        # Coalesced requests count as hits: they did not compute anything.
+        hits = self.local_hits + self.shared_hits + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "tiers": "+".join(
+                type(tier).__name__
+                for tier in (self.local, self.shared)
+                if tier is not None
+            ),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self.local) if self.local is not None else 0,
+            "bytes": self.local.bytes if self.local is not None else 0,
+            "max_bytes": self.local.max_bytes if self.local is not None else 0,
+            "evictions": self.local.evictions if self.local is not None else 0,
+        }
+
+
+def _build_cache() -> AssetCache:
+    local = None
+    if settings.ASSET_CACHE_MAX_BYTES > 0:
+        local = LocalAssetTier(settings.ASSET_CACHE_MAX_BYTES)
+    shared = None
+    client = get_redis()
+    if client is not None and settings.ASSET_CACHE_SHARED:
+        shared = SharedAssetTier(client, settings.ASSET_CACHE_TTL_SECONDS)
+    return AssetCache(local, shared)
+
+
+asset_cache = _build_cache()
+
+
+def record_write(db: Session, user_id: int) -> None:
+    db.info.setdefault("asset_cache_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_users(session):
+    for user_id in session.info.pop("asset_cache_users", ()):
+        asset_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_users(session):
+    session.info.pop("asset_cache_users", None)
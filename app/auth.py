@@ -1,11 +1,14 @@
+import hashlib
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Set
+from typing import Optional
 
 import jwt
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 
 from app.config import settings
+from app.revocation import build_revocation_store
 
 
 class Token(BaseModel):
@@ -15,9 +18,11 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: str | None = None
+    jti: str | None = None
+    exp: int | None = None
 
 
-logged_out_tokens: Set[str] = set()
+revocation_store = build_revocation_store()
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -29,26 +34,42 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
     )
     return encoded_jwt
 
 
+def token_id(token: str, payload: dict) -> str:
+    # Tokens issued before the jti claim existed are identified by their hash.
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
 def verify_token(token: str) -> Optional[TokenData]:
     default_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not verify token",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    if token in logged_out_tokens:
-        raise default_exception
 
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
-        return TokenData(**payload)
     except jwt.PyJWTError:
         raise default_exception
+
+    if revocation_store.is_revoked(token_id(token, payload)):
+        raise default_exception
+    return TokenData(**payload)
+
+
+def revoke_token(token: str) -> None:
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+    except jwt.PyJWTError:
+        return
+    revocation_store.revoke(token_id(token, payload), payload["exp"])
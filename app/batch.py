@@ -0,0 +1,284 @@
+from typing import List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import crud, events, history, holdings, lots, models, schemas
+
+_EVENT_SUFFIX = {"create": "created", "update": "updated", "delete": "deleted"}
+
+
+def _check(operation, existing: dict, owner_id: int, seen: set) -> Optional[tuple]:
+    # Returns (status, detail) for an operation that cannot be applied.
+    if operation.op == "create":
+        if operation.id is not None:
+            return 422, "id must not be set for create"
+    else:
+        if operation.id is None:
+            return 422, f"id is required for {operation.op}"
+        if operation.id in seen:
+            return 422, "id appears more than once in the batch"
+        seen.add(operation.id)
+        row = existing.get(operation.id)
+        if row is None:
+            return 404, "Not found"
+        if row.owner_id != owner_id:
+            return 403, f"You do not have permission to {operation.op} this item"
+    if operation.op != "delete" and operation.data is None:
+        return 422, f"data is required for {operation.op}"
+    return None
+
+
+def _result(index: int, operation, status: int, detail: Optional[str] = None):
+    return {
+        "index": index,
+        "op": operation.op,
+        "id": operation.id,
+        "status": status,
+        "detail": detail,
+    }
+
+
+def _enum_value(value):
+    return getattr(value, "value", value)
+
+
+def _deltas(row: dict, sign: int) -> list:
+    if row["platform_id"] is None:
+        return []
+    return [
+        (key, sign * amount, sign * cost)
+        for key, amount, cost in holdings.transaction_deltas(
+            row["asset_name"],
+            row["cost_asset"],
+            row["transaction_type"],
+            row["platform_id"],
+            row["amount"],
+            row["cost"],
+        )
+    ]
+
+
+def apply_transactions(
+    db: Session, user_id: int, operations: List[schemas.TransactionOperation]
+) -> dict:
+    transaction = models.Transaction
+    ids = {operation.id for operation in operations if operation.id is not None}
+    existing = {}
+    if ids:
+        existing = {
+            row.id: row
+            for row in db.execute(
+                select(*transaction.__table__.columns).where(transaction.id.in_(ids))
+            )
+        }
+    platform_ids = {
+        operation.data.platform_id for operation in operations if operation.data
+    }
+    owned_platforms = set()
+    if platform_ids:
+        owned_platforms = set(
+            db.scalars(
+                select(models.Platform.id).where(
+                    models.Platform.owner_id == user_id,
+                    models.Platform.id.in_(platform_ids),
+                )
+            )
+        )
+
+    results = []
+    creates, updates, deletes = [], [], []
+    seen = set()
+    for index, operation in enumerate(operations):
+        error = _check(operation, existing, user_id, seen)
+        if error is None and operation.data is not None:
+            try:
+                models.TransactionType(operation.data.transaction_type)
+            except ValueError:
+                error = 422, "transaction_type: invalid value"
+            else:
+                if operation.data.platform_id not in owned_platforms:
+                    error = 422, "platform_id: platform not found"
+        if error is not None:
+            results.append(_result(index, operation, *error))
+            continue
+        results.append(None)
+        {"create": creates, "update": updates, "delete": deletes}[operation.op].append(
+            (index, operation)
+        )
+
+    deltas, keys, days = [], [], {}
+
+    def track(row: dict, sign: int) -> None:
+        deltas.extend(_deltas(row, sign))
+        keys.extend(
+            lots.position_keys(
+                row["asset_name"],
+                row["cost_asset"],
+                row["transaction_type"],
+                row["platform_id"],
+            )
+        )
+        history.touch(days, row["platform_id"], row["date"])
+
+    if creates:
+        rows = [
+            {**operation.data.model_dump(), "owner_id": user_id}
+            for _, operation in creates
+        ]
+        new_ids = db.scalars(
+            insert(transaction).returning(transaction.id, sort_by_parameter_order=True),
+            rows,
+        ).all()
+        for (index, operation), row, new_id in zip(creates, rows, new_ids):
+            row["id"] = new_id
+            track(row, 1)
+            results[index] = {
+                **_result(index, operation, 201),
+                "id": new_id,
+                "transaction": row,
+            }
+
+    if updates:
+        parameters = []
+        for index, operation in updates:
+            old = dict(existing[operation.id]._mapping)
+            values = operation.data.model_dump(exclude_unset=True)
+            new = {**old, **values}
+            track(old, -1)
+            track(new, 1)
+            parameters.append({"id": operation.id, **values})
+            results[index] = {**_result(index, operation, 200), "transaction": new}
+        db.execute(update(transaction), parameters)
+
+    if deletes:
+        for index, operation in deletes:
+            old = dict(existing[operation.id]._mapping)
+            track(old, -1)
+            results[index] = {**_result(index, operation, 200), "transaction": old}
+        db.execute(
+            delete(transaction)
+            .where(transaction.id.in_([operation.id for _, operation in deletes]))
+            .execution_options(synchronize_session=False)
+        )
+
+    for result in results:
+        row = result.get("transaction")
+        if row is not None:
+            row["transaction_type"] = _enum_value(row["transaction_type"])
+            events.record(
+                db,
+                user_id,
+                f"transaction.{_EVENT_SUFFIX[result['op']]}",
+                events.serialize(schemas.TransactionResponse, row),
+            )
+
+    holdings.apply_deltas(db, user_id, deltas)
+    events.record_deltas(db, user_id, deltas)
+    lots.mark_stale(db, user_id, keys)
+    lots.refresh(db, user_id)
+    history.recompute(db, user_id, days)
+    if creates or updates or deletes:
+        crud.bump_data_version(db, user_id)
+    db.commit()
+    return _summary(results)
+
+
+def apply_platforms(
+    db: Session, user_id: int, operations: List[schemas.PlatformOperation]
+) -> dict:
+    platform = models.Platform
+    ids = {operation.id for operation in operations if operation.id is not None}
+    existing = {}
+    if ids:
+        existing = {
+            row.id: row
+            for row in db.execute(
+                select(*platform.__table__.columns).where(platform.id.in_(ids))
+            )
+        }
+
+    results = []
+    creates, updates, deletes = [], [], []
+    seen = set()
+    for index, operation in enumerate(operations):
+        error = _check(operation, existing, user_id, seen)
+        if error is None and operation.data is not None:
+            try:
+                models.PlatformType(operation.data.platform_type)
+            except ValueError:
+                error = 422, "platform_type: invalid value"
+        if error is not None:
+            results.append(_result(index, operation, *error))
+            continue
+        results.append(None)
+        {"create": creates, "update": updates, "delete": deletes}[operation.op].append(
+            (index, operation)
+        )
+
+    if creates:
+        rows = [
+            {**operation.data.model_dump(), "owner_id": user_id}
+            for _, operation in creates
+        ]
+        new_ids = db.scalars(
+            insert(platform).returning(platform.id, sort_by_parameter_order=True),
+            rows,
+        ).all()
+        for (index, operation), row, new_id in zip(creates, rows, new_ids):
+            row["id"] = new_id
+            results[index] = {
+                **_result(index, operation, 201),
+                "id": new_id,
+                "platform": row,
+            }
+
+    if updates:
+        parameters = []
+        for index, operation in updates:
+            values = operation.data.model_dump(exclude_unset=True)
+            parameters.append({"id": operation.id, **values})
+            results[index] = {
+                **_result(index, operation, 200),
+                "platform": {**existing[operation.id]._mapping, **values},
+            }
+        db.execute(update(platform), parameters)
+
+    if deletes:
+        deleted = [operation.id for _, operation in deletes]
+        for index, operation in deletes:
+            results[index] = {
+                **_result(index, operation, 200),
+                "platform": dict(existing[operation.id]._mapping),
+            }
+        crud.release_platforms(db, deleted)
+        db.execute(
+            delete(platform)
+            .where(platform.id.in_(deleted))
+            .execution_options(synchronize_session=False)
+        )
+
+    for result in results:
+        row = result.get("platform")
+        if row is not None:
+            row["platform_type"] = _enum_value(row["platform_type"])
+            events.record(
+                db,
+                user_id,
+                f"platform.{_EVENT_SUFFIX[result['op']]}",
+                events.serialize(schemas.PlatformResponse, row),
+            )
+
+    if creates or updates or deletes:
+        crud.bump_data_version(db, user_id)
+    db.commit()
+    return _summary(results)
+
+
+def _summary(results: list) -> dict:
+    failed = sum(1 for result in results if result["status"] >= 400)
+    return {
+        "applied": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
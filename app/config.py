@@ -6,6 +6,77 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 24*60
+    ASYNC_DATABASE: bool = False
+    ASYNC_DATABASE_URL: str | None = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_TIMEOUT_MS: int | None = None
+    DB_POOL_WARMUP: int = 2
+    READ_DATABASE_URL: str | None = None
+    READ_AFTER_WRITE_PIN_SECONDS: float = 5
+    REDIS_URL: str | None = None
+    USER_CACHE_TTL_SECONDS: float = 60
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    ASSET_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    ASSET_CACHE_SHARED: bool = True
+    ASSET_CACHE_TTL_SECONDS: float = 3600
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_USER_RATE: float = 10
+    RATE_LIMIT_USER_BURST: float = 100
+    RATE_LIMIT_IP_RATE: float = 20
+    RATE_LIMIT_IP_BURST: float = 200
+    RATE_LIMIT_COSTS: dict[str, float] = {
+        "POST /token/": 10,
+        "POST /users/": 10,
+        "GET /transactions/": 5,
+        "POST /transactions/import": 20,
+        "POST /transactions/batch": 5,
+        "POST /platforms/batch": 5,
+        "POST /jobs/import": 20,
+        "POST /jobs/rebuild": 10,
+        "GET /assets/history": 5,
+        "GET /assets/valuation/history": 5,
+    }
+    RATE_LIMIT_EXPENSIVE_ROUTES: list[str] = [
+        "POST /token/",
+        "POST /users/",
+        "GET /transactions/",
+        "POST /transactions/import",
+        "GET /assets/history",
+        "GET /assets/valuation/history",
+    ]
+    RATE_LIMIT_MAX_CONCURRENT: int = 8
+    RATE_LIMIT_MAX_QUEUED: int = 32
+    RATE_LIMIT_QUEUE_TIMEOUT_SECONDS: float = 5
+    RATE_LIMIT_BUSY_RETRY_AFTER_SECONDS: int = 1
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    EVENT_BACKEND: str = "local"
+    EVENT_QUEUE_SIZE: int = 100
+    EVENT_MAX_SUBSCRIBERS: int = 10000
+    EVENT_HEARTBEAT_SECONDS: float = 15
+    FAST_SERIALIZATION: bool = False
+    METRICS_ENABLED: bool = True
+    STATS_TOKEN: str | None = None
+    SLOW_QUERY_MS: float | None = 200
+    N_PLUS_ONE_THRESHOLD: int = 10
+    SERVER_TIMING: bool = False
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 10
+    JOB_LEASE_SECONDS: float = 300
+    JOB_POLL_INTERVAL_SECONDS: float = 1
+    JOB_MAX_INPUT_BYTES: int = 100 * 1024 * 1024
+    PRICE_SOURCE: str = "database"
+    PRICE_FILE: str | None = None
+    PRICE_QUOTE: str = "usd"
+    PRICE_CACHE_TTL_SECONDS: float = 60
+    PRICE_STORE_TTL_SECONDS: float = 300
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,32 @@
-from typing import List
+from typing import Iterator, List, Optional, Sequence
 
 from fastapi import HTTPException
-from passlib.context import CryptContext
-from sqlalchemy import func
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.orm import Session
 
-from app import models, schemas
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = pwd_context.hash(user.password)
+from app import (
+    asset_cache,
+    events,
+    hashing,
+    history,
+    holdings,
+    lots,
+    models,
+    pagination,
+    read_routing,
+    schemas,
+    valuation,
+)
+from app.config import settings
+
+
+def create_user(
+    db: Session, user: schemas.UserCreate, hashed_password: str | None = None
+) -> models.User:
+    if hashed_password is None:
+        hashed_password = hashing.hash_password_sync(
+            user.password, settings.BCRYPT_ROUNDS
+        )
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -27,8 +42,47 @@ def get_user(db: Session, user_id: int) -> models.User:
     return db.query(models.User).filter(models.User.id == user_id).first()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def update_password_hash(
+    db: Session, user: models.User, hashed_password: str
+) -> models.User:
+    user.hashed_password = hashed_password
+    db.commit()
+    return user
+
+
+def bump_data_version(db: Session, user_id: int) -> None:
+    # Called by every write that changes what a user's list endpoints return,
+    # in the same transaction, so conditional GETs can compare one integer.
+    # It also pins the user's reads to the primary once the write commits and
+    # drops the user's cached asset summary.
+    read_routing.record_write(db, user_id)
+    asset_cache.record_write(db, user_id)
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(data_version=models.User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bump_data_versions(db: Session, user_id: Optional[int]) -> None:
+    # For rebuilds of derived tables, which can change what any user's list
+    # endpoints return; user_id None means every user.
+    if user_id is not None:
+        bump_data_version(db, user_id)
+        return
+    db.execute(
+        update(models.User)
+        .values(data_version=models.User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    return (
+        db.scalar(select(models.User.data_version).where(models.User.id == user_id))
+        or 0
+    )
 
 
 def create_transaction(
@@ -36,60 +90,244 @@ def create_transaction(
 ):
     db_transaction = models.Transaction(**transaction.dict(), owner_id=user_id)
     db.add(db_transaction)
+    holdings.apply_transaction(db, db_transaction)
+    lots.apply_transaction(db, db_transaction)
+    lots.refresh(db, user_id)
+    history.recompute(
+        db,
+        user_id,
+        history.touch({}, db_transaction.platform_id, db_transaction.date),
+    )
+    events.record(
+        db,
+        user_id,
+        "transaction.created",
+        events.serialize(schemas.TransactionResponse, db_transaction),
+    )
+    events.record_deltas(db, user_id, holdings.deltas_for(db_transaction))
+    bump_data_version(db, user_id)
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
 
 
-def get_transactions_by_user(db: Session, user_id: int) -> List[models.Transaction]:
-    return (
-        db.query(models.Transaction)
-        .filter(models.Transaction.owner_id == user_id)
-        .all()
+def import_transactions(db: Session, transactions: List[dict], user_id: int) -> None:
+    # Snapshots and stale positions are left to the caller, which
+    # recomputes them once for the whole import with history.recompute and
+    # lots.refresh.
+    rows = [{**transaction, "owner_id": user_id} for transaction in transactions]
+    db.execute(insert(models.Transaction), rows)
+    deltas = [
+        delta
+        for row in rows
+        for delta in holdings.transaction_deltas(
+            row["asset_name"],
+            row["cost_asset"],
+            row["transaction_type"],
+            row["platform_id"],
+            row["amount"],
+            row["cost"],
+        )
+    ]
+    holdings.apply_deltas(db, user_id, deltas)
+    events.record_deltas(db, user_id, deltas)
+    lots.mark_stale(
+        db,
+        user_id,
+        (
+            key
+            for row in rows
+            for key in lots.position_keys(
+                row["asset_name"],
+                row["cost_asset"],
+                row["transaction_type"],
+                row["platform_id"],
+            )
+        ),
+    )
+    bump_data_version(db, user_id)
+
+
+def _filter_transactions(statement, user_id: int, query: schemas.TransactionQuery):
+    transaction = models.Transaction
+    statement = statement.filter(transaction.owner_id == user_id)
+    if query.asset_name:
+        statement = statement.filter(transaction.asset_name == query.asset_name)
+    if query.platform_id is not None:
+        statement = statement.filter(transaction.platform_id == query.platform_id)
+    if query.transaction_type is not None:
+        statement = statement.filter(
+            transaction.transaction_type
+            == models.TransactionType(query.transaction_type.value)
+        )
+    if query.date_from is not None:
+        statement = statement.filter(transaction.date >= query.date_from)
+    if query.date_to is not None:
+        statement = statement.filter(transaction.date < query.date_to)
+
+    descending = query.order == "desc"
+    if query.cursor:
+        statement = statement.filter(
+            pagination.keyset_after(
+                transaction.date, transaction.id, query.cursor, descending
+            )
+        )
+    statement = statement.order_by(
+        *pagination.keyset_order(transaction.date, transaction.id, descending)
     )
+    if query.limit is not None:
+        statement = statement.limit(query.limit)
+    return statement
+
+
+def get_transactions_by_user(
+    db: Session, user_id: int, query: Optional[schemas.TransactionQuery] = None
+) -> List[models.Transaction]:
+    if query is None:
+        return (
+            db.query(models.Transaction)
+            .filter(models.Transaction.owner_id == user_id)
+            .all()
+        )
+    return _filter_transactions(db.query(models.Transaction), user_id, query).all()
+
+
+def get_transaction_rows_by_user(
+    db: Session, user_id: int, query: schemas.TransactionQuery, fields: Sequence[str]
+) -> list:
+    columns = [getattr(models.Transaction, name) for name in fields]
+    return db.execute(_filter_transactions(select(*columns), user_id, query)).all()
+
+
+def stream_transactions_by_user(
+    db: Session,
+    user_id: int,
+    query: schemas.TransactionQuery,
+    batch_size: int = 1000,
+) -> Iterator[list]:
+    statement = _filter_transactions(
+        select(*models.Transaction.__table__.columns), user_id, query
+    )
+    result = db.execute(statement.execution_options(yield_per=batch_size))
+    yield from result.partitions()
 
 
-def get_transaction(db: Session, transaction_id: int):
+def _position_keys(transaction: models.Transaction) -> list:
+    return lots.position_keys(
+        transaction.asset_name,
+        transaction.cost_asset,
+        transaction.transaction_type,
+        transaction.platform_id,
+    )
+
+
+def _owned(model, object_id: int, user_id: Optional[int]) -> list:
+    clauses = [model.id == object_id]
+    if user_id is not None:
+        clauses.append(model.owner_id == user_id)
+    return clauses
+
+
+def _missing(
+    db: Session, model, object_id: int, user_id: Optional[int], action: str
+) -> HTTPException:
+    # Only reached when the owner-scoped statement matched nothing; one more
+    # lookup tells a row that does not exist from one owned by someone else.
+    name = model.__name__
+    if user_id is not None:
+        exists = db.execute(select(model.owner_id).where(model.id == object_id))
+        if exists.first() is not None:
+            return HTTPException(
+                status_code=403,
+                detail=f"You do not have permission to {action} this {name.lower()}",
+            )
+    return HTTPException(status_code=404, detail=f"{name} not found")
+
+
+def get_transaction(
+    db: Session, transaction_id: int, user_id: Optional[int] = None
+) -> models.Transaction:
     transaction = (
         db.query(models.Transaction)
-        .filter(models.Transaction.id == transaction_id)
+        .filter(*_owned(models.Transaction, transaction_id, user_id))
         .first()
     )
     if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+        raise _missing(db, models.Transaction, transaction_id, user_id, "view")
     return transaction
 
 
 def update_transaction(
-    db: Session, transaction_id: int, transaction_update: schemas.TransactionCreate
+    db: Session,
+    transaction_id: int,
+    transaction_update: schemas.TransactionCreate,
+    user_id: Optional[int] = None,
 ):
-    transaction = (
-        db.query(models.Transaction)
-        .filter(models.Transaction.id == transaction_id)
-        .first()
+    transaction = models.Transaction
+    columns = transaction.__table__.columns
+    old = db.execute(
+        select(*columns)
+        .where(*_owned(transaction, transaction_id, user_id))
+        .with_for_update()
+    ).first()
+    if old is None:
+        raise _missing(db, transaction, transaction_id, user_id, "update")
+    new = db.execute(
+        update(transaction)
+        .where(transaction.id == transaction_id)
+        .values(**transaction_update.dict(exclude_unset=True))
+        .returning(*columns)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+    deltas = holdings.deltas_for(old, sign=-1) + holdings.deltas_for(new)
+    days = history.touch({}, old.platform_id, old.date)
+    history.touch(days, new.platform_id, new.date)
+    holdings.apply_deltas(db, new.owner_id, deltas)
+    lots.mark_stale(db, new.owner_id, _position_keys(old) + _position_keys(new))
+    lots.refresh(db, new.owner_id)
+    history.recompute(db, new.owner_id, days)
+    events.record(
+        db,
+        new.owner_id,
+        "transaction.updated",
+        events.serialize(schemas.TransactionResponse, new),
     )
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-
-    for key, value in transaction_update.dict(exclude_unset=True).items():
-        setattr(transaction, key, value)
-
+    events.record_deltas(db, new.owner_id, deltas)
+    bump_data_version(db, new.owner_id)
     db.commit()
-    db.refresh(transaction)
-    return transaction
-
-
-def delete_transaction(db: Session, transaction_id: int):
-    transaction = (
-        db.query(models.Transaction)
-        .filter(models.Transaction.id == transaction_id)
-        .first()
+    return new
+
+
+def delete_transaction(db: Session, transaction_id: int, user_id: Optional[int] = None):
+    transaction = models.Transaction
+    deleted = db.execute(
+        delete(transaction)
+        .where(*_owned(transaction, transaction_id, user_id))
+        .returning(*transaction.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        raise _missing(db, transaction, transaction_id, user_id, "delete")
+    deltas = holdings.deltas_for(deleted, sign=-1)
+    holdings.apply_deltas(db, deleted.owner_id, deltas)
+    lots.mark_stale(db, deleted.owner_id, _position_keys(deleted))
+    lots.refresh(db, deleted.owner_id)
+    history.recompute(
+        db,
+        deleted.owner_id,
+        history.touch({}, deleted.platform_id, deleted.date),
     )
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-    db.delete(transaction)
+    events.record(
+        db,
+        deleted.owner_id,
+        "transaction.deleted",
+        events.serialize(schemas.TransactionResponse, deleted),
+    )
+    events.record_deltas(db, deleted.owner_id, deltas)
+    bump_data_version(db, deleted.owner_id)
     db.commit()
-    return transaction
+    return deleted
 
 
 def create_platform(
@@ -97,17 +335,29 @@ def create_platform(
 ) -> models.Platform:
     db_platform = models.Platform(**platform.dict(), owner_id=user_id)
     db.add(db_platform)
+    db.flush()
+    events.record(
+        db,
+        user_id,
+        "platform.created",
+        events.serialize(schemas.PlatformResponse, db_platform),
+    )
+    bump_data_version(db, user_id)
     db.commit()
     db.refresh(db_platform)
     return db_platform
 
 
-def get_platform(db: Session, platform_id: int) -> models.Platform:
+def get_platform(
+    db: Session, platform_id: int, user_id: Optional[int] = None
+) -> models.Platform:
     platform = (
-        db.query(models.Platform).filter(models.Platform.id == platform_id).first()
+        db.query(models.Platform)
+        .filter(*_owned(models.Platform, platform_id, user_id))
+        .first()
     )
     if not platform:
-        raise HTTPException(status_code=404, detail="Platform not found")
+        raise _missing(db, models.Platform, platform_id, user_id, "view")
     return platform
 
 
@@ -115,32 +365,102 @@ def get_platforms_by_user(db: Session, user_id: int) -> List[models.Platform]:
     return db.query(models.Platform).filter(models.Platform.owner_id == user_id).all()
 
 
+def get_platform_rows_by_user(db: Session, user_id: int, fields: Sequence[str]) -> list:
+    columns = [getattr(models.Platform, name) for name in fields]
+    return db.execute(select(*columns).where(models.Platform.owner_id == user_id)).all()
+
+
 def update_platform(
-    db: Session, platform_id: int, platform_update: schemas.PlatformCreate
+    db: Session,
+    platform_id: int,
+    platform_update: schemas.PlatformCreate,
+    user_id: Optional[int] = None,
 ):
-    platform = (
-        db.query(models.Platform).filter(models.Platform.id == platform_id).first()
+    platform = models.Platform
+    updated = db.execute(
+        update(platform)
+        .where(*_owned(platform, platform_id, user_id))
+        .values(**platform_update.dict(exclude_unset=True))
+        .returning(*platform.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if updated is None:
+        raise _missing(db, platform, platform_id, user_id, "update")
+    events.record(
+        db,
+        updated.owner_id,
+        "platform.updated",
+        events.serialize(schemas.PlatformResponse, updated),
     )
-    if not platform:
-        raise HTTPException(status_code=404, detail="Platform not found")
-
-    for key, value in platform_update.dict(exclude_unset=True).items():
-        setattr(platform, key, value)
-
+    bump_data_version(db, updated.owner_id)
     db.commit()
-    db.refresh(platform)
-    return platform
-
-
-def delete_platform(db: Session, platform_id: int):
-    platform = (
-        db.query(models.Platform).filter(models.Platform.id == platform_id).first()
+    return updated
+
+
+def release_platforms(db: Session, platform_ids) -> None:
+    # Run before deleting platforms. Their transactions are kept without a
+    # platform, as the ORM cascade used to do; holdings, positions and
+    # snapshots skip such transactions, so their rows for the platforms go.
+    # The dropped holdings are announced as deltas that zero them.
+    db.execute(
+        update(models.Transaction)
+        .where(models.Transaction.platform_id.in_(platform_ids))
+        .values(platform_id=None)
+        .execution_options(synchronize_session=False)
     )
-    if not platform:
-        raise HTTPException(status_code=404, detail="Platform not found")
-    db.delete(platform)
+    holding = models.Holding
+    dropped = db.execute(
+        delete(holding)
+        .where(holding.platform_id.in_(platform_ids))
+        .returning(
+            holding.owner_id,
+            holding.asset_name,
+            holding.cost_asset,
+            holding.platform_id,
+            holding.total_amount,
+            holding.total_cost,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    for row in dropped:
+        events.record_deltas(
+            db,
+            row.owner_id,
+            [
+                (
+                    (row.asset_name, row.cost_asset, row.platform_id),
+                    -row.total_amount,
+                    -row.total_cost,
+                )
+            ],
+        )
+    lots.delete_platform_positions(db, platform_ids)
+    history.delete_platform_snapshots(db, platform_ids)
+
+
+def delete_platform(db: Session, platform_id: int, user_id: Optional[int] = None):
+    # Dependent rows are selected through the owner-scoped platform id, so a
+    # request for someone else's platform changes nothing before it is refused.
+    platform = models.Platform
+    owned = select(platform.id).where(*_owned(platform, platform_id, user_id))
+    release_platforms(db, owned)
+    deleted = db.execute(
+        delete(platform)
+        .where(*_owned(platform, platform_id, user_id))
+        .returning(*platform.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        raise _missing(db, platform, platform_id, user_id, "delete")
+    events.record(
+        db,
+        deleted.owner_id,
+        "platform.deleted",
+        events.serialize(schemas.PlatformResponse, deleted),
+    )
+    bump_data_version(db, deleted.owner_id)
     db.commit()
-    return platform
+    return deleted
 
 
 def get_assets_by_user(db: Session, user_id: int) -> List[dict]:
@@ -176,3 +496,56 @@ def get_assets_by_user(db: Session, user_id: int) -> List[dict]:
     ]
 
     return assets
+
+
+def get_holding_rows_by_user(db: Session, user_id: int) -> list:
+    total_amount = func.sum(models.Holding.total_amount)
+    return (
+        db.query(
+            models.Holding.asset_name,
+            models.Holding.cost_asset,
+            models.Platform.name.label("platform_name"),
+            total_amount.label("total_amount"),
+            func.sum(models.Holding.total_cost).label("total_cost"),
+        )
+        .join(models.Platform, models.Platform.id == models.Holding.platform_id)
+        .filter(models.Holding.owner_id == user_id)
+        .group_by(
+            models.Holding.asset_name,
+            models.Holding.cost_asset,
+            models.Platform.name,
+        )
+        .having(total_amount > 0)
+        .all()
+    )
+
+
+def get_holdings_by_user(db: Session, user_id: int) -> List[dict]:
+    return [
+        {
+            "asset_name": row.asset_name,
+            "cost_asset": row.cost_asset,
+            "platform_name": row.platform_name,
+            "total_amount": row.total_amount,
+            "total_cost": row.total_cost,
+        }
+        for row in get_holding_rows_by_user(db, user_id)
+    ]
+
+
+def get_cost_basis(
+    db: Session, user_id: int, method: schemas.CostBasisMethod
+) -> List[dict]:
+    return lots.cost_basis(db, user_id, models.CostBasisMethod(method.value))
+
+
+def get_holding_history(
+    db: Session, user_id: int, query: schemas.HistoryQuery
+) -> List[dict]:
+    return history.series(db, user_id, query)
+
+
+def get_valuation_history(
+    db: Session, user_id: int, query: schemas.ValuationHistoryQuery, quote: str
+) -> dict:
+    return valuation.value_history(db, user_id, query, quote)
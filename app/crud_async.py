@@ -0,0 +1,77 @@
+import functools
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.hashing import password_hasher
+
+
+async def run(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def _async(fn):
+    @functools.wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await run(db, fn, *args, **kwargs)
+
+    return wrapper
+
+
+async def commit(db) -> None:
+    if isinstance(db, AsyncSession):
+        await db.commit()
+    else:
+        await run_in_threadpool(db.commit)
+
+
+async def close(db) -> None:
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+
+async def create_user(db, user):
+    hashed_password = await password_hasher.hash(user.password)
+    return await run(db, crud.create_user, user, hashed_password=hashed_password)
+
+
+async def authenticate(db, email: str, password: str):
+    db_user = await get_user_by_email(db, email)
+    if db_user is None:
+        return None
+    verified, new_hash = await password_hasher.verify_and_update(
+        password, db_user.hashed_password
+    )
+    if not verified:
+        return None
+    if new_hash:
+        await run(db, crud.update_password_hash, db_user, new_hash)
+    return db_user
+
+
+get_user_by_email = _async(crud.get_user_by_email)
+get_user = _async(crud.get_user)
+get_data_version = _async(crud.get_data_version)
+create_transaction = _async(crud.create_transaction)
+get_transactions_by_user = _async(crud.get_transactions_by_user)
+get_transaction_rows_by_user = _async(crud.get_transaction_rows_by_user)
+get_transaction = _async(crud.get_transaction)
+update_transaction = _async(crud.update_transaction)
+delete_transaction = _async(crud.delete_transaction)
+create_platform = _async(crud.create_platform)
+get_platform = _async(crud.get_platform)
+get_platforms_by_user = _async(crud.get_platforms_by_user)
+get_platform_rows_by_user = _async(crud.get_platform_rows_by_user)
+update_platform = _async(crud.update_platform)
+delete_platform = _async(crud.delete_platform)
+get_assets_by_user = _async(crud.get_assets_by_user)
+get_holdings_by_user = _async(crud.get_holdings_by_user)
+get_holding_rows_by_user = _async(crud.get_holding_rows_by_user)
+get_cost_basis = _async(crud.get_cost_basis)
+get_holding_history = _async(crud.get_holding_history)
+get_valuation_history = _async(crud.get_valuation_history)
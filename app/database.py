@@ -1,19 +1,199 @@
-from sqlalchemy import create_engine
+import contextlib
+import threading
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_time_total += seconds
+            self.wait_time_max = max(self.wait_time_max, seconds)
+
+
+class _InstrumentedPool:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def snapshot(self) -> dict:
+        stats = self.stats
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": stats.checkouts,
+            "checkout_timeouts": stats.checkout_timeouts,
+            "wait_time_total_s": round(stats.wait_time_total, 6),
+            "wait_time_max_s": round(stats.wait_time_max, 6),
+            "wait_time_avg_s": round(
+                stats.wait_time_total / stats.checkouts if stats.checkouts else 0, 6
+            ),
+        }
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def async_database_url(url: str):
+    url = make_url(url)
+    return url.set(
+        drivername=_ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    )
+
+
+def engine_options(url, asynchronous: bool = False) -> dict:
+    options = {
+        "poolclass": (
+            InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool
+        ),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout and make_url(url).get_backend_name() == "postgresql":
+        if asynchronous:
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(timeout)}
+            }
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+
 Base = declarative_base()
 
 
-def get_db():
+if settings.ASYNC_DATABASE:
+    _async_url = settings.ASYNC_DATABASE_URL or async_database_url(
+        settings.DATABASE_URL
+    )
+    async_engine = create_async_engine(
+        _async_url, **engine_options(_async_url, asynchronous=True)
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+# Optional read replica. Only routes that tolerate replication lag use it,
+# through dependencies.get_read_db.
+read_engine = None
+ReadSessionLocal = None
+async_read_engine = None
+AsyncReadSessionLocal = None
+
+if settings.READ_DATABASE_URL:
+    read_engine = create_engine(
+        settings.READ_DATABASE_URL, **engine_options(settings.READ_DATABASE_URL)
+    )
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    if settings.ASYNC_DATABASE:
+        _async_read_url = async_database_url(settings.READ_DATABASE_URL)
+        async_read_engine = create_async_engine(
+            _async_read_url, **engine_options(_async_read_url, asynchronous=True)
+        )
+        AsyncReadSessionLocal = async_sessionmaker(
+            async_read_engine, autoflush=False, expire_on_commit=False
+        )
+
+
+def primary_sessionmaker():
+    return AsyncSessionLocal if settings.ASYNC_DATABASE else SessionLocal
+
+
+def replica_sessionmaker():
+    return AsyncReadSessionLocal if settings.ASYNC_DATABASE else ReadSessionLocal
+
+
+@contextlib.asynccontextmanager
+async def open_session(factory):
+    db = factory()
+    try:
+        yield db
+    finally:
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            await run_in_threadpool(db.close)
+
+
+def pool_stats() -> dict:
+    stats = {"sync": engine.pool.snapshot()}
+    if async_engine is not None:
+        stats["async"] = async_engine.pool.snapshot()
+    if read_engine is not None:
+        stats["read"] = read_engine.pool.snapshot()
+    if async_read_engine is not None:
+        stats["async_read"] = async_read_engine.pool.snapshot()
+    return stats
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if settings.ASYNC_DATABASE else get_sync_db
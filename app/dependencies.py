@@ -1,16 +1,42 @@
+import secrets
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import (
+    HTTPAuthorizationCredentials,
+    HTTPBearer,
+    OAuth2PasswordBearer,
+)
 from sqlalchemy.orm import Session
 
-from app import crud
+from app import crud_async, database
 from app.auth import verify_token
+from app.config import settings
 from app.database import get_db
+from app.read_routing import read_router
 from app.schemas import UserResponse
+from app.user_cache import user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+stats_scheme = HTTPBearer(auto_error=False)
+
 
+async def _lookup_user(db: Session, email: str):
+    # Users rarely change, so the replica answers the lookup. A user it does
+    # not know yet, e.g. one registered a moment ago, is looked up again on
+    # the primary.
+    factory = database.replica_sessionmaker()
+    if factory is not None:
+        async with database.open_session(factory) as read_db:
+            db_user = await crud_async.get_user_by_email(read_db, email=email)
+        if db_user is not None:
+            read_router.user_lookup_replica += 1
+            return db_user
+        read_router.user_lookup_fallbacks += 1
+    return await crud_async.get_user_by_email(db, email=email)
 
-def get_current_user(
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
 ) -> UserResponse:
     token_data = verify_token(token)
@@ -20,12 +46,51 @@ def get_current_user(
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = crud.get_user_by_email(db, email=token_data.email)
-    if not user:
+    user = user_cache.get(token_data.email)
+    if user is not None:
+        return user
+
+    db_user = await _lookup_user(db, token_data.email)
+    if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    user = UserResponse.model_validate(db_user)
+    user_cache.set(token_data.email, user)
     return user
+
+
+async def get_read_db(
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    # Session for read-only routes that may lag the primary slightly. The
+    # primary session is only used, and only connects, when the read is not
+    # routed to the replica.
+    factory = read_router.replica_for(current_user.id)
+    if factory is None:
+        yield db
+        return
+    async with database.open_session(factory) as read_db:
+        yield read_db
+
+
+def require_stats_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stats_scheme),
+) -> None:
+    # GET /stats/ and /metrics describe pools, caches and queues. They are
+    # not served unless STATS_TOKEN is set, and then only to callers that
+    # send it as their bearer token, so scrapers need no user account.
+    if not settings.STATS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not secrets.compare_digest(
+        credentials.credentials.encode(), settings.STATS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,53 @@
+import hashlib
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+
+from app import crud_async
+from app.dependencies import get_current_user, get_read_db
+from app.schemas import UserResponse
+
+VARY = "Authorization, Accept"
+
+
+def make_etag(user_id: int, version: int, request: Request) -> str:
+    # The version covers everything the user can write; the digest tells
+    # apart endpoints, filters, pages and representations under one version.
+    variant = "\n".join(
+        [
+            request.url.path,
+            request.url.query,
+            request.headers.get("accept", ""),
+        ]
+    )
+    digest = hashlib.blake2b(variant.encode(), digest_size=8).hexdigest()
+    return f'W/"{user_id}-{version}-{digest}"'
+
+
+def matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in tags}
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: UserResponse = Depends(get_current_user),
+) -> None:
+    # Reads the user's data version before the handler loads anything, so a
+    # write that lands in between yields a stale tag and a later 200, never a
+    # 304 for data the client has not seen. It uses the handler's read
+    # session, so the version and the data come from the same database. The
+    # version is left on request.state for handlers that key caches on it.
+    version = await crud_async.get_data_version(db, current_user.id)
+    request.state.data_version = version
+    etag = make_etag(current_user.id, version, request)
+    headers = {"ETag": etag, "Vary": VARY, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and matches(if_none_match, etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
@@ -0,0 +1,363 @@
+import asyncio
+import json
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, Iterable, Set
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+except ImportError:
+    psycopg2 = None
+
+CHANNEL = "cwd_events"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+NOTIFY_MAX_PAYLOAD = 7999
+RESYNC = {"type": "resync", "data": {}}
+
+
+def serialize(schema: type[BaseModel], obj) -> dict:
+    return schema.model_validate(obj).model_dump(mode="json")
+
+
+def record(db: Session, user_id: int, event_type: str, data: dict) -> None:
+    # Events are held on the session and published only once it commits, so
+    # a rolled-back write is never announced.
+    db.info.setdefault("pending_events", []).append(
+        (user_id, {"type": event_type, "data": data})
+    )
+
+
+def record_deltas(db: Session, user_id: int, deltas: Iterable) -> None:
+    # Holdings deltas are merged per key for the whole transaction and sent
+    # as a single assets.changed event per user.
+    merged = db.info.setdefault("pending_deltas", {}).setdefault(
+        user_id, defaultdict(lambda: [0, 0])
+    )
+    for key, amount, cost in deltas:
+        merged[key][0] += amount
+        merged[key][1] += cost
+
+
+def _assets_changed(merged: dict) -> dict:
+    return {
+        "type": "assets.changed",
+        "data": {
+            "deltas": [
+                {
+                    "asset_name": asset_name,
+                    "cost_asset": cost_asset,
+                    "platform_id": platform_id,
+                    "amount": amount,
+                    "cost": cost,
+                }
+                for (asset_name, cost_asset, platform_id), (amount, cost) in (
+                    merged.items()
+                )
+                if amount or cost
+            ]
+        },
+    }
+
+
+class Subscription:
+    # One connected client. Events arrive from whichever thread committed the
+    # write and are handed to the client's event loop. The queue is bounded:
+    # a client that falls behind loses its backlog and gets one resync event
+    # telling it to refetch, so a slow reader costs at most max_size events.
+
+    def __init__(self, broker: "EventBroker", user_id: int, max_size: int):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.overflows = 0
+
+    def _put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    def put(self, event: dict) -> None:
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class LocalEventBackend:
+    # Delivers within the process. Brokers that share one instance behave
+    # like workers that share a database, which is how tests exercise the
+    # cross-worker path.
+    max_payload = None
+
+    def __init__(self):
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        with self._lock:
+            self._listeners.append(deliver)
+
+    def publish(self, payload: str) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for deliver in listeners:
+            deliver(payload)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._listeners.clear()
+
+    def stats(self) -> dict:
+        return {"listeners": len(self._listeners)}
+
+
+class PostgresEventBackend:
+    # LISTEN/NOTIFY on one channel. Each worker keeps one listening
+    # connection and one publishing connection, each on its own thread, so a
+    # committing request only enqueues and never waits on the database.
+    max_payload = NOTIFY_MAX_PAYLOAD
+
+    def __init__(self, dsn: str, channel: str = CHANNEL, max_pending: int = 10000):
+        if psycopg2 is None:
+            raise RuntimeError("EVENT_BACKEND=postgres requires psycopg2")
+        self.dsn = dsn
+        self.channel = channel
+        self._outbox = queue.Queue(maxsize=max_pending)
+        self._stopped = threading.Event()
+        self._threads = []
+        self.dropped = 0
+        self.errors = 0
+
+    def _connect(self):
+        connection = psycopg2.connect(self.dsn)
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return connection
+
+    def _run(self, target, *args) -> None:
+        while not self._stopped.is_set():
+            try:
+                target(*args)
+            except psycopg2.Error:
+                self.errors += 1
+                self._stopped.wait(1)
+
+    def _listen(self, deliver: Callable[[str], None]) -> None:
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            while not self._stopped.is_set():
+                if select.select([connection], [], [], 1) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    deliver(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+    def _send(self) -> None:
+        connection = self._connect()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    payload = self._outbox.get(timeout=1)
+                except queue.Empty:
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        finally:
+            connection.close()
+
+    def start(self, deliver: Callable[[str], None]) -> None:
+        for name, target, args in (
+            ("event-listen", self._listen, (deliver,)),
+            ("event-notify", self._send, ()),
+        ):
+            thread = threading.Thread(
+                target=self._run, args=(target, *args), name=name, daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def publish(self, payload: str) -> None:
+        try:
+            self._outbox.put_nowait(payload)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads.clear()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._outbox.qsize(),
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class EventBroker:
+    def __init__(self, backend, queue_size: int, max_subscribers: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.delivered = 0
+        self.rejected = 0
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _start(self) -> None:
+        if not self._started:
+            self._started = True
+            self.backend.start(self._deliver)
+
+    def _check_capacity(self) -> None:
+        if self._count >= self.max_subscribers:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many open event streams",
+                headers={"Retry-After": "5"},
+            )
+
+    def check_capacity(self) -> None:
+        with self._lock:
+            self._check_capacity()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        with self._lock:
+            self._check_capacity()
+            self._start()
+            subscription = Subscription(self, user_id, self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def _encode(self, user_id: int, event: dict) -> str:
+        payload = json.dumps({"user_id": user_id, "event": event}, default=str)
+        limit = self.backend.max_payload
+        if limit is not None and len(payload.encode()) > limit:
+            payload = json.dumps({"user_id": user_id, "event": RESYNC})
+        return payload
+
+    def publish(self, user_id: int, event: dict) -> None:
+        self.published += 1
+        self.backend.publish(self._encode(user_id, event))
+
+    def _deliver(self, payload: str) -> None:
+        message = json.loads(payload)
+        with self._lock:
+            subscribers = list(self._subscribers.get(message["user_id"], ()))
+        for subscription in subscribers:
+            try:
+                subscription.put(message["event"])
+            except RuntimeError:
+                # The client's event loop has closed.
+                self.unsubscribe(subscription)
+            else:
+                self.delivered += 1
+
+    def shutdown(self) -> None:
+        self.backend.stop()
+        self._started = False
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "subscribers": self._count,
+            "max_subscribers": self.max_subscribers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "rejected": self.rejected,
+            **self.backend.stats(),
+        }
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+async def sse_stream(user_id: int, heartbeat: float) -> AsyncIterator[str]:
+    # Subscribes only once the response is being sent, so a stream that never
+    # starts leaves nothing behind. Comment lines keep proxies from timing out
+    # idle streams and surface disconnected clients, whose generator is then
+    # closed.
+    subscription = broker.subscribe(user_id)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield f": keepalive {int(time.time())}\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        subscription.close()
+
+
+def _build_backend():
+    if settings.EVENT_BACKEND == "postgres":
+        url = make_url(settings.DATABASE_URL).set(drivername="postgresql")
+        return PostgresEventBackend(url.render_as_string(hide_password=False))
+    return LocalEventBackend()
+
+
+broker = EventBroker(
+    _build_backend(),
+    queue_size=settings.EVENT_QUEUE_SIZE,
+    max_subscribers=settings.EVENT_MAX_SUBSCRIBERS,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    pending = session.info.pop("pending_events", ())
+    deltas = session.info.pop("pending_deltas", {})
+    for user_id, pending_event in pending:
+        broker.publish(user_id, pending_event)
+    for user_id, merged in deltas.items():
+        changed = _assets_changed(merged)
+        if changed["data"]["deltas"]:
+            broker.publish(user_id, changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("pending_events", None)
+    session.info.pop("pending_deltas", None)
@@ -0,0 +1,358 @@
+import argparse
+import sys
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import holdings, models, pagination, schemas
+
+# Undated transactions are kept apart from the dated, cumulative rows, on
+# this day, as a base balance that reads add to every point. Writing one
+# rewrites just the base rows, not the platform's whole history.
+BASE_DAY = date.min
+
+MAX_POINTS = 1000
+
+
+Touched = Dict[int, Tuple[bool, Optional[date]]]
+
+
+def touch(days: Touched, platform_id, value: Optional[datetime]) -> dict:
+    # Records, per platform, whether a write touched undated transactions and
+    # the earliest day it touched.
+    if platform_id is not None:
+        undated, day = days.get(platform_id, (False, None))
+        if value is None:
+            undated = True
+        elif day is None or value.date() < day:
+            day = value.date()
+        days[platform_id] = (undated, day)
+    return days
+
+
+def recompute(db: Session, owner_id: int, days: Touched) -> None:
+    db.flush()
+    for platform_id, (undated, day) in days.items():
+        if undated:
+            _recompute_base(db, owner_id, platform_id)
+        if day is not None:
+            _recompute_platform(db, owner_id, platform_id, day)
+
+
+def _recompute_base(db: Session, owner_id: int, platform_id: int):
+    snapshot = models.HoldingSnapshot
+    db.query(snapshot).filter(
+        snapshot.owner_id == owner_id,
+        snapshot.platform_id == platform_id,
+        snapshot.day == BASE_DAY,
+    ).delete(synchronize_session=False)
+    transaction = models.Transaction
+    _write_snapshots(
+        db,
+        owner_id,
+        platform_id,
+        {},
+        _platform_transactions(owner_id, platform_id).where(
+            transaction.date.is_(None)
+        ),
+    )
+
+
+def _platform_transactions(owner_id: int, platform_id: int) -> Select:
+    transaction = models.Transaction
+    return select(
+        transaction.asset_name,
+        transaction.cost_asset,
+        transaction.transaction_type,
+        transaction.amount,
+        transaction.cost,
+        transaction.date,
+    ).where(transaction.owner_id == owner_id, transaction.platform_id == platform_id)
+
+
+def _recompute_platform(db: Session, owner_id: int, platform_id: int, day: date):
+    # Dated snapshots are sparse and cumulative: a row holds the balance of
+    # the dated transactions at the end of a day on which the key changed.
+    # Only rows from the affected day onward are rewritten, starting from the
+    # balances carried in before it.
+    snapshot = models.HoldingSnapshot
+    latest = (
+        select(
+            snapshot.asset_name,
+            snapshot.cost_asset,
+            func.max(snapshot.day).label("day"),
+        )
+        .where(
+            snapshot.owner_id == owner_id,
+            snapshot.platform_id == platform_id,
+            snapshot.day > BASE_DAY,
+            snapshot.day < day,
+        )
+        .group_by(snapshot.asset_name, snapshot.cost_asset)
+        .subquery()
+    )
+    carried = db.execute(
+        select(
+            snapshot.asset_name,
+            snapshot.cost_asset,
+            snapshot.total_amount,
+            snapshot.total_cost,
+        )
+        .join(
+            latest,
+            and_(
+                snapshot.asset_name == latest.c.asset_name,
+                snapshot.cost_asset == latest.c.cost_asset,
+                snapshot.day == latest.c.day,
+            ),
+        )
+        .where(snapshot.owner_id == owner_id, snapshot.platform_id == platform_id)
+    )
+    balances = {
+        (row.asset_name, row.cost_asset): [row.total_amount, row.total_cost]
+        for row in carried
+    }
+    db.query(snapshot).filter(
+        snapshot.owner_id == owner_id,
+        snapshot.platform_id == platform_id,
+        snapshot.day > BASE_DAY,
+        snapshot.day >= day,
+    ).delete(synchronize_session=False)
+
+    transaction = models.Transaction
+    statement = (
+        _platform_transactions(owner_id, platform_id)
+        .where(transaction.date >= datetime.combine(day, time.min))
+        .order_by(*pagination.keyset_order(transaction.date, transaction.id))
+    )
+    _write_snapshots(db, owner_id, platform_id, balances, statement)
+
+
+def _write_snapshots(
+    db: Session, owner_id: int, platform_id: int, balances: dict, statement
+):
+    # Adds the transactions to the balances and writes a row per key at the
+    # end of each day on which it changed.
+    snapshot = models.HoldingSnapshot
+    rows = []
+    current_day = None
+    changed = set()
+
+    def close_day():
+        for key in changed:
+            rows.append(
+                {
+                    "owner_id": owner_id,
+                    "platform_id": platform_id,
+                    "asset_name": key[0],
+                    "cost_asset": key[1],
+                    "day": current_day,
+                    "total_amount": balances[key][0],
+                    "total_cost": balances[key][1],
+                }
+            )
+        changed.clear()
+
+    for row in db.execute(statement.execution_options(yield_per=1000)):
+        row_day = row.date.date() if row.date is not None else BASE_DAY
+        if row_day != current_day:
+            close_day()
+            current_day = row_day
+        for key, amount, cost in holdings.transaction_deltas(
+            row.asset_name,
+            row.cost_asset,
+            row.transaction_type,
+            platform_id,
+            row.amount,
+            row.cost,
+        ):
+            balance = balances.setdefault(key[:2], [0.0, 0.0])
+            balance[0] += amount
+            balance[1] += cost
+            changed.add(key[:2])
+    close_day()
+
+    if rows:
+        db.execute(insert(snapshot), rows)
+
+
+def delete_platform_snapshots(
+    db: Session, platform_ids: Union[List[int], Select]
+) -> None:
+    db.query(models.HoldingSnapshot).filter(
+        models.HoldingSnapshot.platform_id.in_(platform_ids)
+    ).delete(synchronize_session=False)
+
+
+def rebuild(db: Session, owner_id: Optional[int] = None) -> int:
+    query = (
+        db.query(models.Transaction.owner_id, models.Transaction.platform_id)
+        .filter(models.Transaction.platform_id.isnot(None))
+        .distinct()
+    )
+    snapshots = db.query(models.HoldingSnapshot)
+    if owner_id is not None:
+        query = query.filter(models.Transaction.owner_id == owner_id)
+        snapshots = snapshots.filter(models.HoldingSnapshot.owner_id == owner_id)
+    pairs = query.all()
+    snapshots.delete(synchronize_session=False)
+    for owner, platform_id in pairs:
+        _recompute_base(db, owner, platform_id)
+        _recompute_platform(db, owner, platform_id, BASE_DAY)
+    return len(pairs)
+
+
+def _points(date_from: date, date_to: date, interval: str) -> List[date]:
+    # The balance is sampled at the end of each interval; the last interval
+    # is cut short at date_to.
+    points = []
+    start = date_from
+    while start <= date_to and len(points) <= MAX_POINTS:
+        if interval == "day":
+            end = start
+        elif interval == "week":
+            end = start + timedelta(days=6)
+        else:
+            end = (start.replace(day=1) + timedelta(days=32)).replace(
+                day=1
+            ) - timedelta(days=1)
+        points.append(min(end, date_to))
+        start = end + timedelta(days=1)
+    if len(points) > MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range has more than {MAX_POINTS} {interval} intervals",
+        )
+    return points
+
+
+def series(db: Session, owner_id: int, query: schemas.HistoryQuery) -> List[dict]:
+    date_to = query.date_to or datetime.utcnow().date()
+    date_from = query.date_from or date_to - timedelta(days=364)
+    points = _points(date_from, date_to, query.interval)
+    if not points:
+        return []
+
+    snapshot = models.HoldingSnapshot
+    filters = [snapshot.owner_id == owner_id]
+    if query.asset_name:
+        filters.append(snapshot.asset_name == query.asset_name)
+    if query.platform_id is not None:
+        filters.append(snapshot.platform_id == query.platform_id)
+
+    latest = (
+        select(
+            snapshot.platform_id,
+            snapshot.asset_name,
+            snapshot.cost_asset,
+            func.max(snapshot.day).label("day"),
+        )
+        .where(*filters, snapshot.day > BASE_DAY, snapshot.day < date_from)
+        .group_by(snapshot.platform_id, snapshot.asset_name, snapshot.cost_asset)
+        .subquery()
+    )
+    columns = (
+        snapshot.platform_id,
+        models.Platform.name,
+        snapshot.asset_name,
+        snapshot.cost_asset,
+        snapshot.day,
+        snapshot.total_amount,
+        snapshot.total_cost,
+    )
+    carried = (
+        select(*columns)
+        .join(models.Platform, models.Platform.id == snapshot.platform_id)
+        .join(
+            latest,
+            and_(
+                snapshot.platform_id == latest.c.platform_id,
+                snapshot.asset_name == latest.c.asset_name,
+                snapshot.cost_asset == latest.c.cost_asset,
+                snapshot.day == latest.c.day,
+            ),
+        )
+        .where(*filters)
+    )
+    in_range = (
+        select(*columns)
+        .join(models.Platform, models.Platform.id == snapshot.platform_id)
+        .where(*filters, snapshot.day >= date_from, snapshot.day <= date_to)
+        .order_by(snapshot.day)
+    )
+    base = (
+        select(*columns)
+        .join(models.Platform, models.Platform.id == snapshot.platform_id)
+        .where(*filters, snapshot.day == BASE_DAY)
+    )
+
+    snapshots = defaultdict(list)
+    bases = {}
+    for statement in (carried, in_range, base):
+        for row in db.execute(statement):
+            key = (row.asset_name, row.cost_asset, row.name, row.platform_id)
+            if row.day == BASE_DAY:
+                bases[key] = (row.total_amount, row.total_cost)
+            else:
+                snapshots[key].append((row.day, row.total_amount, row.total_cost))
+
+    result = []
+    for key in sorted(snapshots.keys() | bases.keys()):
+        asset_name, cost_asset, platform_name, _ = key
+        rows = snapshots.get(key, [])
+        base_amount, base_cost = bases.get(key, (0.0, 0.0))
+        values = []
+        index = 0
+        amount = cost = 0.0
+        for point in points:
+            while index < len(rows) and rows[index][0] <= point:
+                _, amount, cost = rows[index]
+                index += 1
+            values.append(
+                {
+                    "date": point,
+                    "total_amount": base_amount + amount,
+                    "total_cost": base_cost + cost,
+                }
+            )
+        if any(value["total_amount"] for value in values):
+            result.append(
+                {
+                    "asset_name": asset_name,
+                    "cost_asset": cost_asset,
+                    "platform_name": platform_name,
+                    "points": values,
+                }
+            )
+    return result
+
+
+def main(argv: Optional[list] = None) -> int:
+    from app import crud
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.history",
+        description="Rebuild the daily holding snapshots from transactions.",
+    )
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db, args.user_id)
+        crud.bump_data_versions(db, args.user_id)
+        db.commit()
+        print(f"Rebuilt snapshots for {count} platforms")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
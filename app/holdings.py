@@ -0,0 +1,208 @@
+import argparse
+import math
+import sys
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import models, portfolio
+from app.models import TransactionType
+
+_insert_by_dialect = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+_KEY_COLUMNS = ("owner_id", "asset_name", "cost_asset", "platform_id")
+
+
+def transaction_deltas(
+    asset_name: str,
+    cost_asset: Optional[str],
+    transaction_type,
+    platform_id: int,
+    amount: float,
+    cost: Optional[float],
+) -> list:
+    # Mirrors the per-type rules of routers/assets.calculate_real_assets,
+    # keyed by platform id instead of platform name.
+    transaction_type = TransactionType(transaction_type)
+    cost_asset = cost_asset or ""
+    cost = cost or 0
+    key = (asset_name, cost_asset, platform_id)
+
+    if transaction_type in (TransactionType.DEPOSIT, TransactionType.AIRDROP):
+        return [(key, amount, 0)]
+    if transaction_type == TransactionType.WITHDRAW:
+        return [(key, -amount, 0)]
+    if transaction_type == TransactionType.BUY:
+        deltas = [(key, amount, cost)]
+        if cost_asset:
+            deltas.append(((cost_asset, "", platform_id), -cost, 0))
+        return deltas
+    return [(key, -amount, -cost), ((cost_asset, "", platform_id), cost, 0)]
+
+
+def deltas_for(transaction: models.Transaction, sign: int = 1) -> list:
+    if transaction.platform_id is None:
+        return []
+    return [
+        (key, sign * amount, sign * cost)
+        for key, amount, cost in transaction_deltas(
+            transaction.asset_name,
+            transaction.cost_asset,
+            transaction.transaction_type,
+            transaction.platform_id,
+            transaction.amount,
+            transaction.cost,
+        )
+    ]
+
+
+def apply_deltas(db: Session, owner_id: int, deltas: Iterable) -> None:
+    merged = defaultdict(lambda: [0, 0])
+    for key, amount, cost in deltas:
+        merged[key][0] += amount
+        merged[key][1] += cost
+    if not merged:
+        return
+
+    insert = _insert_by_dialect[db.get_bind().dialect.name]
+    stmt = insert(models.Holding).values(
+        [
+            {
+                "owner_id": owner_id,
+                "asset_name": asset_name,
+                "cost_asset": cost_asset,
+                "platform_id": platform_id,
+                "total_amount": amount,
+                "total_cost": cost,
+            }
+            for (asset_name, cost_asset, platform_id), (amount, cost) in merged.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={
+            "total_amount": models.Holding.total_amount + stmt.excluded.total_amount,
+            "total_cost": models.Holding.total_cost + stmt.excluded.total_cost,
+        },
+    )
+    db.execute(stmt)
+
+
+def apply_transaction(
+    db: Session, transaction: models.Transaction, sign: int = 1
+) -> None:
+    apply_deltas(db, transaction.owner_id, deltas_for(transaction, sign))
+
+
+def compute_holdings(db: Session, user_id: Optional[int] = None) -> dict:
+    columns = portfolio.load_columns(db, None if user_id is None else [user_id])
+    return {
+        (owner_id, asset_name, cost_asset, platform_id): [amount, cost]
+        for owner_id, asset_name, cost_asset, platform_id, amount, cost in (
+            portfolio.compute(columns, positive_only=False)
+        )
+    }
+
+
+def _stored_holdings(db: Session, user_id: Optional[int]) -> dict:
+    query = db.query(models.Holding)
+    if user_id is not None:
+        query = query.filter(models.Holding.owner_id == user_id)
+    return {
+        tuple(getattr(holding, column) for column in _KEY_COLUMNS): (
+            holding.total_amount,
+            holding.total_cost,
+        )
+        for holding in query
+    }
+
+
+def verify(db: Session, user_id: Optional[int] = None) -> List[dict]:
+    expected = compute_holdings(db, user_id)
+    stored = _stored_holdings(db, user_id)
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=repr):
+        expected_amount, expected_cost = expected.get(key, (0, 0))
+        stored_amount, stored_cost = stored.get(key, (0, 0))
+        if _close(expected_amount, stored_amount) and _close(
+            expected_cost, stored_cost
+        ):
+            continue
+        drift.append(
+            {
+                **dict(zip(_KEY_COLUMNS, key)),
+                "expected_amount": expected_amount,
+                "stored_amount": stored_amount,
+                "expected_cost": expected_cost,
+                "stored_cost": stored_cost,
+            }
+        )
+    return drift
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    query = db.query(models.Holding)
+    if user_id is not None:
+        query = query.filter(models.Holding.owner_id == user_id)
+    query.delete(synchronize_session=False)
+
+    holdings = compute_holdings(db, user_id)
+    if holdings:
+        db.execute(
+            models.Holding.__table__.insert(),
+            [
+                {
+                    **dict(zip(_KEY_COLUMNS, key)),
+                    "total_amount": amount,
+                    "total_cost": cost,
+                }
+                for key, (amount, cost) in holdings.items()
+            ],
+        )
+    return len(holdings)
+
+
+def _close(a: float, b: float) -> bool:
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def main(argv: Optional[list] = None) -> int:
+    from app import crud
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.holdings",
+        description="Rebuild or verify the materialized holdings table.",
+    )
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db, args.user_id)
+            crud.bump_data_versions(db, args.user_id)
+            db.commit()
+            print(f"Rebuilt {count} holdings")
+            return 0
+
+        drift = verify(db, args.user_id)
+        for row in drift:
+            print(
+                "owner={owner_id} asset={asset_name} cost_asset={cost_asset!r} "
+                "platform={platform_id}: amount {stored_amount} != {expected_amount}, "
+                "cost {stored_cost} != {expected_cost}".format(**row)
+            )
+        print(f"{len(drift)} holdings drifted")
+        return 1 if drift else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Iterator, List
+
+from pydantic import ValidationError
+
+from app import crud, crud_async, events, history, lots, models, schemas
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_MEDIA_TYPES = ("text/csv", "application/csv")
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl", "application/json")
+
+
+def detect_format(content_type: str) -> str | None:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in CSV_MEDIA_TYPES:
+        return "csv"
+    if media_type in NDJSON_MEDIA_TYPES:
+        return "ndjson"
+    return None
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def _csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # A record is complete once its quotes are balanced, so quoted fields may
+    # span several physical lines.
+    record = ""
+    async for line in _lines(chunks):
+        record += line
+        if record.count('"') % 2 == 0:
+            if record.strip():
+                yield record
+            record = ""
+    if record.strip():
+        yield record
+
+
+def _parse_csv(header: List[str], records: List[str]) -> Iterator:
+    for values in csv.reader(records):
+        if len(values) != len(header):
+            yield ValueError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield {
+            key: (value if value != "" else None) for key, value in zip(header, values)
+        }
+
+
+def _parse_ndjson(records: List[str]) -> Iterator:
+    for record in records:
+        try:
+            value = json.loads(record)
+        except ValueError as e:
+            yield ValueError(f"invalid JSON: {e}")
+            continue
+        yield value if isinstance(value, dict) else ValueError("expected an object")
+
+
+class TransactionImporter:
+    def __init__(self, db, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[schemas.ImportRowError] = []
+        self._rows_seen = 0
+        self._platform_ids = None
+        self._history_from = {}
+
+    def _error(self, row: int, messages: List[str]) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.ImportRowError(row=row, errors=messages))
+
+    async def _flush(self, parsed: List) -> None:
+        if self._platform_ids is None:
+            platforms = await crud_async.get_platforms_by_user(self.db, self.user_id)
+            self._platform_ids = {platform.id for platform in platforms}
+
+        rows = []
+        for item in parsed:
+            self._rows_seen += 1
+            if isinstance(item, Exception):
+                self._error(self._rows_seen, [str(item)])
+                continue
+            try:
+                transaction = schemas.TransactionCreate.model_validate(item)
+                models.TransactionType(transaction.transaction_type)
+            except ValidationError as e:
+                self._error(
+                    self._rows_seen,
+                    [
+                        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                        for error in e.errors()
+                    ],
+                )
+                continue
+            except ValueError:
+                self._error(
+                    self._rows_seen,
+                    [
+                        f"transaction_type: invalid value {transaction.transaction_type!r}"
+                    ],
+                )
+                continue
+            if transaction.platform_id not in self._platform_ids:
+                self._error(self._rows_seen, ["platform_id: platform not found"])
+                continue
+            rows.append(transaction.model_dump())
+            history.touch(self._history_from, transaction.platform_id, transaction.date)
+
+        if rows:
+            await crud_async.run(self.db, crud.import_transactions, rows, self.user_id)
+            self.inserted += len(rows)
+
+    async def run(
+        self, chunks: AsyncIterator[bytes], fmt: str, commit: bool = True
+    ) -> schemas.ImportResult:
+        # With commit=False the caller commits the import, e.g. together
+        # with the background job that ran it.
+        header = None
+        batch = []
+        async for record in (_csv_records(chunks) if fmt == "csv" else _lines(chunks)):
+            if fmt == "csv" and header is None:
+                header = [name.strip() for name in next(csv.reader([record]))]
+                continue
+            if fmt == "ndjson" and not record.strip():
+                continue
+            batch.append(record)
+            if len(batch) >= BATCH_SIZE:
+                await self._flush(self._parse(header, batch, fmt))
+                batch = []
+        if batch:
+            await self._flush(self._parse(header, batch, fmt))
+
+        await crud_async.run(
+            self.db, history.recompute, self.user_id, self._history_from
+        )
+        await crud_async.run(self.db, lots.refresh, self.user_id)
+        if self.inserted:
+            await crud_async.run(
+                self.db,
+                events.record,
+                self.user_id,
+                "transactions.imported",
+                {"inserted": self.inserted},
+            )
+        if commit:
+            await crud_async.commit(self.db)
+        return schemas.ImportResult(
+            inserted=self.inserted, failed=self.failed, errors=self.errors
+        )
+
+    @staticmethod
+    def _parse(header, batch, fmt) -> List:
+        if fmt == "csv":
+            return list(_parse_csv(header, batch))
+        return list(_parse_ndjson(batch))
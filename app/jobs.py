@@ -0,0 +1,458 @@
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import crud, history, holdings, imports, lots, models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+INPUT_CHUNK_SIZE = 64 * 1024
+
+handlers: Dict[str, Callable] = {}
+
+enqueue_stats = {"enqueued": 0, "deduplicated": 0}
+
+
+def handler(kind: str):
+    """Register the function that runs jobs of this kind. It is called with
+    the worker's session and a JobContext, may be a coroutine function, and
+    returns the job's JSON result. What it leaves uncommitted is committed
+    together with the job's success, so a handler that writes in a single
+    transaction takes effect exactly once. Anything it commits itself must
+    be safe to redo: retries start over from the beginning."""
+
+    def register(fn):
+        handlers[kind] = fn
+        return fn
+
+    return register
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    owner_id: Optional[int] = None,
+    payload: Optional[dict] = None,
+    input: Optional[bytes] = None,
+    dedup_key: Optional[str] = None,
+) -> Tuple[models.Job, bool]:
+    """Queue a job and commit. If a queued or running job has the same
+    dedup_key, that job is returned instead; the flag says which happened."""
+    if kind not in handlers:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    if dedup_key is not None:
+        existing = _active(db, dedup_key)
+        if existing is not None:
+            enqueue_stats["deduplicated"] += 1
+            return existing, False
+    now = datetime.utcnow()
+    job = models.Job(
+        kind=kind,
+        owner_id=owner_id,
+        dedup_key=dedup_key,
+        status=models.JobStatus.QUEUED,
+        payload=payload or {},
+        input=input,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=now,
+        created_at=now,
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request queued the same job in between.
+        db.rollback()
+        existing = _active(db, dedup_key)
+        if existing is None:
+            raise
+        enqueue_stats["deduplicated"] += 1
+        return existing, False
+    db.refresh(job)
+    enqueue_stats["enqueued"] += 1
+    return job, True
+
+
+def _active(db: Session, dedup_key: str) -> Optional[models.Job]:
+    return db.scalar(select(models.Job).where(models.Job.dedup_key == dedup_key))
+
+
+def get_job(db: Session, job_id: int, owner_id: int) -> Optional[models.Job]:
+    return db.scalar(
+        select(models.Job).where(
+            models.Job.id == job_id, models.Job.owner_id == owner_id
+        )
+    )
+
+
+def get_jobs(db: Session, owner_id: int, limit: int = 50) -> list:
+    return list(
+        db.scalars(
+            select(models.Job)
+            .where(models.Job.owner_id == owner_id)
+            .order_by(models.Job.id.desc())
+            .limit(limit)
+        )
+    )
+
+
+def claim(db: Session, worker: str) -> Optional[models.Job]:
+    """Take the next due job. On PostgreSQL the candidate row is locked with
+    FOR UPDATE SKIP LOCKED, so concurrent workers pick different jobs
+    without waiting on each other; the conditional UPDATE makes the claim
+    safe on databases without row locks too."""
+    job = models.Job
+    for _ in range(3):
+        now = datetime.utcnow()
+        job_id = db.scalar(
+            select(job.id)
+            .where(job.status == models.JobStatus.QUEUED, job.run_after <= now)
+            .order_by(job.run_after, job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if job_id is None:
+            db.rollback()
+            return None
+        claimed = db.execute(
+            update(job)
+            .where(job.id == job_id, job.status == models.JobStatus.QUEUED)
+            .values(
+                status=models.JobStatus.RUNNING,
+                attempts=job.attempts + 1,
+                worker=worker,
+                started_at=now,
+                heartbeat_at=now,
+                error=None,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(job, job_id)
+    return None
+
+
+def requeue_expired(db: Session) -> int:
+    """Return running jobs whose worker stopped heartbeating to the queue,
+    or fail them if they are out of attempts."""
+    job = models.Job
+    expired = datetime.utcnow() - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    stale = (job.status == models.JobStatus.RUNNING, job.heartbeat_at < expired)
+    failed = db.execute(
+        update(job)
+        .where(*stale, job.attempts >= job.max_attempts)
+        .values(
+            status=models.JobStatus.FAILED,
+            dedup_key=None,
+            error="The worker running the job stopped responding",
+            finished_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    requeued = db.execute(
+        update(job)
+        .where(*stale)
+        .values(status=models.JobStatus.QUEUED, worker=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return failed + requeued
+
+
+class JobContext:
+    def __init__(self, job: models.Job, worker: str, session_factory):
+        self.job_id = job.id
+        self.owner_id = job.owner_id
+        self.payload = job.payload
+        self.attempt = job.attempts
+        self.worker = worker
+        self._session_factory = session_factory
+        self._reported_at = 0.0
+
+    def input(self) -> Optional[bytes]:
+        db = self._session_factory()
+        try:
+            return db.scalar(
+                select(models.Job.input).where(models.Job.id == self.job_id)
+            )
+        finally:
+            db.close()
+
+    def progress(self, fraction: float, force: bool = False) -> None:
+        """Record progress between 0 and 1, which also renews the lease.
+        Written in its own transaction, at most once a second unless forced."""
+        now = time.monotonic()
+        if not force and now - self._reported_at < 1:
+            return
+        self._reported_at = now
+        self._update(
+            progress=min(max(fraction, 0.0), 1.0), heartbeat_at=datetime.utcnow()
+        )
+
+    def renew(self) -> None:
+        """Renew the lease, in its own transaction."""
+        self._update(heartbeat_at=datetime.utcnow())
+
+    def _update(self, **values) -> None:
+        db = self._session_factory()
+        try:
+            db.execute(
+                update(models.Job)
+                .where(models.Job.id == self.job_id, models.Job.worker == self.worker)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+class Heartbeat:
+    # Renews a running job's lease from a thread every interval seconds, so
+    # that a handler step longer than JOB_LEASE_SECONDS is not mistaken for
+    # an abandoned job and run a second time by another worker.
+
+    def __init__(self, context: JobContext, interval: float):
+        self.context = context
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.context.renew()
+            except Exception:
+                # E.g. SQLite is locked by the job's own open transaction;
+                # the next beat tries again.
+                logger.warning(
+                    "Could not renew the lease of job %s",
+                    self.context.job_id,
+                    exc_info=True,
+                )
+
+
+def _finish(db: Session, job: models.Job, claimed_by: str, **values) -> bool:
+    # Only the worker holding the claim may settle the job: if its lease
+    # expired and another worker took the job over, the update matches
+    # nothing and whatever the handler left uncommitted is rolled back.
+    settled = db.execute(
+        update(models.Job)
+        .where(
+            models.Job.id == job.id,
+            models.Job.worker == claimed_by,
+            models.Job.status == models.JobStatus.RUNNING,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if settled:
+        db.commit()
+    else:
+        db.rollback()
+    return bool(settled)
+
+
+def run_job(job: models.Job, worker: str, session_factory) -> bool:
+    """Run a claimed job; returns whether it succeeded. A failure is retried
+    with exponential backoff until the job runs out of attempts. The lease
+    is renewed from a heartbeat thread while the handler runs."""
+    context = JobContext(job, worker, session_factory)
+    db = session_factory()
+    try:
+        try:
+            with Heartbeat(context, settings.JOB_LEASE_SECONDS / 3):
+                result = handlers[job.kind](db, context)
+                if inspect.iscoroutine(result):
+                    result = asyncio.run(result)
+        except Exception:
+            db.rollback()
+            error = traceback.format_exc(limit=20)
+            if job.attempts < job.max_attempts:
+                delay = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+                logger.warning(
+                    "Job %s (%s) failed, retrying in %ss", job.id, job.kind, delay
+                )
+                _finish(
+                    db,
+                    job,
+                    worker,
+                    status=models.JobStatus.QUEUED,
+                    worker=None,
+                    error=error,
+                    run_after=datetime.utcnow() + timedelta(seconds=delay),
+                )
+            else:
+                logger.error("Job %s (%s) failed: %s", job.id, job.kind, error)
+                _finish(
+                    db,
+                    job,
+                    worker,
+                    status=models.JobStatus.FAILED,
+                    dedup_key=None,
+                    error=error,
+                    finished_at=datetime.utcnow(),
+                )
+            return False
+        # Committed in one transaction with the handler's remaining writes.
+        if not _finish(
+            db,
+            job,
+            worker,
+            status=models.JobStatus.SUCCEEDED,
+            dedup_key=None,
+            input=None,
+            progress=1.0,
+            result=result,
+            finished_at=datetime.utcnow(),
+        ):
+            logger.warning(
+                "Job %s (%s) was taken over by another worker; discarded its result",
+                job.id,
+                job.kind,
+            )
+            return False
+        return True
+    finally:
+        db.close()
+
+
+def work(
+    session_factory, worker: str, once: bool = False, stop: Optional[Callable] = None
+) -> int:
+    """Claim and run jobs until stop() is true, sleeping while the queue is
+    empty; with once, return when it is. Returns the number of jobs run."""
+    stop = stop or (lambda: False)
+    count = 0
+    last_sweep = 0.0
+    while not stop():
+        db = session_factory()
+        try:
+            if time.monotonic() - last_sweep >= settings.JOB_LEASE_SECONDS / 2:
+                requeue_expired(db)
+                last_sweep = time.monotonic()
+            job = claim(db, worker)
+        finally:
+            db.close()
+        if job is None:
+            if once:
+                break
+            time.sleep(settings.JOB_POLL_INTERVAL_SECONDS)
+            continue
+        logger.info("Running job %s (%s), attempt %s", job.id, job.kind, job.attempts)
+        run_job(job, worker, session_factory)
+        count += 1
+    return count
+
+
+@handler("rebuild")
+def rebuild(db: Session, context: JobContext) -> dict:
+    # Rebuilds the derived tables of one user, or of everyone for owner_id
+    # None. Each step replaces its table wholesale, so a retry simply redoes
+    # it; committing between steps lets progress be written on SQLite too.
+    owner_id = context.owner_id
+    result = {}
+    steps = (
+        ("holdings", holdings.rebuild),
+        ("history_platforms", history.rebuild),
+        ("positions", lots.rebuild),
+    )
+    for index, (name, step) in enumerate(steps):
+        result[name] = step(db, owner_id)
+        crud.bump_data_versions(db, owner_id)
+        db.commit()
+        context.progress((index + 1) / len(steps), force=True)
+    return result
+
+
+async def _chunks(data: bytes, context: JobContext, live: bool) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), INPUT_CHUNK_SIZE):
+        if live and start:
+            context.progress(start / len(data))
+        yield data[start : start + INPUT_CHUNK_SIZE]
+
+
+@handler("import")
+async def import_transactions(db: Session, context: JobContext) -> dict:
+    # The import is left uncommitted and run_job commits it together with
+    # the job's success, so an attempt that dies or loses its lease leaves
+    # nothing behind, and a file is never imported twice. SQLite allows one
+    # writer at a time, so progress cannot be written while the import's
+    # transaction is open and is only reported at the end there.
+    data = context.input() or b""
+    live = db.get_bind().dialect.name != "sqlite"
+    importer = imports.TransactionImporter(db, context.owner_id)
+    result = await importer.run(
+        _chunks(data, context, live), context.payload["format"], commit=False
+    )
+    return result.model_dump()
+
+
+def main(argv: Optional[list] = None) -> int:
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.jobs",
+        description="Run background jobs, or queue one.",
+    )
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subcommands.add_parser("worker", help="claim and run jobs")
+    worker_parser.add_argument(
+        "--once", action="store_true", help="exit when the queue is empty"
+    )
+    enqueue_parser = subcommands.add_parser("enqueue", help="queue a rebuild")
+    enqueue_parser.add_argument("kind", choices=["rebuild"])
+    enqueue_parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        db = SessionLocal()
+        try:
+            job, created = enqueue(
+                db,
+                args.kind,
+                owner_id=args.user_id,
+                dedup_key=f"{args.kind}:{args.user_id or '*'}",
+            )
+            print(f"{'Queued' if created else 'Already queued'}: job {job.id}")
+        finally:
+            db.close()
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    stopping = []
+    # Finish the running job on SIGTERM/SIGINT, then exit.
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.append(True))
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    count = work(SessionLocal, worker, once=args.once, stop=lambda: bool(stopping))
+    print(f"Ran {count} jobs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
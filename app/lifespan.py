@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import database
+from app.config import settings
+from app.events import broker
+from app.hashing import password_hasher
+
+logger = logging.getLogger(__name__)
+
+startup_stats = {"warmed_connections": 0, "warmup_s": None}
+
+
+def serving_engines() -> list:
+    # The engines request handlers check connections out of.
+    if settings.ASYNC_DATABASE:
+        engines = [database.async_engine, database.async_read_engine]
+    else:
+        engines = [database.engine, database.read_engine]
+    return [engine for engine in engines if engine is not None]
+
+
+async def _open(engine):
+    if isinstance(engine, AsyncEngine):
+        return await engine.connect()
+    return await run_in_threadpool(engine.connect)
+
+
+async def _close(connection) -> None:
+    if hasattr(connection, "sync_connection"):
+        await connection.close()
+    else:
+        await run_in_threadpool(connection.close)
+
+
+async def warm_pools(count: int) -> int:
+    """Open count connections on every serving engine at once and return
+    them to their pools, so the first requests do not pay for connecting.
+
+    A database that is unreachable at startup is logged, not raised: the
+    pools connect on demand as before and requests report the error.
+    """
+    engines = serving_engines()
+    count = min(count, settings.DB_POOL_SIZE)
+    if count <= 0:
+        return 0
+    results = await asyncio.gather(
+        *(_open(engine) for engine in engines for _ in range(count)),
+        return_exceptions=True,
+    )
+    connections = [result for result in results if not isinstance(result, Exception)]
+    for error in {str(result) for result in results if isinstance(result, Exception)}:
+        logger.warning("Could not warm the connection pool: %s", error)
+    await asyncio.gather(*(_close(connection) for connection in connections))
+    return len(connections)
+
+
+async def dispose_engines() -> None:
+    for engine in (database.async_engine, database.async_read_engine):
+        if engine is not None:
+            await engine.dispose()
+    for engine in (database.engine, database.read_engine):
+        if engine is not None:
+            await run_in_threadpool(engine.dispose)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importing the app does no I/O; the schema is managed by Alembic and
+    # everything else that is expensive (password hashing processes, the
+    # event listener, Redis) starts on first use.
+    started = time.perf_counter()
+    startup_stats["warmed_connections"] = await warm_pools(settings.DB_POOL_WARMUP)
+    startup_stats["warmup_s"] = round(time.perf_counter() - started, 6)
+    yield
+    broker.shutdown()
+    await run_in_threadpool(password_hasher.shutdown)
+    await dispose_engines()
@@ -0,0 +1,458 @@
+import argparse
+import sys
+from collections import deque
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional, Union
+
+from sqlalchemy import Select, and_, func, insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app import models, pagination
+from app.models import CostBasisMethod, TransactionType
+
+_insert_by_dialect = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+_KEY_COLUMNS = ("owner_id", "asset_name", "cost_asset", "platform_id")
+
+_INCOMING = (TransactionType.DEPOSIT, TransactionType.BUY, TransactionType.AIRDROP)
+
+_TRADES = (TransactionType.BUY, TransactionType.SELL)
+
+EPSILON = 1e-12
+
+
+def position_key(owner_id: int, asset_name: str, cost_asset, platform_id) -> tuple:
+    return (owner_id, asset_name, cost_asset or "", platform_id)
+
+
+class _Leg(NamedTuple):
+    id: Optional[int]
+    transaction_type: TransactionType
+    amount: float
+    cost: Optional[float]
+    date: Optional[datetime]
+
+
+def position_keys(
+    asset_name: str, cost_asset: Optional[str], transaction_type, platform_id
+) -> list:
+    """The (asset_name, cost_asset, platform_id) positions a transaction moves:
+    its asset, and for trades priced in another asset that asset as well."""
+    keys = [(asset_name, cost_asset or "", platform_id)]
+    if cost_asset and TransactionType(transaction_type) in _TRADES:
+        keys.append((cost_asset, "", platform_id))
+    return keys
+
+
+def _leg(transaction, key: tuple) -> _Leg:
+    # Mirrors holdings.transaction_deltas: the cost of a trade leaves the
+    # cost-asset position on a BUY and comes into it on a SELL, carrying no
+    # basis of its own.
+    transaction_type = TransactionType(transaction.transaction_type)
+    if (key[1], key[2]) == (transaction.asset_name, transaction.cost_asset or ""):
+        return _Leg(
+            transaction.id,
+            transaction_type,
+            transaction.amount,
+            transaction.cost,
+            transaction.date,
+        )
+    return _Leg(
+        transaction.id,
+        (
+            TransactionType.WITHDRAW
+            if transaction_type == TransactionType.BUY
+            else TransactionType.DEPOSIT
+        ),
+        transaction.cost or 0,
+        0,
+        transaction.date,
+    )
+
+
+def _order_key(date: Optional[datetime], transaction_id: Optional[int]) -> tuple:
+    # Same ordering as the transaction listing: undated rows first, then by
+    # (date, id).
+    return (date is not None, date or datetime.min, transaction_id or 0)
+
+
+def _take(lots: Iterable, quantity: float) -> tuple:
+    # Consumes quantity from lots in iteration order, splitting the last lot
+    # proportionally. Returns the consumed basis and the lots fully closed.
+    basis = 0.0
+    closed = []
+    for lot in lots:
+        if lot.quantity <= quantity + EPSILON:
+            basis += lot.cost
+            quantity -= lot.quantity
+            closed.append(lot)
+        else:
+            part = lot.cost * quantity / lot.quantity
+            lot.quantity -= quantity
+            lot.cost -= part
+            basis += part
+            quantity = 0
+        if quantity <= EPSILON:
+            break
+    return basis, closed
+
+
+def _apply(position, transaction, open_lots, add_lot, remove_lot) -> None:
+    transaction_type = TransactionType(transaction.transaction_type)
+    amount = transaction.amount
+    cost = transaction.cost or 0
+
+    if transaction_type in _INCOMING:
+        position.quantity += amount
+        position.cost_basis += cost
+        if position.method != CostBasisMethod.AVERAGE:
+            add_lot(
+                models.Lot(
+                    position_id=position.id,
+                    transaction_id=transaction.id,
+                    date=transaction.date,
+                    quantity=amount,
+                    cost=cost,
+                )
+            )
+    else:
+        # Quantities sold or withdrawn beyond the open lots carry no basis.
+        available = min(amount, max(position.quantity, 0))
+        basis = 0.0
+        if available > EPSILON:
+            if position.method == CostBasisMethod.AVERAGE:
+                basis = position.cost_basis * available / position.quantity
+            else:
+                basis, closed = _take(open_lots(), available)
+                for lot in closed:
+                    remove_lot(lot)
+            position.quantity -= available
+            position.cost_basis -= basis
+        if position.quantity <= EPSILON:
+            position.quantity = 0.0
+            position.cost_basis = 0.0
+        if transaction_type == TransactionType.SELL:
+            position.realized_proceeds += cost
+            position.realized_cost_basis += basis
+
+    position.last_date = transaction.date
+    position.last_transaction_id = transaction.id
+
+
+def _filter_key(query, entity, key: tuple):
+    owner_id, asset_name, cost_asset, platform_id = key
+    return query.filter(
+        entity.owner_id == owner_id,
+        entity.asset_name == asset_name,
+        func.coalesce(entity.cost_asset, "") == cost_asset,
+        entity.platform_id == platform_id,
+    )
+
+
+def _filter_legs(query, entity, key: tuple):
+    # Transactions with a leg on the position: those of its asset, and for a
+    # position without a cost asset, the trades priced in that asset.
+    owner_id, asset_name, cost_asset, platform_id = key
+    legs = and_(
+        entity.asset_name == asset_name,
+        func.coalesce(entity.cost_asset, "") == cost_asset,
+    )
+    if not cost_asset:
+        legs = or_(
+            legs,
+            and_(
+                entity.cost_asset == asset_name,
+                entity.transaction_type.in_(_TRADES),
+            ),
+        )
+    return query.filter(
+        entity.owner_id == owner_id, entity.platform_id == platform_id, legs
+    )
+
+
+def mark_stale(db: Session, owner_id: int, keys: Iterable[tuple]) -> None:
+    # Creates missing positions and flags existing ones. The upsert locks the
+    # flagged rows, and the write replays them with refresh before it
+    # commits, so reads never find a stale position.
+    keys = {
+        position_key(owner_id, asset_name, cost_asset, platform_id)
+        for asset_name, cost_asset, platform_id in keys
+        if platform_id is not None
+    }
+    if not keys:
+        return
+
+    insert = _insert_by_dialect[db.get_bind().dialect.name]
+    stmt = insert(models.Position).values(
+        [
+            {
+                **dict(zip(_KEY_COLUMNS, key)),
+                "method": method,
+                "quantity": 0,
+                "cost_basis": 0,
+                "realized_proceeds": 0,
+                "realized_cost_basis": 0,
+                "stale": True,
+            }
+            for key in sorted(keys)
+            for method in CostBasisMethod
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[*_KEY_COLUMNS, "method"], set_={"stale": True}
+    )
+    db.execute(stmt)
+
+
+def apply_transaction(db: Session, transaction: models.Transaction) -> None:
+    # Appends a transaction to its positions. Each open-lot lookup walks the
+    # (position_id, date, transaction_id) index from one end, so an in-order
+    # append costs O(log n) per lot it touches. Backdated transactions and
+    # positions that were never replayed fall back to mark_stale.
+    if transaction.platform_id is None:
+        return
+    db.flush()
+
+    order = _order_key(transaction.date, transaction.id)
+    for key in position_keys(
+        transaction.asset_name,
+        transaction.cost_asset,
+        transaction.transaction_type,
+        transaction.platform_id,
+    ):
+        key = (transaction.owner_id, *key)
+        positions = _filter_key(db.query(models.Position), models.Position, key).all()
+        if len(positions) < len(CostBasisMethod) or any(
+            position.stale
+            or order <= _order_key(position.last_date, position.last_transaction_id)
+            for position in positions
+        ):
+            mark_stale(db, key[0], [key[1:]])
+            continue
+
+        leg = _leg(transaction, key)
+        for position in positions:
+            descending = position.method == CostBasisMethod.LIFO
+            _apply(
+                position,
+                leg,
+                open_lots=lambda: (
+                    db.query(models.Lot)
+                    .filter(models.Lot.position_id == position.id)
+                    .order_by(
+                        *pagination.keyset_order(
+                            models.Lot.date, models.Lot.transaction_id, descending
+                        )
+                    )
+                    .yield_per(64)
+                ),
+                add_lot=db.add,
+                remove_lot=db.delete,
+            )
+
+
+def replay(db: Session, key: tuple) -> None:
+    positions = {
+        position.method: position
+        for position in _filter_key(
+            db.query(models.Position), models.Position, key
+        ).all()
+    }
+    if positions:
+        db.query(models.Lot).filter(
+            models.Lot.position_id.in_([position.id for position in positions.values()])
+        ).delete(synchronize_session=False)
+
+    for method in CostBasisMethod:
+        position = positions.get(method)
+        if position is None:
+            position = models.Position(**dict(zip(_KEY_COLUMNS, key)), method=method)
+            db.add(position)
+            positions[method] = position
+        position.quantity = 0.0
+        position.cost_basis = 0.0
+        position.realized_proceeds = 0.0
+        position.realized_cost_basis = 0.0
+        position.last_date = None
+        position.last_transaction_id = None
+        position.stale = False
+    db.flush()
+
+    transaction = models.Transaction
+    statement = _filter_legs(
+        select(
+            transaction.id,
+            transaction.asset_name,
+            transaction.cost_asset,
+            transaction.transaction_type,
+            transaction.amount,
+            transaction.cost,
+            transaction.date,
+        ),
+        transaction,
+        key,
+    ).order_by(*pagination.keyset_order(transaction.date, transaction.id))
+
+    books = {method: deque() for method in positions}
+    handlers = [
+        (
+            position,
+            books[method],
+            reversed if method == CostBasisMethod.LIFO else iter,
+            (
+                books[method].pop
+                if method == CostBasisMethod.LIFO
+                else books[method].popleft
+            ),
+        )
+        for method, position in positions.items()
+    ]
+    replayed = 0
+    for row in db.execute(statement.execution_options(yield_per=1000)):
+        replayed += 1
+        leg = _leg(row, key)
+        for position, book, walk, pop in handlers:
+            _apply(
+                position,
+                leg,
+                open_lots=lambda: walk(book),
+                add_lot=book.append,
+                remove_lot=lambda lot: pop(),
+            )
+
+    if not replayed:
+        for position in positions.values():
+            db.delete(position)
+        return
+    # One executemany for all open lots; the ORM would insert them one by one
+    # to fetch back their ids.
+    rows = [
+        {
+            "position_id": lot.position_id,
+            "transaction_id": lot.transaction_id,
+            "date": lot.date,
+            "quantity": lot.quantity,
+            "cost": lot.cost,
+        }
+        for book in books.values()
+        for lot in book
+    ]
+    if rows:
+        db.execute(insert(models.Lot), rows)
+
+
+def refresh(db: Session, owner_id: Optional[int] = None) -> int:
+    # Stale positions that another transaction holds locked are skipped: that
+    # transaction marked them and replays them itself before committing.
+    query = db.query(
+        *(getattr(models.Position, column) for column in _KEY_COLUMNS)
+    ).filter(models.Position.stale.is_(True))
+    if owner_id is not None:
+        query = query.filter(models.Position.owner_id == owner_id)
+    if db.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    keys = sorted({tuple(row) for row in query})
+    for key in keys:
+        replay(db, key)
+    return len(keys)
+
+
+def rebuild(db: Session, owner_id: Optional[int] = None) -> int:
+    query = db.query(
+        models.Transaction.owner_id,
+        models.Transaction.asset_name,
+        models.Transaction.cost_asset,
+        models.Transaction.transaction_type,
+        models.Transaction.platform_id,
+    ).distinct()
+    if owner_id is not None:
+        query = query.filter(models.Transaction.owner_id == owner_id)
+    keys = {}
+    for row in query:
+        keys.setdefault(row.owner_id, []).extend(
+            position_keys(
+                row.asset_name, row.cost_asset, row.transaction_type, row.platform_id
+            )
+        )
+    for owner, owner_keys in keys.items():
+        mark_stale(db, owner, owner_keys)
+    return refresh(db, owner_id)
+
+
+def delete_platform_positions(
+    db: Session, platform_ids: Union[List[int], Select]
+) -> None:
+    position_ids = select(models.Position.id).where(
+        models.Position.platform_id.in_(platform_ids)
+    )
+    db.query(models.Lot).filter(models.Lot.position_id.in_(position_ids)).delete(
+        synchronize_session=False
+    )
+    db.query(models.Position).filter(
+        models.Position.platform_id.in_(platform_ids)
+    ).delete(synchronize_session=False)
+
+
+def cost_basis(db: Session, owner_id: int, method: CostBasisMethod) -> List[dict]:
+    rows = (
+        db.query(models.Position, models.Platform.name)
+        .join(models.Platform, models.Platform.id == models.Position.platform_id)
+        .filter(
+            models.Position.owner_id == owner_id,
+            models.Position.method == method,
+        )
+        .order_by(
+            models.Position.asset_name,
+            models.Position.cost_asset,
+            models.Platform.name,
+        )
+    )
+    return [
+        {
+            "asset_name": position.asset_name,
+            "cost_asset": position.cost_asset,
+            "platform_name": platform_name,
+            "method": method.value,
+            "quantity": position.quantity,
+            "cost_basis": position.cost_basis,
+            "average_cost": (
+                position.cost_basis / position.quantity if position.quantity else 0.0
+            ),
+            "realized_proceeds": position.realized_proceeds,
+            "realized_cost_basis": position.realized_cost_basis,
+            "realized_pnl": position.realized_proceeds - position.realized_cost_basis,
+        }
+        for position, platform_name in rows
+    ]
+
+
+def main(argv: Optional[list] = None) -> int:
+    from app import crud
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.lots",
+        description="Replay cost-basis positions and lots from transactions.",
+    )
+    parser.add_argument("command", choices=["rebuild", "refresh"])
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db, args.user_id)
+            crud.bump_data_versions(db, args.user_id)
+        else:
+            count = refresh(db, args.user_id)
+        db.commit()
+        print(f"Replayed {count} positions")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
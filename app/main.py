@@ -1,14 +1,29 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app import models
-from app.database import engine
-from app.routers import assets, platforms, token, transactions, users
-
-models.Base.metadata.create_all(bind=engine)
+from app.config import settings
+from app.dependencies import require_stats_token
+from app.lifespan import lifespan
+from app.metrics import MetricsMiddleware, register_routes
+from app.rate_limit import RateLimitMiddleware
+from app.routers import (
+    assets,
+    events,
+    jobs,
+    metrics,
+    platforms,
+    stats,
+    token,
+    transactions,
+    users,
+)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
+# Added first so it runs innermost: rejections still get CORS headers and
+# are counted by the metrics middleware.
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -16,12 +31,35 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 
-app.include_router(users.router, prefix="/users", tags=["Users"])
-app.include_router(token.router, prefix="/token", tags=["Token"])
-app.include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
-app.include_router(platforms.router, prefix="/platforms", tags=["Platforms"])
-app.include_router(assets.router, prefix="/assets", tags=["Assets"])
+def _include_router(router, prefix: str, **kwargs) -> None:
+    # Also records the full templates for the metrics' route label.
+    app.include_router(router, prefix=prefix, **kwargs)
+    register_routes(router, prefix)
+
+
+_include_router(users.router, prefix="/users", tags=["Users"])
+_include_router(token.router, prefix="/token", tags=["Token"])
+_include_router(transactions.router, prefix="/transactions", tags=["Transactions"])
+_include_router(platforms.router, prefix="/platforms", tags=["Platforms"])
+_include_router(assets.router, prefix="/assets", tags=["Assets"])
+_include_router(
+    stats.router,
+    prefix="/stats",
+    tags=["Stats"],
+    dependencies=[Depends(require_stats_token)],
+)
+_include_router(events.router, prefix="/events", tags=["Events"])
+_include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+if settings.METRICS_ENABLED:
+    _include_router(
+        metrics.router,
+        prefix="/metrics",
+        dependencies=[Depends(require_stats_token)],
+    )
 
 
 @app.get("/")
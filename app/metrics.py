@@ -0,0 +1,403 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter as StatementCounter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (the last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, *labels, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def sum(self, *labels) -> float:
+        series = self._series.get(labels)
+        return series[1] if series else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._series.items()
+            )
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labels, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+# A collector returns (name, kind, documentation, [(labels, value), ...])
+# families computed at scrape time, for numbers the app already tracks.
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[dict, float]]]]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector) -> Collector:
+        self._collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = _format_labels(list(labels), list(labels.values()))
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self._metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+requests_total = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by method, route and status code.",
+        ("method", "route", "status"),
+    )
+)
+requests_in_flight = registry.register(
+    Gauge(
+        "http_requests_in_flight",
+        "HTTP requests being handled, including open event streams.",
+    )
+)
+request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time from receiving a request to sending the last of its body.",
+        ("method", "route"),
+    )
+)
+request_queries = registry.register(
+    Histogram(
+        "http_request_db_queries",
+        "SQL statements executed per request.",
+        ("method", "route"),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+request_db_duration = registry.register(
+    Histogram(
+        "http_request_db_duration_seconds",
+        "Time spent executing SQL statements per request.",
+        ("method", "route"),
+    )
+)
+slow_queries = registry.register(
+    Counter(
+        "db_slow_queries_total",
+        "Statements that took longer than SLOW_QUERY_MS, by route.",
+        ("route",),
+    )
+)
+n_plus_one = registry.register(
+    Counter(
+        "db_n_plus_one_total",
+        "Requests that ran one SELECT at least N_PLUS_ONE_THRESHOLD times.",
+        ("route",),
+    )
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# Full path templates of routes included under a prefix, by id() of the
+# route object. FastAPI matches included routers without copying their
+# routes, so the matched route's own path lacks the prefix.
+route_templates: Dict[int, str] = {}
+
+
+def register_routes(router, prefix: str) -> None:
+    """Record the templates of a router's routes as included under prefix,
+    for the route label of its requests."""
+    for route in router.routes:
+        path = getattr(route, "path", None)
+        if path is not None:
+            route_templates[id(route)] = prefix + path
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time", "slow", "statements")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.slow = 0
+        self.statements = StatementCounter()
+
+    @property
+    def route(self) -> str:
+        # The path template, e.g. /transactions/{transaction_id}, so that
+        # label values stay bounded.
+        if not self.scope or "route" not in self.scope:
+            return UNMATCHED_ROUTE
+        route = self.scope["route"]
+        return route_templates.get(id(route)) or route.path
+
+    def repeated_selects(self, threshold: int) -> List[Tuple[str, int]]:
+        return [
+            (statement, count)
+            for statement, count in self.statements.items()
+            if count >= threshold and statement.lstrip()[:6].upper() == "SELECT"
+        ]
+
+
+# Set by the middleware for the duration of a request. The object is shared,
+# not copied, with the worker threads that run sync database code, so their
+# statements are counted too.
+current_request: contextvars.ContextVar[Optional[RequestStats]] = (
+    contextvars.ContextVar("current_request", default=None)
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["statement_started"].pop()
+    elapsed = time.perf_counter() - started
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] += 1
+    if settings.SLOW_QUERY_MS is not None and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        route = stats.route if stats is not None else None
+        if stats is not None:
+            stats.slow += 1
+        logger.warning(
+            "Slow statement (%.1f ms, route %s): %s",
+            elapsed * 1000,
+            route,
+            statement[:500],
+        )
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_failed_statement(context):
+    started = (
+        context.connection.info.get("statement_started") if context.connection else None
+    )
+    if started:
+        started.pop()
+
+
+def server_timing(stats: RequestStats, elapsed: float) -> bytes:
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f"app;dur={elapsed * 1000:.1f}"
+    ).encode("latin-1")
+
+
+class MetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware, so streamed responses are
+    # passed through untouched and the overhead is a few dictionary updates.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        add_server_timing = settings.SERVER_TIMING
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if add_server_timing:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (
+                            b"server-timing",
+                            server_timing(stats, time.perf_counter() - started),
+                        )
+                    ]
+            await send(message)
+
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            requests_in_flight.dec()
+            current_request.reset(token)
+            self._record(scope["method"], stats, status, started)
+
+    @staticmethod
+    def _record(method: str, stats: RequestStats, status: int, started: float):
+        route = stats.route
+        requests_total.inc(method, route, str(status))
+        request_duration.observe(method, route, value=time.perf_counter() - started)
+        request_queries.observe(method, route, value=stats.queries)
+        request_db_duration.observe(method, route, value=stats.db_time)
+        if stats.slow:
+            slow_queries.inc(route, amount=stats.slow)
+        repeated = stats.repeated_selects(settings.N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            n_plus_one.inc(route)
+            for statement, count in repeated:
+                logger.warning(
+                    "Possible N+1 on %s %s: ran %d times: %s",
+                    method,
+                    route,
+                    count,
+                    statement[:500],
+                )
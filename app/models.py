@@ -1,8 +1,23 @@
 import enum
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    JSON,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 Base = declarative_base()
 
@@ -13,6 +28,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    data_version = Column(Integer, nullable=False, default=0)
     transactions = relationship("Transaction", back_populates="owner")
     platforms = relationship("Platform", back_populates="owner")
 
@@ -25,6 +41,12 @@ class TransactionType(enum.Enum):
     AIRDROP = "AIRDROP"
 
 
+class CostBasisMethod(enum.Enum):
+    FIFO = "FIFO"
+    LIFO = "LIFO"
+    AVERAGE = "AVERAGE"
+
+
 class PlatformType(enum.Enum):
     EXCHANGE = "EXCHANGE"
     BLOCKCHAIN = "BLOCKCHAIN"
@@ -37,13 +59,25 @@ class Platform(Base):
     name = Column(String, nullable=False)
     platform_type = Column(Enum(PlatformType), nullable=False)
     wallet_address = Column(String, nullable=True)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
     owner = relationship("User", back_populates="platforms")
     transactions = relationship("Transaction", back_populates="platform")
 
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_owner_id_date_id", "owner_id", "date", "id"),
+        Index(
+            "ix_transactions_owner_id_asset_name",
+            "owner_id",
+            "asset_name",
+            "cost_asset",
+            "transaction_type",
+            "platform_id",
+            postgresql_include=["amount", "cost"],
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     asset_name = Column(String, nullable=False)
@@ -55,5 +89,159 @@ class Transaction(Base):
     transaction_type = Column(Enum(TransactionType), nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="transactions")
-    platform_id = Column(Integer, ForeignKey("platforms.id"))
+    platform_id = Column(Integer, ForeignKey("platforms.id"), index=True)
     platform = relationship("Platform", back_populates="transactions")
+
+
+class Holding(Base):
+    __tablename__ = "holdings"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_id",
+            "asset_name",
+            "cost_asset",
+            "platform_id",
+            name="uq_holdings_owner_id_asset_platform",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    asset_name = Column(String, nullable=False)
+    cost_asset = Column(String, nullable=False, default="")
+    platform_id = Column(
+        Integer, ForeignKey("platforms.id"), nullable=False, index=True
+    )
+    total_amount = Column(Float, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0)
+
+
+class HoldingSnapshot(Base):
+    __tablename__ = "holding_snapshots"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_id",
+            "platform_id",
+            "asset_name",
+            "cost_asset",
+            "day",
+            name="uq_holding_snapshots_owner_id_platform_asset_day",
+        ),
+        Index("ix_holding_snapshots_owner_id_day", "owner_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    platform_id = Column(
+        Integer, ForeignKey("platforms.id"), nullable=False, index=True
+    )
+    asset_name = Column(String, nullable=False)
+    cost_asset = Column(String, nullable=False, default="")
+    day = Column(Date, nullable=False)
+    total_amount = Column(Float, nullable=False, default=0)
+    total_cost = Column(Float, nullable=False, default=0)
+
+
+class Position(Base):
+    __tablename__ = "positions"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_id",
+            "asset_name",
+            "cost_asset",
+            "platform_id",
+            "method",
+            name="uq_positions_owner_id_asset_platform_method",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    asset_name = Column(String, nullable=False)
+    cost_asset = Column(String, nullable=False, default="")
+    platform_id = Column(
+        Integer, ForeignKey("platforms.id"), nullable=False, index=True
+    )
+    method = Column(Enum(CostBasisMethod), nullable=False)
+    quantity = Column(Float, nullable=False, default=0)
+    cost_basis = Column(Float, nullable=False, default=0)
+    realized_proceeds = Column(Float, nullable=False, default=0)
+    realized_cost_basis = Column(Float, nullable=False, default=0)
+    last_date = Column(DateTime, nullable=True)
+    last_transaction_id = Column(Integer, nullable=True)
+    stale = Column(Boolean, nullable=False, default=True)
+
+
+class Lot(Base):
+    __tablename__ = "lots"
+    __table_args__ = (
+        Index(
+            "ix_lots_position_id_date_transaction_id",
+            "position_id",
+            "date",
+            "transaction_id",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    position_id = Column(Integer, ForeignKey("positions.id"), nullable=False)
+    transaction_id = Column(Integer, nullable=False)
+    date = Column(DateTime, nullable=True)
+    quantity = Column(Float, nullable=False)
+    cost = Column(Float, nullable=False)
+
+
+class Price(Base):
+    # One row per observed price of asset_name in quote units. The unique
+    # index doubles as the (pair, time) index that series are read through.
+    __tablename__ = "prices"
+    __table_args__ = (
+        UniqueConstraint(
+            "asset_name",
+            "quote",
+            "timestamp",
+            name="uq_prices_asset_name_quote_timestamp",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    asset_name = Column(String, nullable=False)
+    quote = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    price = Column(Float, nullable=False)
+
+
+class JobStatus(enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
+class Job(Base):
+    # Background work run by `python -m app.jobs worker`. dedup_key is only
+    # set while the job is queued or running, so its unique constraint folds
+    # repeated triggers into the active job without blocking later runs.
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_after", "status", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    dedup_key = Column(String, nullable=True, unique=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    payload = Column(JSON, nullable=False, default=dict)
+    # Uploaded data the job consumes, e.g. an import file; dropped once the
+    # job succeeds.
+    input = deferred(Column(LargeBinary, nullable=True))
+    progress = Column(Float, nullable=False, default=0)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime, nullable=False)
+    worker = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
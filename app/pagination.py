@@ -0,0 +1,47 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(date: Optional[datetime], id: int) -> str:
+    raw = json.dumps([date.isoformat() if date else None, id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, id = json.loads(raw)
+        return (datetime.fromisoformat(date) if date else None), int(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_after(date_column, id_column, cursor: str, descending: bool = False):
+    # Rows are ordered by (date, id) with undated rows first when ascending
+    # and last when descending.
+    date, id = decode_cursor(cursor)
+    if not descending:
+        if date is None:
+            return or_(
+                and_(date_column.is_(None), id_column > id), date_column.isnot(None)
+            )
+        return or_(date_column > date, and_(date_column == date, id_column > id))
+    if date is None:
+        return and_(date_column.is_(None), id_column < id)
+    return or_(
+        date_column < date,
+        and_(date_column == date, id_column < id),
+        date_column.is_(None),
+    )
+
+
+def keyset_order(date_column, id_column, descending: bool = False) -> tuple:
+    if descending:
+        return date_column.desc().nulls_last(), id_column.desc()
+    return date_column.asc().nulls_first(), id_column.asc()
@@ -0,0 +1,226 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+
+_TYPES = [transaction_type.value for transaction_type in models.TransactionType]
+_TYPE_INDEX = {value: index for index, value in enumerate(_TYPES)}
+
+
+def _per_type(**multipliers) -> np.ndarray:
+    return np.array([multipliers.get(value, 0) for value in _TYPES], dtype=np.float64)
+
+
+# Signed multipliers applied to (amount, cost) for the asset's own key, and to
+# cost for the cost asset's key, following calculate_real_assets.
+_ASSET_AMOUNT = _per_type(DEPOSIT=1, BUY=1, SELL=-1, WITHDRAW=-1, AIRDROP=1)
+_ASSET_COST = _per_type(BUY=1, SELL=-1)
+_COST_KEY_AMOUNT = _per_type(BUY=-1, SELL=1)
+
+_BUY = _TYPE_INDEX["BUY"]
+_SELL = _TYPE_INDEX["SELL"]
+
+
+class PortfolioColumns:
+    def __init__(
+        self,
+        asset_names: Sequence[str],
+        cost_assets: Sequence[Optional[str]],
+        transaction_types: Sequence,
+        platforms: Sequence,
+        amounts: Sequence[float],
+        costs: Sequence[float],
+        owners: Optional[Sequence[int]] = None,
+    ):
+        self.asset_names = asset_names
+        self.cost_assets = [cost_asset or "" for cost_asset in cost_assets]
+        self.type_codes = np.fromiter(
+            (
+                _TYPE_INDEX[getattr(value, "value", value)]
+                for value in transaction_types
+            ),
+            dtype=np.intp,
+            count=len(asset_names),
+        )
+        self.platforms = platforms
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.costs = np.nan_to_num(np.asarray(costs, dtype=np.float64))
+        self.owners = owners
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], platform_key: str = "platform_name"):
+        rows = list(rows)
+        return cls(
+            asset_names=[row["asset_name"] for row in rows],
+            cost_assets=[row["cost_asset"] for row in rows],
+            transaction_types=[row["transaction_type"] for row in rows],
+            platforms=[row[platform_key] for row in rows],
+            amounts=[row["total_amount"] for row in rows],
+            costs=[row["total_cost"] for row in rows],
+            owners=(
+                [row["owner_id"] for row in rows]
+                if rows and "owner_id" in rows[0]
+                else None
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+
+def _codes(values) -> tuple:
+    # Categorical codes in first-seen order; hashing is much cheaper than
+    # sorting object arrays for the low-cardinality columns used here.
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(value, len(index)) for value in values),
+        dtype=np.int64,
+        count=len(values),
+    )
+    return list(index), codes
+
+
+def _combine(columns: List[tuple]) -> np.ndarray:
+    key = np.zeros(len(columns[0][0]), dtype=np.int64)
+    size = 1
+    for codes, cardinality in columns:
+        if size * cardinality >= 2**62:
+            key = np.unique(key, return_inverse=True)[1].astype(np.int64)
+            size = int(key.max()) + 1
+        key = key * cardinality + codes
+        size *= cardinality
+    return key
+
+
+def compute(columns: PortfolioColumns, positive_only: bool = True) -> List[tuple]:
+    # Every transaction row contributes to its own (asset, cost asset,
+    # platform) key and, for BUY and SELL, to its cost asset's key. The two
+    # contributions are interleaved so that bincount accumulates each key in
+    # the same order as the reference loop, which keeps results bit-identical.
+    n = len(columns)
+    if n == 0:
+        return []
+
+    names, name_codes = _codes([*columns.asset_names, *columns.cost_assets, ""])
+    asset_codes = name_codes[:n]
+    cost_codes = name_codes[n : 2 * n]
+    empty_code = name_codes[-1]
+    platforms, platform_codes = _codes(columns.platforms)
+    if columns.owners is not None:
+        owners, owner_codes = _codes(columns.owners)
+    else:
+        owners, owner_codes = [None], np.zeros(n, dtype=np.int64)
+
+    key_asset = np.empty(2 * n, dtype=np.int64)
+    key_asset[0::2] = asset_codes
+    key_asset[1::2] = cost_codes
+    key_cost = np.empty(2 * n, dtype=np.int64)
+    key_cost[0::2] = cost_codes
+    key_cost[1::2] = empty_code
+    keys = _combine(
+        [
+            (np.repeat(owner_codes, 2), len(owners)),
+            (key_asset, len(names)),
+            (key_cost, len(names)),
+            (np.repeat(platform_codes, 2), len(platforms)),
+        ]
+    )
+
+    types = columns.type_codes
+    amount_weights = np.empty(2 * n)
+    amount_weights[0::2] = columns.amounts * _ASSET_AMOUNT[types]
+    amount_weights[1::2] = columns.costs * _COST_KEY_AMOUNT[types]
+    cost_weights = np.zeros(2 * n)
+    cost_weights[0::2] = columns.costs * _ASSET_COST[types]
+
+    touched = np.ones(2 * n, dtype=bool)
+    touched[1::2] = (types == _SELL) | ((types == _BUY) & (cost_codes != empty_code))
+
+    positions = np.flatnonzero(touched)
+    _, first, inverse = np.unique(
+        keys[positions], return_index=True, return_inverse=True
+    )
+    total_amount = np.bincount(inverse, weights=amount_weights[positions])
+    total_cost = np.bincount(inverse, weights=cost_weights[positions])
+
+    order = np.argsort(first, kind="stable")
+    if positive_only:
+        order = order[total_amount[order] > 0]
+
+    positions = positions[first[order]]
+    rows = positions // 2
+    return list(
+        zip(
+            [owners[code] for code in owner_codes[rows].tolist()],
+            [names[code] for code in key_asset[positions].tolist()],
+            [names[code] for code in key_cost[positions].tolist()],
+            [platforms[code] for code in platform_codes[rows].tolist()],
+            total_amount[order].tolist(),
+            total_cost[order].tolist(),
+        )
+    )
+
+
+def _as_dict(result: tuple, platform_key: str) -> dict:
+    _, asset_name, cost_asset, platform, total_amount, total_cost = result
+    return {
+        "asset_name": asset_name,
+        "cost_asset": cost_asset,
+        platform_key: platform,
+        "total_amount": total_amount,
+        "total_cost": total_cost,
+    }
+
+
+def compute_assets(rows: Iterable[dict]) -> List[dict]:
+    return [
+        _as_dict(result, "platform_name")
+        for result in compute(PortfolioColumns.from_rows(rows))
+    ]
+
+
+def compute_assets_by_user(rows: Iterable[dict]) -> Dict[int, List[dict]]:
+    assets = {}
+    for result in compute(PortfolioColumns.from_rows(rows)):
+        assets.setdefault(result[0], []).append(_as_dict(result, "platform_name"))
+    return assets
+
+
+def load_columns(
+    db: Session, user_ids: Optional[Sequence[int]] = None
+) -> PortfolioColumns:
+    transaction = models.Transaction
+    query = db.query(
+        transaction.owner_id,
+        transaction.asset_name,
+        func.coalesce(transaction.cost_asset, "").label("cost_asset"),
+        transaction.transaction_type,
+        transaction.platform_id,
+        func.sum(transaction.amount).label("total_amount"),
+        func.coalesce(func.sum(transaction.cost), 0).label("total_cost"),
+    ).filter(transaction.platform_id.isnot(None))
+    if user_ids is not None:
+        query = query.filter(transaction.owner_id.in_(user_ids))
+    rows = query.group_by(
+        transaction.owner_id,
+        transaction.asset_name,
+        func.coalesce(transaction.cost_asset, ""),
+        transaction.transaction_type,
+        transaction.platform_id,
+    ).all()
+
+    owners, asset_names, cost_assets, types, platforms, amounts, costs = (
+        zip(*rows) if rows else ((),) * 7
+    )
+    return PortfolioColumns(
+        asset_names=asset_names,
+        cost_assets=cost_assets,
+        transaction_types=types,
+        platforms=platforms,
+        amounts=amounts,
+        costs=costs,
+        owners=owners,
+    )
@@ -0,0 +1,389 @@
+import argparse
+import asyncio
+import bisect
+import csv
+import importlib
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.single_flight import SingleFlight
+
+# (asset_name, quote), e.g. ("btc", "usd").
+Pair = Tuple[str, str]
+# (timestamp in epoch seconds, price).
+Quote = Tuple[float, float]
+
+
+def to_timestamp(value: datetime) -> float:
+    # Naive datetimes are UTC throughout the app.
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def from_timestamp(value: float) -> datetime:
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+
+
+class PriceSeries:
+    # Timestamps and prices of one pair in two parallel arrays of doubles,
+    # sorted by time: 16 bytes a point, and lookups are binary searches.
+    __slots__ = ("timestamps", "prices")
+
+    def __init__(self, points: Iterable[Quote] = ()):
+        self.timestamps = array("d")
+        self.prices = array("d")
+        for timestamp, price in sorted(points):
+            self.add(timestamp, price)
+
+    def add(self, timestamp: float, price: float) -> None:
+        timestamps = self.timestamps
+        if not timestamps or timestamp > timestamps[-1]:
+            timestamps.append(timestamp)
+            self.prices.append(price)
+            return
+        index = bisect.bisect_left(timestamps, timestamp)
+        if timestamps[index] == timestamp:
+            self.prices[index] = price
+        else:
+            timestamps.insert(index, timestamp)
+            self.prices.insert(index, price)
+
+    def at(self, timestamp: float) -> Optional[float]:
+        """The last price observed at or before timestamp."""
+        index = bisect.bisect_right(self.timestamps, timestamp) - 1
+        return self.prices[index] if index >= 0 else None
+
+    def latest(self) -> Optional[Quote]:
+        if not self.timestamps:
+            return None
+        return self.timestamps[-1], self.prices[-1]
+
+    def between(self, start: float, end: float) -> List[Quote]:
+        lo = bisect.bisect_left(self.timestamps, start)
+        hi = bisect.bisect_right(self.timestamps, end)
+        return list(zip(self.timestamps[lo:hi], self.prices[lo:hi]))
+
+    def __contains__(self, timestamp: float) -> bool:
+        index = bisect.bisect_left(self.timestamps, timestamp)
+        return index < len(self.timestamps) and self.timestamps[index] == timestamp
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def _pair_filter(pairs: Sequence[Pair]):
+    return or_(
+        *(
+            and_(models.Price.asset_name == asset, models.Price.quote == quote)
+            for asset, quote in pairs
+        )
+    )
+
+
+class PriceStore:
+    # In-process copy of the prices table, loaded per pair on first use and
+    # reloaded after PRICE_STORE_TTL_SECONDS so prices ingested by another
+    # process show up.
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._series: Dict[Pair, Tuple[float, PriceSeries]] = {}
+        self.loads = 0
+
+    def series(self, db: Session, pairs: Iterable[Pair]) -> Dict[Pair, PriceSeries]:
+        now = time.monotonic()
+        pairs = set(pairs)
+        with self._lock:
+            found = {
+                pair: entry[1]
+                for pair in pairs
+                if (entry := self._series.get(pair)) and entry[0] > now
+            }
+        missing = sorted(pairs - found.keys())
+        if missing:
+            loaded = {pair: PriceSeries() for pair in missing}
+            rows = db.execute(
+                select(
+                    models.Price.asset_name,
+                    models.Price.quote,
+                    models.Price.timestamp,
+                    models.Price.price,
+                )
+                .where(_pair_filter(missing))
+                .order_by(models.Price.timestamp)
+            )
+            for asset_name, quote, timestamp, price in rows:
+                loaded[(asset_name, quote)].add(to_timestamp(timestamp), price)
+            with self._lock:
+                self.loads += 1
+                for pair, series in loaded.items():
+                    self._series[pair] = (now + self.ttl, series)
+            found.update(loaded)
+        return found
+
+    def record(self, db: Session, points: Dict[Pair, Iterable[Quote]]) -> int:
+        """Insert the points that are not stored yet; returns how many. The
+        pairs' cached series are dropped once the insert commits."""
+        stored = self.series(db, points.keys())
+        rows = []
+        for (asset_name, quote), quotes in points.items():
+            series = stored[(asset_name, quote)]
+            added = set()
+            for timestamp, price in quotes:
+                if timestamp in series or timestamp in added:
+                    continue
+                added.add(timestamp)
+                rows.append(
+                    {
+                        "asset_name": asset_name,
+                        "quote": quote,
+                        "timestamp": from_timestamp(timestamp),
+                        "price": price,
+                    }
+                )
+        if rows:
+            db.execute(models.Price.__table__.insert(), rows)
+            db.info.setdefault("stored_prices", {}).setdefault(self, set()).update(
+                points.keys()
+            )
+        return len(rows)
+
+    def invalidate(self, pairs: Iterable[Pair]) -> None:
+        with self._lock:
+            for pair in pairs:
+                self._series.pop(pair, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+
+class DatabasePriceSource:
+    # The default source: the latest stored price of each pair, as put there
+    # by `python -m app.prices ingest` or `fetch`.
+
+    def __init__(self, store: PriceStore):
+        self.store = store
+
+    def latest(self, pairs: Sequence[Pair]) -> Dict[Pair, Quote]:
+        from app.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            series = self.store.series(db, pairs)
+        finally:
+            db.close()
+        return {pair: s.latest() for pair, s in series.items() if len(s)}
+
+    def history(self, pairs, start: float, end: float) -> Dict[Pair, List[Quote]]:
+        return {}
+
+
+class FilePriceSource:
+    """Prices from a CSV file with asset_name, quote, timestamp (ISO 8601)
+    and price columns. Meant for offline runs, tests and backfills."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._series: Optional[Dict[Pair, PriceSeries]] = None
+
+    def _load(self) -> Dict[Pair, PriceSeries]:
+        if self._series is None:
+            series = {}
+            with open(self.path, newline="") as f:
+                for row in csv.DictReader(f):
+                    pair = (
+                        row["asset_name"].strip().lower(),
+                        row["quote"].strip().lower(),
+                    )
+                    timestamp = to_timestamp(datetime.fromisoformat(row["timestamp"]))
+                    series.setdefault(pair, PriceSeries()).add(
+                        timestamp, float(row["price"])
+                    )
+            self._series = series
+        return self._series
+
+    def latest(self, pairs: Sequence[Pair]) -> Dict[Pair, Quote]:
+        series = self._load()
+        return {pair: series[pair].latest() for pair in pairs if pair in series}
+
+    def history(self, pairs, start: float, end: float) -> Dict[Pair, List[Quote]]:
+        series = self._load()
+        return {
+            pair: series[pair].between(start, end) for pair in pairs if pair in series
+        }
+
+    def pairs(self) -> List[Pair]:
+        return sorted(self._load())
+
+
+class PriceCache:
+    # Latest quotes with a TTL. Concurrent requests that miss on the same
+    # pairs share one fetch. Pairs the source has no price for are cached
+    # too, so an unknown asset does not cause a fetch on every request.
+
+    def __init__(self, source, ttl: float):
+        self.source = source
+        self.ttl = ttl
+        self._quotes: Dict[Pair, Tuple[float, Optional[Quote]]] = {}
+        self._fetches = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.errors = 0
+
+    async def latest(self, pairs: Iterable[Pair]) -> Dict[Pair, Optional[Quote]]:
+        now = time.monotonic()
+        result = {}
+        waiting = {}
+        fetch = []
+        for pair in set(pairs):
+            entry = self._quotes.get(pair)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                result[pair] = entry[1]
+            elif self._fetches.get(pair) is not None:
+                self.coalesced += 1
+                waiting[pair] = self._fetches.get(pair)
+            else:
+                self.misses += 1
+                fetch.append(pair)
+
+        if fetch:
+            pairs = sorted(fetch)
+            task = self._fetches.start(pairs, lambda: self._fetch(pairs))
+            result.update(await asyncio.shield(task))
+        for pair, task in waiting.items():
+            quotes = await asyncio.shield(task)
+            result[pair] = quotes.get(pair)
+        return result
+
+    async def _fetch(self, pairs: List[Pair]) -> Dict[Pair, Optional[Quote]]:
+        self.fetches += 1
+        try:
+            quotes = await run_in_threadpool(self.source.latest, pairs)
+        except Exception:
+            self.errors += 1
+            raise
+        expires_at = time.monotonic() + self.ttl
+        fetched = {}
+        for pair in pairs:
+            fetched[pair] = quotes.get(pair)
+            self._quotes[pair] = (expires_at, fetched[pair])
+        return fetched
+
+    def clear(self) -> None:
+        self._quotes.clear()
+
+    def stats(self) -> dict:
+        return {
+            "source": type(self.source).__name__,
+            "entries": len(self._quotes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "fetches": self.fetches,
+            "errors": self.errors,
+            "stored_pairs": len(price_store),
+        }
+
+
+def build_source(name: str, store: PriceStore):
+    if name == "database":
+        return DatabasePriceSource(store)
+    if name == "file":
+        if not settings.PRICE_FILE:
+            raise RuntimeError("PRICE_SOURCE=file requires PRICE_FILE")
+        return FilePriceSource(settings.PRICE_FILE)
+    # Anything else names a factory, "package.module:callable", that returns
+    # an object with latest(pairs) and history(pairs, start, end).
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise RuntimeError(f"Unknown PRICE_SOURCE {name!r}")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stored_pairs(session):
+    for store, pairs in session.info.pop("stored_prices", {}).items():
+        store.invalidate(pairs)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stored_pairs(session):
+    session.info.pop("stored_prices", None)
+
+
+price_store = PriceStore(settings.PRICE_STORE_TTL_SECONDS)
+price_source = build_source(settings.PRICE_SOURCE, price_store)
+price_cache = PriceCache(price_source, settings.PRICE_CACHE_TTL_SECONDS)
+
+
+def all_held_pairs(db: Session, quote: str) -> List[Pair]:
+    # Every asset any user holds, for the CLI to fetch; a single user's
+    # pairs come from valuation.held_pairs.
+    assets = db.execute(select(models.Holding.asset_name).distinct()).scalars()
+    return [(asset, quote) for asset in sorted(assets)]
+
+
+def ingest(db: Session, source, pairs: Sequence[Pair], start: float, end: float) -> int:
+    return price_store.record(db, source.history(pairs, start, end))
+
+
+def fetch(db: Session, source, pairs: Sequence[Pair]) -> int:
+    quotes = source.latest(pairs)
+    return price_store.record(db, {pair: [quote] for pair, quote in quotes.items()})
+
+
+def main(argv: Optional[list] = None) -> int:
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        prog="python -m app.prices",
+        description="Store prices from the configured source, or from a file.",
+    )
+    parser.add_argument("command", choices=["ingest", "fetch"])
+    parser.add_argument(
+        "--file", help="read from this CSV file instead of PRICE_SOURCE"
+    )
+    parser.add_argument("--quote", default=settings.PRICE_QUOTE)
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args(argv)
+
+    source = FilePriceSource(args.file) if args.file else price_source
+    db = SessionLocal()
+    try:
+        if args.command == "ingest" and args.file:
+            pairs = source.pairs()
+        else:
+            pairs = all_held_pairs(db, args.quote)
+        if args.command == "ingest":
+            start = to_timestamp(args.since) if args.since else float("-inf")
+            count = ingest(db, source, pairs, start, float("inf"))
+        else:
+            count = fetch(db, source, pairs)
+        db.commit()
+        print(f"Stored {count} prices for {len(pairs)} pairs")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
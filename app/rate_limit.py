@@ -0,0 +1,397 @@
+import asyncio
+import functools
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import jwt
+from starlette.responses import JSONResponse
+
+from app.config import settings
+from app.redis_client import get_redis, register_script
+
+logger = logging.getLogger(__name__)
+
+# (key, refill rate per second, burst).
+Bucket = Tuple[str, float, float]
+
+# Store failures are logged at most this often while they persist.
+STORE_ERROR_LOG_INTERVAL = 60
+
+
+def refill(
+    tokens: float, elapsed: float, rate: float, burst: float, cost: float
+) -> Tuple[float, float]:
+    """Add the tokens earned over elapsed seconds and take cost of them.
+
+    Returns the tokens left and how many seconds the caller must wait before
+    cost tokens are available; 0 means the request is admitted. A rejected
+    request takes nothing.
+    """
+    tokens = min(burst, tokens + max(elapsed, 0.0) * rate)
+    cost = min(cost, burst)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class LocalBucketStore:
+    # Buckets of this worker, keyed by "user:<email>" or "ip:<address>".
+    # Least recently seen keys are dropped past max_keys; a dropped bucket
+    # starts full again, the same as one that has been idle long enough.
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def take(self, buckets: Sequence[Bucket], cost: float) -> Tuple[float, int]:
+        """Take cost from every bucket, or from none of them. Returns 0 and
+        -1, or the seconds to wait and the index of the first bucket that
+        is short of tokens."""
+        now = time.monotonic()
+        with self._lock:
+            updated = []
+            for index, (key, rate, burst) in enumerate(buckets):
+                bucket = self._bucket(key, burst, now)
+                tokens, retry_after = refill(
+                    bucket[0], now - bucket[1], rate, burst, cost
+                )
+                if retry_after:
+                    return retry_after, index
+                updated.append((bucket, tokens))
+            for bucket, tokens in updated:
+                bucket[0], bucket[1] = tokens, now
+            return 0.0, -1
+
+    def _bucket(self, key: str, burst: float, now: float) -> list:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Each bucket is stored as "<tokens> <timestamp>". All of a request's
+# buckets are checked and charged in one script, so that workers racing on
+# the same key cannot both spend the same tokens and a request one bucket
+# rejects takes nothing from the others. ARGV is the cost, then the rate
+# and burst of each key. The clock is the Redis server's, so worker clock
+# skew does not matter.
+TOKEN_BUCKET_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local left = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local take = math.min(cost, burst)
+    local tokens = burst
+    local state = redis.call('GET', key)
+    if state then
+        local separator = string.find(state, ' ')
+        local last = tonumber(string.sub(state, separator + 1))
+        tokens = tonumber(string.sub(state, 1, separator - 1))
+        tokens = math.min(burst, tokens + math.max(now - last, 0) * rate)
+    end
+    if tokens < take then
+        return tostring((take - tokens) / rate) .. ' ' .. (i - 1)
+    end
+    left[i] = tokens - take
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    redis.call('SET', key, left[i] .. ' ' .. now, 'PX', math.ceil(burst / rate * 1000) + 1000)
+end
+return '0 -1'
+"""
+
+
+def _token_buckets(get, set, keys, args) -> str:
+    cost = float(args[0])
+    now = time.time()
+    left = []
+    for index, key in enumerate(keys):
+        rate, burst = float(args[2 * index + 1]), float(args[2 * index + 2])
+        state = get(key)
+        if state:
+            tokens, last = (float(part) for part in state.split(" "))
+        else:
+            tokens, last = burst, now
+        tokens, retry_after = refill(tokens, now - last, rate, burst, cost)
+        if retry_after:
+            return f"{retry_after} {index}"
+        left.append((key, tokens, math.ceil(burst / rate * 1000) + 1000))
+    for key, tokens, ttl_ms in left:
+        set(key, f"{tokens} {now}", px=ttl_ms)
+    return "0 -1"
+
+
+register_script(TOKEN_BUCKET_SCRIPT, _token_buckets)
+
+
+class SharedBucketStore:
+    def __init__(self, client, prefix: str = "cwd:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, buckets: Sequence[Bucket], cost: float) -> Tuple[float, int]:
+        args = [cost]
+        for _, rate, burst in buckets:
+            args += [rate, burst]
+        reply = self.client.eval(
+            TOKEN_BUCKET_SCRIPT,
+            len(buckets),
+            *(self.prefix + key for key, _, _ in buckets),
+            *args,
+        )
+        retry_after, index = reply.split(" ")
+        return float(retry_after), int(index)
+
+
+class ConcurrencyGate:
+    # At most limit requests inside at once. Others wait in arrival order for
+    # up to timeout seconds, and at most max_queued of them may wait.
+    # Futures are created on the running loop at each wait, so the gate is
+    # not tied to one event loop.
+
+    def __init__(self, limit: int, max_queued: int, timeout: float):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done():
+                # The slot was handed over just as the wait ended.
+                if isinstance(exc, asyncio.CancelledError):
+                    self.release()
+                    raise
+                return True
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            return False
+        return True
+
+    def release(self) -> None:
+        # The slot passes straight to the next waiter, if any.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+@functools.lru_cache(maxsize=4096)
+def _token_subject(token: str) -> Optional[Tuple[str, float]]:
+    # Verifying the signature once per distinct token keeps the per-request
+    # cost at a dictionary lookup; an unverified claim would let anyone spend
+    # another user's bucket.
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+    except jwt.PyJWTError:
+        return None
+    if not payload.get("email"):
+        return None
+    return payload["email"], payload.get("exp", math.inf)
+
+
+def request_user(headers: Iterable[Tuple[bytes, bytes]]) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                return None
+            subject = _token_subject(token)
+            if subject is None or subject[1] <= time.time():
+                return None
+            return subject[0]
+    return None
+
+
+class RateLimiter:
+    """Per-user and per-IP token buckets, with a cost per route, plus a cap
+    on how many expensive requests this worker runs at once."""
+
+    def __init__(
+        self,
+        store,
+        costs: Dict[str, float],
+        expensive: Iterable[str],
+        gate: ConcurrencyGate,
+    ):
+        self.store = store
+        self.costs = costs
+        self.expensive = frozenset(expensive)
+        self.gate = gate
+        self.allowed = 0
+        self.limited_user = 0
+        self.limited_ip = 0
+        self.rejected_busy = 0
+        self.waited = 0
+        self.store_errors = 0
+        self._store_error_logged_at = -math.inf
+
+    def check(self, route: str, user: Optional[str], ip: Optional[str]) -> float:
+        """Take the route's cost from the user's and the IP's buckets, and
+        return 0 or the seconds to wait before retrying. Either both buckets
+        are charged or neither is."""
+        cost = self.costs.get(route, 1.0)
+        if cost <= 0:
+            return 0.0
+        buckets = []
+        if user is not None:
+            buckets.append(
+                (
+                    "user:" + user,
+                    settings.RATE_LIMIT_USER_RATE,
+                    settings.RATE_LIMIT_USER_BURST,
+                )
+            )
+        if ip is not None:
+            buckets.append(
+                ("ip:" + ip, settings.RATE_LIMIT_IP_RATE, settings.RATE_LIMIT_IP_BURST)
+            )
+        if buckets:
+            try:
+                retry_after, index = self.store.take(buckets, cost)
+            except Exception:
+                # An unreachable store, e.g. Redis being down, must not take
+                # the API down with it: admit the request unmetered.
+                self._store_failed()
+                return 0.0
+            if retry_after:
+                if buckets[index][0].startswith("user:"):
+                    self.limited_user += 1
+                else:
+                    self.limited_ip += 1
+                return retry_after
+        self.allowed += 1
+        return 0.0
+
+    def _store_failed(self) -> None:
+        self.store_errors += 1
+        now = time.monotonic()
+        if now - self._store_error_logged_at >= STORE_ERROR_LOG_INTERVAL:
+            self._store_error_logged_at = now
+            logger.warning(
+                "Rate limit store failed, admitting requests unmetered",
+                exc_info=True,
+            )
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": type(self.store).__name__,
+            "allowed": self.allowed,
+            "limited_user": self.limited_user,
+            "limited_ip": self.limited_ip,
+            "rejected_busy": self.rejected_busy,
+            "waited": self.waited,
+            "store_errors": self.store_errors,
+            "expensive_active": self.gate.active,
+            "expensive_queued": self.gate.queued,
+        }
+        if isinstance(self.store, LocalBucketStore):
+            stats["buckets"] = len(self.store)
+        return stats
+
+
+def _build_store():
+    client = get_redis()
+    if client is not None:
+        return SharedBucketStore(client)
+    return LocalBucketStore(settings.RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(
+    _build_store(),
+    settings.RATE_LIMIT_COSTS,
+    settings.RATE_LIMIT_EXPENSIVE_ROUTES,
+    ConcurrencyGate(
+        settings.RATE_LIMIT_MAX_CONCURRENT,
+        settings.RATE_LIMIT_MAX_QUEUED,
+        settings.RATE_LIMIT_QUEUE_TIMEOUT_SECONDS,
+    ),
+)
+
+
+class RateLimitMiddleware:
+    # Plain ASGI like MetricsMiddleware, and it runs before routing, so
+    # routes are matched as "<METHOD> <path>" on the raw path.
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        route = f"{scope['method']} {scope['path']}"
+        client = scope.get("client")
+        retry_after = limiter.check(
+            route, request_user(scope["headers"]), client[0] if client else None
+        )
+        if retry_after:
+            response = _rejection(429, "Too many requests", retry_after)
+            await response(scope, receive, send)
+            return
+        if route not in limiter.expensive:
+            await self.app(scope, receive, send)
+            return
+
+        gate = limiter.gate
+        if gate.active >= gate.limit:
+            limiter.waited += 1
+        if not await gate.acquire():
+            limiter.rejected_busy += 1
+            response = _rejection(
+                503, "Server busy", settings.RATE_LIMIT_BUSY_RETRY_AFTER_SECONDS
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+
+def _rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+    )
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.redis_client import get_redis
+
+
+class LocalPinStore:
+    # Every pin lasts the same number of seconds, so keeping the entries in
+    # the order they were last pinned also keeps them in expiry order and
+    # expired ones can be dropped from the front.
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        self._pins = OrderedDict()
+
+    def pin(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._pins[user_id] = now + self.seconds
+            self._pins.move_to_end(user_id)
+            while self._pins:
+                oldest, expires_at = next(iter(self._pins.items()))
+                if expires_at > now:
+                    break
+                del self._pins[oldest]
+
+    def is_pinned(self, user_id: int) -> bool:
+        expires_at = self._pins.get(user_id)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pins.clear()
+
+    def __len__(self) -> int:
+        return len(self._pins)
+
+
+class SharedPinStore:
+    def __init__(self, client, seconds: float, prefix: str = "cwd:pinned:"):
+        self.client = client
+        self.seconds = seconds
+        self.prefix = prefix
+
+    def pin(self, user_id: int) -> None:
+        self.client.set(
+            self.prefix + str(user_id), "1", px=max(int(self.seconds * 1000), 1)
+        )
+
+    def is_pinned(self, user_id: int) -> bool:
+        return bool(self.client.exists(self.prefix + str(user_id)))
+
+    def clear(self) -> None:
+        pass
+
+
+class ReadRouter:
+    # Decides which database serves a read-only request. Reads go to the
+    # replica unless none is configured, or the user wrote something in the
+    # last READ_AFTER_WRITE_PIN_SECONDS and the replica may not have it yet.
+
+    def __init__(self, pins):
+        self.pins = pins
+        self.replica = 0
+        self.primary_pinned = 0
+        self.primary_unconfigured = 0
+        self.user_lookup_replica = 0
+        self.user_lookup_fallbacks = 0
+
+    def enabled(self) -> bool:
+        return database.replica_sessionmaker() is not None
+
+    def pin(self, user_id: int) -> None:
+        if self.enabled() and self.pins.seconds > 0:
+            self.pins.pin(user_id)
+
+    def replica_for(self, user_id: int):
+        """Return the replica's session factory, or None to use the primary."""
+        factory = database.replica_sessionmaker()
+        if factory is None:
+            self.primary_unconfigured += 1
+            return None
+        if self.pins.is_pinned(user_id):
+            self.primary_pinned += 1
+            return None
+        self.replica += 1
+        return factory
+
+    def session_factory(self, user_id: int):
+        # The session factory replica_for chose, for work that does not use
+        # the request's session, such as a computation shared by coalesced
+        # requests. The request was already counted.
+        factory = database.replica_sessionmaker()
+        if factory is None or self.pins.is_pinned(user_id):
+            return database.primary_sessionmaker()
+        return factory
+
+    def sync_session_factory(self, user_id: int):
+        # For code that always runs in a worker thread, such as the NDJSON
+        # stream, whatever ASYNC_DATABASE says. The request was already
+        # counted when its read session was chosen.
+        if database.ReadSessionLocal is None or self.pins.is_pinned(user_id):
+            return database.SessionLocal
+        return database.ReadSessionLocal
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": type(self.pins).__name__,
+            "enabled": self.enabled(),
+            "replica": self.replica,
+            "primary_pinned": self.primary_pinned,
+            "primary_unconfigured": self.primary_unconfigured,
+            "user_lookup_replica": self.user_lookup_replica,
+            "user_lookup_fallbacks": self.user_lookup_fallbacks,
+        }
+        if isinstance(self.pins, LocalPinStore):
+            stats["pinned"] = len(self.pins)
+        return stats
+
+
+def _build_pins():
+    client = get_redis()
+    if client is not None:
+        return SharedPinStore(client, settings.READ_AFTER_WRITE_PIN_SECONDS)
+    return LocalPinStore(settings.READ_AFTER_WRITE_PIN_SECONDS)
+
+
+read_router = ReadRouter(_build_pins())
+
+
+def record_write(db: Session, user_id: int) -> None:
+    db.info.setdefault("written_users", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_written_users(session):
+    for user_id in session.info.pop("written_users", ()):
+        read_router.pin(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_users(session):
+    session.info.pop("written_users", None)
@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+FAKE_URL = "memory://"
+
+# Lua source -> Python equivalent, for FakeRedis.eval.
+_scripts: Dict[str, Callable] = {}
+
+
+def register_script(source: str, implementation: Callable) -> str:
+    """Register the Python equivalent of a Lua script so FakeRedis can run
+    it. implementation(get, set, keys, args) is called atomically, with get
+    and set behaving like the client methods of the same name."""
+    _scripts[source] = implementation
+    return source
+
+
+class FakeRedis:
+    # In-process stand-in for the subset of the Redis API the shared
+    # backends use. Values are stored as strings, like a client created
+    # with decode_responses=True.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._expires = {}
+
+    def _alive(self, name: str) -> bool:
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+            return False
+        return name in self._data
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._get(name)
+
+    def _get(self, name: str) -> Optional[str]:
+        return self._data[name] if self._alive(name) else None
+
+    def set(self, name, value, ex=None, px=None, exat=None, nx=False) -> bool:
+        with self._lock:
+            return self._set(name, value, ex=ex, px=px, exat=exat, nx=nx)
+
+    def _set(self, name, value, ex=None, px=None, exat=None, nx=False) -> bool:
+        if nx and self._alive(name):
+            return None
+        self._data[name] = str(value)
+        self._expires.pop(name, None)
+        if ex is not None:
+            self._expires[name] = time.time() + ex
+        elif px is not None:
+            self._expires[name] = time.time() + px / 1000
+        elif exat is not None:
+            self._expires[name] = float(exat)
+        return True
+
+    def delete(self, *names) -> int:
+        with self._lock:
+            deleted = 0
+            for name in names:
+                if self._alive(name):
+                    deleted += 1
+                self._data.pop(name, None)
+                self._expires.pop(name, None)
+            return deleted
+
+    def exists(self, *names) -> int:
+        with self._lock:
+            return sum(1 for name in names if self._alive(name))
+
+    def incrby(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._data[name]) if self._alive(name) else 0
+            value += amount
+            self._data[name] = str(value)
+            return value
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        return self.incrby(name, amount)
+
+    def expire(self, name: str, seconds: int) -> bool:
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expires[name] = time.time() + seconds
+            return True
+
+    def eval(self, script: str, numkeys: int, *keys_and_args):
+        # Redis runs a script atomically; the stand-in runs the Python
+        # equivalent registered for the same source under its lock.
+        implementation = _scripts[script]
+        keys, args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        with self._lock:
+            return implementation(self._get, self._set, keys, args)
+
+    def flushall(self) -> bool:
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+
+_fake = FakeRedis()
+_client = None
+
+
+def get_redis():
+    global _client
+    if not settings.REDIS_URL:
+        return None
+    if settings.REDIS_URL == FAKE_URL:
+        return _fake
+    if _client is None:
+        if redis is None:
+            raise RuntimeError("REDIS_URL is set but the redis package is missing")
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
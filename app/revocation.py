@@ -0,0 +1,67 @@
+import heapq
+import threading
+import time
+
+from app.redis_client import get_redis
+
+
+class MemoryRevocationStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._expiry_heap = []
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        if expires_at <= now:
+            return
+        with self._lock:
+            self._prune(now)
+            if jti not in self._revoked:
+                heapq.heappush(self._expiry_heap, (expires_at, jti))
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti: str) -> bool:
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def prune(self) -> None:
+        with self._lock:
+            self._prune(time.time())
+
+    def _prune(self, now: float) -> None:
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, jti = heapq.heappop(heap)
+            if self._revoked.get(jti, now + 1) <= now:
+                del self._revoked[jti]
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "entries": len(self._revoked)}
+
+
+class SharedRevocationStore:
+    def __init__(self, client, prefix: str = "cwd:revoked:"):
+        self.client = client
+        self.prefix = prefix
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        if expires_at <= time.time():
+            return
+        self.client.set(self.prefix + jti, "1", exat=int(expires_at) + 1)
+
+    def is_revoked(self, jti: str) -> bool:
+        return bool(self.client.exists(self.prefix + jti))
+
+    def prune(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__}
+
+
+def build_revocation_store():
+    client = get_redis()
+    if client is not None:
+        return SharedRevocationStore(client)
+    return MemoryRevocationStore()
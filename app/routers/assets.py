@@ -1,69 +1,116 @@
-from collections import defaultdict
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.orm import Session
 
-from app import crud, models, schemas
+from app import (
+    crud_async,
+    database,
+    etag,
+    models,
+    portfolio,
+    prices,
+    schemas,
+    serialization,
+    valuation,
+)
+from app.asset_cache import asset_cache
+from app.config import settings
 from app.database import get_db
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_read_db
+from app.read_routing import read_router
 
 router = APIRouter()
 
 
 def calculate_real_assets(assets: list) -> list:
-    grouped_assets = defaultdict(lambda: {"total_amount": 0, "total_cost": 0})
+    return portfolio.compute_assets(assets)
 
-    for asset in assets:
-        key = (
-            asset["asset_name"],
-            asset["cost_asset"],
-            asset["platform_name"],
+
+@router.get(
+    "/", response_model=list[dict], dependencies=[Depends(etag.conditional_get)]
+)
+async def get_assets(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if asset_cache.enabled():
+        body = await asset_cache.get_or_compute(
+            current_user.id,
+            request.state.data_version,
+            lambda: _render_user_assets(current_user.id),
         )
-        transaction_type = asset["transaction_type"].value
-        total_amount = asset["total_amount"]
-        total_cost = asset["total_cost"]
-
-        if transaction_type == schemas.TransactionType.DEPOSIT.value:
-            grouped_assets[key]["total_amount"] += total_amount
-        elif transaction_type == schemas.TransactionType.BUY.value:
-            asset_key = (asset["asset_name"], asset["cost_asset"], asset["platform_name"])
-            grouped_assets[asset_key]["total_amount"] += total_amount
-            grouped_assets[asset_key]["total_cost"] += total_cost
-            if asset["cost_asset"]:
-                cost_key = (asset["cost_asset"], "", asset["platform_name"])
-                grouped_assets[cost_key]["total_amount"] -= total_cost
-        elif transaction_type == schemas.TransactionType.SELL.value:
-            asset_key = (asset["asset_name"], asset["cost_asset"], asset["platform_name"])
-            grouped_assets[asset_key]["total_amount"] -= total_amount
-            grouped_assets[asset_key]["total_cost"] -= total_cost
-            cost_key = (asset["cost_asset"], "", asset["platform_name"])
-            grouped_assets[cost_key]["total_amount"] += total_cost
-        elif transaction_type == schemas.TransactionType.AIRDROP.value:
-            grouped_assets[key]["total_amount"] += total_amount
-        elif transaction_type == schemas.TransactionType.WITHDRAW.value:
-            grouped_assets[key]["total_amount"] -= total_amount
-
-    real_assets_result = [
-        {
-            "asset_name": key[0],
-            "cost_asset": key[1],
-            "platform_name": key[2],
-            "total_amount": values["total_amount"],
-            "total_cost": values["total_cost"],
-        }
-        for key, values in grouped_assets.items()
-        if values["total_amount"] > 0
-    ]
-
-    return real_assets_result
-
-
-@router.get("/", response_model=list[dict])
-def get_assets(
+        return serialization.json_response(body, response)
+    if serialization.enabled():
+        return serialization.json_response(
+            await _render_assets(db, current_user.id), response
+        )
+    return await crud_async.get_holdings_by_user(db=db, user_id=current_user.id)
+
+
+async def _render_user_assets(user_id: int) -> bytes:
+    # Runs in the cache's shared task, which outlives a request that
+    # disconnects while others wait on it, so it must not borrow that
+    # request's session.
+    async with database.open_session(read_router.session_factory(user_id)) as db:
+        return await _render_assets(db, user_id)
+
+
+async def _render_assets(db, user_id: int) -> bytes:
+    if serialization.enabled():
+        rows = await crud_async.get_holding_rows_by_user(db=db, user_id=user_id)
+        return serialization.holdings.encode(rows)
+    rows = await crud_async.get_holdings_by_user(db=db, user_id=user_id)
+    return serialization.dumps(rows)
+
+
+@router.get("/cost-basis", response_model=list[schemas.CostBasisResponse])
+async def get_cost_basis(
+    method: schemas.CostBasisMethod = schemas.CostBasisMethod.FIFO,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    assets = crud.get_assets_by_user(db=db, user_id=current_user.id)
-    real_assets = calculate_real_assets(assets)
+    return await crud_async.get_cost_basis(
+        db=db, user_id=current_user.id, method=method
+    )
+
 
-    return real_assets
+@router.get("/history", response_model=list[schemas.HistorySeries])
+async def get_history(
+    query: Annotated[schemas.HistoryQuery, Query()],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await crud_async.get_holding_history(
+        db=db, user_id=current_user.id, query=query
+    )
+
+
+# No ETag on the valuations: prices move without the user's data version
+# changing.
+@router.get("/valuation", response_model=schemas.ValuationResponse)
+async def get_valuation(
+    quote: Optional[str] = Query(None, description="Defaults to PRICE_QUOTE"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    quote = (quote or settings.PRICE_QUOTE).lower()
+    rows = await crud_async.get_holdings_by_user(db=db, user_id=current_user.id)
+    quotes = await prices.price_cache.latest(valuation.held_pairs(rows, quote))
+    return valuation.value_holdings(rows, quotes, quote)
+
+
+@router.get("/valuation/history", response_model=schemas.ValuationHistory)
+async def get_valuation_history(
+    query: Annotated[schemas.ValuationHistoryQuery, Query()],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await crud_async.get_valuation_history(
+        db=db,
+        user_id=current_user.id,
+        query=query,
+        quote=query.quote or settings.PRICE_QUOTE.lower(),
+    )
@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app import crud_async, events, models
+from app.config import settings
+from app.database import get_db
+from app.dependencies import get_current_user
+
+router = APIRouter()
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+@router.get(
+    "/",
+    response_class=StreamingResponse,
+    responses={200: {"content": {SSE_MEDIA_TYPE: {}}}},
+)
+async def stream_events(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    events.broker.check_capacity()
+    # An idle stream must not keep a pooled connection checked out.
+    await crud_async.close(db)
+    return StreamingResponse(
+        events.sse_stream(current_user.id, settings.EVENT_HEARTBEAT_SECONDS),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _forward(websocket: WebSocket, subscription: events.Subscription):
+    while True:
+        await websocket.send_json(await subscription.get())
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    token: str = Query(...),
+    db: Session = Depends(get_db),
+):
+    # Browsers cannot set headers on a WebSocket handshake, so the bearer
+    # token is passed as a query parameter instead.
+    try:
+        current_user = await get_current_user(token=token, db=db)
+        subscription = events.broker.subscribe(current_user.id)
+    except HTTPException as e:
+        code = status.WS_1013_TRY_AGAIN_LATER
+        if e.status_code == status.HTTP_401_UNAUTHORIZED:
+            code = status.WS_1008_POLICY_VIOLATION
+        await websocket.close(code=code)
+        return
+    finally:
+        await crud_async.close(db)
+
+    await websocket.accept()
+    sender = asyncio.ensure_future(_forward(websocket, subscription))
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        subscription.close()
@@ -0,0 +1,109 @@
+import hashlib
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+
+from app import crud_async, imports, jobs, models, schemas
+from app.config import settings
+from app.database import get_db
+from app.dependencies import get_current_user
+
+router = APIRouter()
+
+
+def _accepted(job: models.Job, response: Response) -> models.Job:
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+
+@router.post(
+    "/rebuild",
+    response_model=schemas.JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def rebuild(
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    # Repeated triggers while a rebuild is queued or running return it.
+    job, _ = await crud_async.run(
+        db,
+        jobs.enqueue,
+        "rebuild",
+        owner_id=current_user.id,
+        dedup_key=f"rebuild:{current_user.id}",
+    )
+    return _accepted(job, response)
+
+
+@router.post(
+    "/import",
+    response_model=schemas.JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_transactions(
+    request: Request,
+    response: Response,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Like POST /transactions/import, but the file is stored and imported
+    by a worker; the job's result is the ImportResult."""
+    fmt = format or imports.detect_format(request.headers.get("content-type", ""))
+    if fmt is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload text/csv or application/x-ndjson, or pass ?format=",
+        )
+    data = bytearray()
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > settings.JOB_MAX_INPUT_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Uploads are limited to {settings.JOB_MAX_INPUT_BYTES} bytes",
+            )
+    # The same file uploaded again while its import is pending is one job.
+    digest = hashlib.sha256(data).hexdigest()
+    job, _ = await crud_async.run(
+        db,
+        jobs.enqueue,
+        "import",
+        owner_id=current_user.id,
+        payload={"format": fmt},
+        input=bytes(data),
+        dedup_key=f"import:{current_user.id}:{fmt}:{digest}",
+    )
+    return _accepted(job, response)
+
+
+@router.get("/", response_model=list[schemas.JobResponse])
+async def get_jobs(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await crud_async.run(db, jobs.get_jobs, current_user.id)
+
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+async def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    job = await crud_async.run(db, jobs.get_job, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
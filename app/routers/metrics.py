@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Response
+
+from app import metrics
+from app.routers.stats import collect_stats
+
+router = APIRouter()
+
+
+def _number(value) -> bool:
+    return isinstance(value, (int, float))
+
+
+@metrics.registry.register_collector
+def _stats_families():
+    # Everything GET /stats/ reports, as gauges named cwd_<section>_<key>.
+    # Connection pools become one series per pool.
+    families = {}
+    for section, values in collect_stats().items():
+        if section == "pool":
+            for pool, snapshot in values.items():
+                for key, value in snapshot.items():
+                    if _number(value):
+                        samples = families.setdefault(f"cwd_pool_{key}", [])
+                        samples.append(({"pool": pool}, value))
+            continue
+        for key, value in values.items():
+            if _number(value):
+                families[f"cwd_{section}_{key}"] = [({}, value)]
+    return [
+        (name, "gauge", f"{name[4:]} as reported by GET /stats/.", samples)
+        for name, samples in families.items()
+    ]
+
+
+@router.get("", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,76 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
 
-from app import crud, models, schemas
+from app import batch, crud_async, etag, models, schemas, serialization
 from app.database import get_db
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_read_db
 
 router = APIRouter()
 
 
 @router.post("/", response_model=schemas.PlatformResponse)
-def create_platform(
+async def create_platform(
     platform: schemas.PlatformCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.create_platform(db=db, platform=platform, user_id=current_user.id)
+    return await crud_async.create_platform(
+        db=db, platform=platform, user_id=current_user.id
+    )
 
 
-@router.get("/", response_model=list[schemas.PlatformResponse])
-def get_platforms(
+@router.post("/batch", response_model=schemas.PlatformBatchResult)
+async def batch_platforms(
+    operations: schemas.PlatformBatch,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    platforms = crud.get_platforms_by_user(db=db, user_id=current_user.id)
+    return await crud_async.run(
+        db, batch.apply_platforms, current_user.id, operations.operations
+    )
+
+
+@router.get(
+    "/",
+    response_model=list[schemas.PlatformResponse],
+    dependencies=[Depends(etag.conditional_get)],
+)
+async def get_platforms(
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if serialization.enabled():
+        rows = await crud_async.get_platform_rows_by_user(
+            db=db, user_id=current_user.id, fields=serialization.platforms.fields
+        )
+        return serialization.json_response(
+            serialization.platforms.encode(rows), response
+        )
+    platforms = await crud_async.get_platforms_by_user(db=db, user_id=current_user.id)
     return platforms
 
 
 @router.get("/{platform_id}", response_model=schemas.PlatformResponse)
-def get_platform(
+async def get_platform(
     platform_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    platform = crud.get_platform(db=db, platform_id=platform_id)
-    if platform.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to view this platform",
-        )
-    return platform
+    return await crud_async.get_platform(
+        db=db, platform_id=platform_id, user_id=current_user.id
+    )
 
 
 @router.delete("/{platform_id}", response_model=schemas.PlatformResponse)
-def delete_platform(
+async def delete_platform(
     platform_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    platform = crud.get_platform(db=db, platform_id=platform_id)
-    if platform.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to delete this platform",
-        )
-    return crud.delete_platform(db=db, platform_id=platform_id)
+    return await crud_async.delete_platform(
+        db=db, platform_id=platform_id, user_id=current_user.id
+    )
 
 
 @router.put("/{platform_id}", response_model=schemas.PlatformResponse)
-def update_platform(
+async def update_platform(
     platform_id: int,
     platform: schemas.PlatformCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    existing_platform = crud.get_platform(db=db, platform_id=platform_id)
-    if existing_platform.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to update this platform",
-        )
-
-    updated_platform = crud.update_platform(
-        db=db, platform_id=platform_id, platform_update=platform
+    return await crud_async.update_platform(
+        db=db,
+        platform_id=platform_id,
+        platform_update=platform,
+        user_id=current_user.id,
     )
-    return updated_platform
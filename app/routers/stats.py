@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+
+from app import database
+from app.asset_cache import asset_cache
+from app.auth import revocation_store
+from app.events import broker
+from app.hashing import password_hasher
+from app.jobs import enqueue_stats
+from app.lifespan import startup_stats
+from app.prices import price_cache
+from app.rate_limit import rate_limiter
+from app.read_routing import read_router
+from app.user_cache import user_cache
+
+router = APIRouter()
+
+
+def collect_stats() -> dict:
+    return {
+        "pool": database.pool_stats(),
+        "user_cache": user_cache.stats(),
+        "asset_cache": asset_cache.stats(),
+        "revocation": revocation_store.stats(),
+        "password_hashing": password_hasher.stats(),
+        "events": broker.stats(),
+        "read_routing": read_router.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "startup": dict(startup_stats),
+        "prices": price_cache.stats(),
+        "jobs": dict(enqueue_stats),
+    }
+
+
+@router.get("/")
+async def get_stats():
+    return collect_stats()
@@ -3,8 +3,8 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app import crud, schemas
-from app.auth import Token, create_access_token, logged_out_tokens, verify_token
+from app import crud_async, schemas
+from app.auth import Token, create_access_token, revoke_token, verify_token
 from app.config import settings
 from app.database import get_db
 from app.dependencies import oauth2_scheme
@@ -13,20 +13,15 @@ router = APIRouter()
 
 
 @router.get("/", status_code=status.HTTP_200_OK)
-def verify(token: str = Depends(oauth2_scheme)):
-    if token in logged_out_tokens:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token.",
-        )
+async def verify(token: str = Depends(oauth2_scheme)):
     verify_token(token)
     return {"message": "Token is valid"}
 
 
 @router.post("/", response_model=Token)
-def login(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if not db_user or not crud.verify_password(user.password, db_user.hashed_password):
+async def login(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await crud_async.authenticate(db, user.email, user.password)
+    if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -42,7 +37,7 @@ def login(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.delete("/", status_code=status.HTTP_200_OK)
-def logout(token: str = Depends(oauth2_scheme)):
+async def logout(token: str = Depends(oauth2_scheme)):
     if token:
-        logged_out_tokens.add(token)
+        revoke_token(token)
     return {"message": "Successfully logged out"}
@@ -1,78 +1,171 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app import crud, models, schemas
+from app import (
+    batch,
+    crud,
+    crud_async,
+    etag,
+    imports,
+    models,
+    pagination,
+    read_routing,
+    schemas,
+    serialization,
+)
 from app.database import get_db
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_read_db
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _ndjson_lines(session_factory, user_id: int, query: schemas.TransactionQuery):
+    db = session_factory()
+    try:
+        for rows in crud.stream_transactions_by_user(db, user_id, query):
+            yield "".join(
+                schemas.TransactionResponse.model_validate(row).model_dump_json() + "\n"
+                for row in rows
+            )
+    finally:
+        db.close()
+
 
 @router.post("/", response_model=schemas.TransactionResponse)
-def create_transaction(
+async def create_transaction(
     transaction: schemas.TransactionCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    return crud.create_transaction(
+    return await crud_async.create_transaction(
         db=db, transaction=transaction, user_id=current_user.id
     )
 
 
-@router.get("/", response_model=list[schemas.TransactionResponse])
-def get_transactions(
+@router.post(
+    "/import",
+    response_model=schemas.ImportResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_transactions(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = None,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    transactions = crud.get_transactions_by_user(db=db, user_id=current_user.id)
+    fmt = format or imports.detect_format(request.headers.get("content-type", ""))
+    if fmt is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload text/csv or application/x-ndjson, or pass ?format=",
+        )
+    importer = imports.TransactionImporter(db, current_user.id)
+    return await importer.run(request.stream(), fmt)
+
+
+@router.post("/batch", response_model=schemas.TransactionBatchResult)
+async def batch_transactions(
+    operations: schemas.TransactionBatch,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    return await crud_async.run(
+        db, batch.apply_transactions, current_user.id, operations.operations
+    )
+
+
+@router.get(
+    "/",
+    response_model=list[schemas.TransactionResponse],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+    dependencies=[Depends(etag.conditional_get)],
+)
+async def get_transactions(
+    request: Request,
+    response: Response,
+    query: Annotated[schemas.TransactionQuery, Query()],
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    if query.format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get(
+        "accept", ""
+    ):
+        session_factory = read_routing.read_router.sync_session_factory(current_user.id)
+        return StreamingResponse(
+            _ndjson_lines(session_factory, current_user.id, query),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    page = query
+    if query.limit is not None:
+        page = query.model_copy(update={"limit": query.limit + 1})
+    if serialization.enabled():
+        transactions = await crud_async.get_transaction_rows_by_user(
+            db=db,
+            user_id=current_user.id,
+            query=page,
+            fields=serialization.transactions.fields,
+        )
+    else:
+        transactions = await crud_async.get_transactions_by_user(
+            db=db, user_id=current_user.id, query=page
+        )
+    if query.limit is not None and len(transactions) > query.limit:
+        transactions = transactions[: query.limit]
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(last.date, last.id)
+    if serialization.enabled():
+        return serialization.json_response(
+            serialization.transactions.encode(transactions), response
+        )
     return transactions
 
 
 @router.get("/{transaction_id}", response_model=schemas.TransactionResponse)
-def get_transaction(
+async def get_transaction(
     transaction_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    transaction = crud.get_transaction(db=db, transaction_id=transaction_id)
-    if transaction.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to view this transaction",
-        )
-    return transaction
+    return await crud_async.get_transaction(
+        db=db, transaction_id=transaction_id, user_id=current_user.id
+    )
 
 
 @router.delete("/{transaction_id}", response_model=schemas.TransactionResponse)
-def delete_transaction(
+async def delete_transaction(
     transaction_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    transaction = crud.get_transaction(db=db, transaction_id=transaction_id)
-    if transaction.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to delete this transaction",
-        )
-    return crud.delete_transaction(db=db, transaction_id=transaction_id)
+    return await crud_async.delete_transaction(
+        db=db, transaction_id=transaction_id, user_id=current_user.id
+    )
 
 
 @router.put("/{transaction_id}", response_model=schemas.TransactionResponse)
-def update_transaction(
+async def update_transaction(
     transaction_id: int,
     transaction: schemas.TransactionCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    existing_transaction = crud.get_transaction(db=db, transaction_id=transaction_id)
-    if existing_transaction.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You do not have permission to update this transaction",
-        )
-
-    updated_transaction = crud.update_transaction(
-        db=db, transaction_id=transaction_id, transaction_update=transaction
+    return await crud_async.update_transaction(
+        db=db,
+        transaction_id=transaction_id,
+        transaction_update=transaction,
+        user_id=current_user.id,
     )
-    return updated_transaction
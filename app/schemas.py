@@ -1,6 +1,6 @@
 import enum
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import Literal, Optional
 
 from pydantic import BaseModel, EmailStr, Field, validator
 
@@ -13,6 +13,19 @@ class TransactionType(str, enum.Enum):
     AIRDROP = "AIRDROP"
 
 
+class CostBasisMethod(str, enum.Enum):
+    FIFO = "FIFO"
+    LIFO = "LIFO"
+    AVERAGE = "AVERAGE"
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
 class PlatformType(str, enum.Enum):
     EXCHANGE = "EXCHANGE"
     BLOCKCHAIN = "BLOCKCHAIN"
@@ -75,6 +88,101 @@ class TransactionResponse(TransactionBase):
         from_attributes = True
 
 
+class TransactionQuery(BaseModel):
+    asset_name: Optional[str] = None
+    platform_id: Optional[int] = None
+    transaction_type: Optional[TransactionType] = None
+    date_from: Optional[datetime] = Field(None, description="Inclusive lower bound")
+    date_to: Optional[datetime] = Field(None, description="Exclusive upper bound")
+    order: Literal["asc", "desc"] = "asc"
+    limit: Optional[int] = Field(None, ge=1, le=1000)
+    cursor: Optional[str] = None
+    format: Literal["json", "ndjson"] = "json"
+
+    @validator("asset_name", pre=True, always=True)
+    def set_lowercase(cls, v):
+        if v:
+            return v.lower()
+        return v
+
+
+class HistoryQuery(BaseModel):
+    asset_name: Optional[str] = None
+    platform_id: Optional[int] = None
+    date_from: Optional[date] = Field(None, description="Defaults to a year back")
+    date_to: Optional[date] = Field(None, description="Defaults to today")
+    interval: Literal["day", "week", "month"] = "day"
+
+    @validator("asset_name", pre=True, always=True)
+    def set_lowercase(cls, v):
+        if v:
+            return v.lower()
+        return v
+
+
+class HistoryPoint(BaseModel):
+    date: date
+    total_amount: float
+    total_cost: float
+
+
+class HistorySeries(BaseModel):
+    asset_name: str
+    cost_asset: str
+    platform_name: str
+    points: list[HistoryPoint]
+
+
+class ValuationHistoryQuery(HistoryQuery):
+    quote: Optional[str] = Field(None, description="Defaults to PRICE_QUOTE")
+
+    @validator("quote", pre=True, always=True)
+    def set_quote_lowercase(cls, v):
+        if v:
+            return v.lower()
+        return v
+
+
+class ValuationHistoryPoint(BaseModel):
+    date: date
+    market_value: float
+    unpriced_assets: list[str]
+
+
+class ValuationHistory(BaseModel):
+    quote: str
+    points: list[ValuationHistoryPoint]
+
+
+class ImportRowError(BaseModel):
+    row: int
+    errors: list[str]
+
+
+class ImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: list[ImportRowError]
+
+
+class TransactionOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: Optional[TransactionCreate] = None
+
+
+class TransactionBatch(BaseModel):
+    operations: list[TransactionOperation] = Field(..., min_length=1, max_length=1000)
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int]
+    status: int
+    detail: Optional[str]
+
+
 class PlatformBase(BaseModel):
     name: str
     platform_type: PlatformType
@@ -95,6 +203,36 @@ class PlatformResponse(PlatformBase):
         from_attributes = True
 
 
+class PlatformOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: Optional[PlatformCreate] = None
+
+
+class PlatformBatch(BaseModel):
+    operations: list[PlatformOperation] = Field(..., min_length=1, max_length=1000)
+
+
+class TransactionBatchItemResult(BatchItemResult):
+    transaction: Optional[TransactionResponse] = None
+
+
+class PlatformBatchItemResult(BatchItemResult):
+    platform: Optional[PlatformResponse] = None
+
+
+class TransactionBatchResult(BaseModel):
+    applied: int
+    failed: int
+    results: list[TransactionBatchItemResult]
+
+
+class PlatformBatchResult(BaseModel):
+    applied: int
+    failed: int
+    results: list[PlatformBatchItemResult]
+
+
 class AssetResponse(BaseModel):
     asset_name: str
     cost_asset: Optional[str]
@@ -104,3 +242,49 @@ class AssetResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class ValuedHolding(AssetResponse):
+    price: Optional[float]
+    priced_at: Optional[datetime]
+    market_value: Optional[float]
+    unrealized_pnl: Optional[float] = Field(
+        None, description="Only set when the cost asset is the quote"
+    )
+
+
+class ValuationResponse(BaseModel):
+    quote: str
+    market_value: float
+    holdings: list[ValuedHolding]
+    unpriced_assets: list[str]
+
+
+class CostBasisResponse(BaseModel):
+    asset_name: str
+    cost_asset: str
+    platform_name: str
+    method: CostBasisMethod
+    quantity: float
+    cost_basis: float
+    average_cost: float
+    realized_proceeds: float
+    realized_cost_basis: float
+    realized_pnl: float
+
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: JobStatus
+    progress: float
+    attempts: int
+    max_attempts: int
+    result: Optional[dict]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,62 @@
+import json
+from typing import Any, Iterable, Sequence
+
+from fastapi import Response
+from pydantic import BaseModel
+
+from app import schemas
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if settings.FAST_SERIALIZATION and orjson is None:
+    raise RuntimeError("FAST_SERIALIZATION requires orjson")
+
+
+class RowEncoder:
+    # Encodes row tuples whose columns are in the order of the schema's
+    # fields, producing the same JSON as validating each row into the schema
+    # and dumping it: orjson writes enums by value and naive datetimes in
+    # ISO format like pydantic does, and Float columns already come back as
+    # floats from both drivers, so no per-value conversion is needed.
+
+    def __init__(self, fields: Sequence[str]):
+        self.fields = tuple(fields)
+
+    @classmethod
+    def for_schema(cls, schema: type[BaseModel]) -> "RowEncoder":
+        return cls(schema.model_fields)
+
+    def encode(self, rows: Iterable[Sequence]) -> bytes:
+        fields = self.fields
+        return orjson.dumps([dict(zip(fields, row)) for row in rows])
+
+
+transactions = RowEncoder.for_schema(schemas.TransactionResponse)
+platforms = RowEncoder.for_schema(schemas.PlatformResponse)
+holdings = RowEncoder(
+    ("asset_name", "cost_asset", "platform_name", "total_amount", "total_cost")
+)
+
+
+def enabled() -> bool:
+    return settings.FAST_SERIALIZATION
+
+
+def dumps(content: Any) -> bytes:
+    # The bytes FastAPI's JSONResponse renders for the same content.
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def json_response(body: bytes, sub_response: Response) -> Response:
+    # Returning a Response skips FastAPI's response_model handling, which is
+    # the point, but also the headers set on the injected Response (ETag,
+    # X-Next-Cursor), so they are carried over the way FastAPI would.
+    response = Response(body, media_type="application/json")
+    response.headers.raw.extend(sub_response.headers.raw)
+    return response
@@ -0,0 +1,50 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+
+class SingleFlight:
+    """Computations in progress, by key, so that concurrent callers that
+    need the same thing share one computation instead of starting their own.
+
+    Each computation runs in its own task. Callers, the one that started it
+    included, await it through asyncio.shield: a caller that is cancelled,
+    e.g. because its client disconnected, stops waiting without cancelling
+    the computation for everyone else.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def get(self, key: Hashable) -> Optional[asyncio.Task]:
+        return self._tasks.get(key)
+
+    def start(
+        self, keys: Iterable[Hashable], compute: Callable[[], Awaitable]
+    ) -> asyncio.Task:
+        """Run compute() for all of keys; get(key) returns its task until it
+        finishes."""
+        keys = list(keys)
+
+        async def run():
+            try:
+                return await compute()
+            finally:
+                for key in keys:
+                    if self._tasks.get(key) is task:
+                        del self._tasks[key]
+
+        task = asyncio.ensure_future(run())
+        task.add_done_callback(_retrieve)
+        for key in keys:
+            self._tasks[key] = task
+        return task
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+def _retrieve(task: asyncio.Task) -> None:
+    # Every waiter may have been cancelled; do not log the error as never
+    # retrieved.
+    if not task.cancelled():
+        task.exception()
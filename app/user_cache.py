@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.redis_client import get_redis
+from app.schemas import UserResponse
+
+
+class LocalUserCacheBackend:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, email: str) -> Optional[UserResponse]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return user
+
+    def set(self, email: str, user: UserResponse) -> None:
+        with self._lock:
+            self._entries[email] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, email: str) -> None:
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedUserCacheBackend:
+    def __init__(self, client, ttl: float, prefix: str = "cwd:user:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, email: str) -> Optional[UserResponse]:
+        raw = self.client.get(self.prefix + email)
+        return UserResponse.model_validate_json(raw) if raw else None
+
+    def set(self, email: str, user: UserResponse) -> None:
+        self.client.set(
+            self.prefix + email, user.model_dump_json(), ex=max(int(self.ttl), 1)
+        )
+
+    def delete(self, email: str) -> None:
+        self.client.delete(self.prefix + email)
+
+    def clear(self) -> None:
+        pass
+
+
+class UserCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, email: str) -> Optional[UserResponse]:
+        user = self.backend.get(email)
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    def set(self, email: str, user: UserResponse) -> None:
+        self.backend.set(email, user)
+
+    def invalidate(self, email: str) -> None:
+        self.invalidations += 1
+        self.backend.delete(email)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+        if isinstance(self.backend, LocalUserCacheBackend):
+            stats["entries"] = len(self.backend)
+        return stats
+
+
+def _build_backend():
+    client = get_redis()
+    if client is not None:
+        return SharedUserCacheBackend(client, settings.USER_CACHE_TTL_SECONDS)
+    return LocalUserCacheBackend(
+        settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS
+    )
+
+
+user_cache = UserCache(_build_backend())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, models.User):
+            emails = session.info.setdefault("changed_user_emails", set())
+            emails.add(instance.email)
+            emails.update(inspect(instance).attrs.email.history.deleted or ())
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for email in session.info.pop("changed_user_emails", ()):
+        user_cache.invalidate(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_user_emails", None)
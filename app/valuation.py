@@ -0,0 +1,85 @@
+from datetime import datetime, time
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app import history, prices, schemas
+
+
+def _price(asset_name: str, quote: str, quotes: dict) -> Optional[prices.Quote]:
+    if asset_name == quote:
+        return None, 1.0
+    return quotes.get((asset_name, quote))
+
+
+def held_pairs(rows: List[dict], quote: str) -> List[prices.Pair]:
+    return sorted({(row["asset_name"], quote) for row in rows} - {(quote, quote)})
+
+
+def value_holdings(
+    rows: List[dict], quotes: Dict[prices.Pair, Optional[prices.Quote]], quote: str
+) -> dict:
+    """Price every holding at the latest quote in one pass. Holdings without
+    a price are returned unvalued and listed in unpriced_assets."""
+    holdings = []
+    unpriced = set()
+    market_value = 0.0
+    for row in rows:
+        found = _price(row["asset_name"], quote, quotes)
+        valued = dict(row, price=None, priced_at=None, market_value=None)
+        valued["unrealized_pnl"] = None
+        if found is None:
+            unpriced.add(row["asset_name"])
+        else:
+            timestamp, price = found
+            value = row["total_amount"] * price
+            valued["price"] = price
+            if timestamp is not None:
+                valued["priced_at"] = prices.from_timestamp(timestamp)
+            valued["market_value"] = value
+            if row["cost_asset"] == quote:
+                valued["unrealized_pnl"] = value - row["total_cost"]
+            market_value += value
+        holdings.append(valued)
+    return {
+        "quote": quote,
+        "market_value": market_value,
+        "holdings": holdings,
+        "unpriced_assets": sorted(unpriced),
+    }
+
+
+def value_history(
+    db: Session, owner_id: int, query: schemas.ValuationHistoryQuery, quote: str
+) -> dict:
+    # Reuses the holding history and prices each point at the last stored
+    # price at or before the end of its day.
+    series = history.series(db, owner_id, query)
+    stored = prices.price_store.series(db, held_pairs(series, quote))
+    points = []
+    if series:
+        for index, point in enumerate(series[0]["points"]):
+            end_of_day = prices.to_timestamp(datetime.combine(point["date"], time.max))
+            market_value = 0.0
+            unpriced = set()
+            for holding in series:
+                amount = holding["points"][index]["total_amount"]
+                if not amount:
+                    continue
+                asset_name = holding["asset_name"]
+                if asset_name == quote:
+                    market_value += amount
+                    continue
+                price = stored[(asset_name, quote)].at(end_of_day)
+                if price is None:
+                    unpriced.add(asset_name)
+                else:
+                    market_value += amount * price
+            points.append(
+                {
+                    "date": point["date"],
+                    "market_value": market_value,
+                    "unpriced_assets": sorted(unpriced),
+                }
+            )
+    return {"quote": quote, "points": points}
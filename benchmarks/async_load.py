@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import (
+    free_port,
+    seed,
+    start_server,
+    stop_server,
+    summarize,
+    write_results,
+)
+
+PATHS = ("/assets/", "/transactions/", "/platforms/")
+
+
+async def run_load(port: int, tokens: list, concurrency: int, duration: float):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(index: int, client: httpx.AsyncClient):
+        nonlocal errors
+        n = index
+        while time.monotonic() < deadline:
+            headers = {"Authorization": f"Bearer {tokens[n % len(tokens)]}"}
+            started = time.perf_counter()
+            response = await client.get(PATHS[n % len(PATHS)], headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+            n += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i, client) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the sync and async database paths under load."
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    tokens = seed(args.users, args.transactions)
+    results = {}
+    for mode, async_database in (("sync", "false"), ("async", "true")):
+        port = free_port()
+        server = start_server({"ASYNC_DATABASE": async_database}, port)
+        try:
+            results[mode] = asyncio.run(
+                run_load(port, tokens, args.concurrency, args.duration)
+            )
+        finally:
+            stop_server(server)
+        print(mode, results[mode])
+
+    results["parameters"] = vars(args)
+    print("Results written to", write_results("async_load", results))
+
+
+if __name__ == "__main__":
+    main()
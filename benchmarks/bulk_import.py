@@ -0,0 +1,54 @@
+import argparse
+import time
+
+import httpx
+
+from benchmarks.common import free_port, seed, start_server, stop_server, write_results
+
+
+def csv_rows(platform_id: int, rows: int):
+    yield b"asset_name,amount,cost,cost_asset,date,transaction_type,platform_id\n"
+    for n in range(rows):
+        kind = "BUY" if n % 3 else "DEPOSIT"
+        yield (
+            f"{('btc', 'eth', 'sol')[n % 3]},{1 + n % 7},{10 * (1 + n % 5)},usd,"
+            f"2021-01-01T00:00:{n % 60:02d},{kind},{platform_id}\n"
+        ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bulk CSV import throughput.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    token = seed(1, 0)[0]
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "text/csv"}
+    port = free_port()
+    server = start_server({}, port)
+    try:
+        started = time.perf_counter()
+        response = httpx.post(
+            f"http://127.0.0.1:{port}/transactions/import",
+            content=csv_rows(1, args.rows),
+            headers=headers,
+            timeout=None,
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        stop_server(server)
+
+    response.raise_for_status()
+    result = response.json()
+    results = {
+        "parameters": vars(args),
+        "inserted": result["inserted"],
+        "failed": result["failed"],
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(result["inserted"] / elapsed, 1),
+    }
+    print(results)
+    print("Results written to", write_results("bulk_import", results))
+
+
+if __name__ == "__main__":
+    main()
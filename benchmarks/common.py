@@ -0,0 +1,174 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+)
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-of-at-least-32-bytes")
+# Every virtual user comes from one address; measure the server, not the
+# limiter in front of it.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("STATS_TOKEN", "benchmark-stats-token")
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0) * 1000, 3),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(name: str, results: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    revision = git_revision()
+    path = os.path.join(RESULTS_DIR, f"{name}-{revision}.json")
+    payload = {
+        "benchmark": name,
+        "revision": revision,
+        "created_at": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    return path
+
+
+def reset_schema() -> None:
+    from sqlalchemy import text
+
+    from app import models
+    from app.database import engine
+
+    models.Base.metadata.drop_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+
+def seed(users: int, transactions_per_user: int) -> list:
+    from app import models
+    from app.database import engine
+
+    reset_schema()
+    models.Base.metadata.create_all(bind=engine)
+    return populate(users, transactions_per_user)
+
+
+def populate(users: int, transactions_per_user: int) -> list:
+    from app import holdings, models
+    from app.auth import create_access_token
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    tokens = []
+    try:
+        for index in range(users):
+            user = models.User(email=f"bench{index}@example.com", hashed_password="-")
+            db.add(user)
+            db.flush()
+            platform = models.Platform(
+                name="Exchange",
+                platform_type=models.PlatformType.EXCHANGE,
+                owner_id=user.id,
+            )
+            db.add(platform)
+            db.flush()
+            start = datetime(2020, 1, 1)
+            rows = [
+                {
+                    "asset_name": ("btc", "eth", "sol")[n % 3],
+                    "amount": 1.0 + n % 7,
+                    "cost": 10.0 * (1 + n % 5),
+                    "cost_asset": "usd",
+                    "date": start + timedelta(hours=n),
+                    "transaction_type": models.TransactionType.BUY.name,
+                    "owner_id": user.id,
+                    "platform_id": platform.id,
+                }
+                for n in range(transactions_per_user)
+            ]
+            if rows:
+                db.execute(models.Transaction.__table__.insert(), rows)
+            tokens.append(create_access_token(data={"email": user.email}))
+        holdings.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    return tokens
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    import httpx
+
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env={**os.environ, **env},
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
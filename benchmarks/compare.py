@@ -0,0 +1,83 @@
+import argparse
+import json
+import sys
+
+# Keys where a smaller number is better; rates ("_per_s") are the opposite.
+LOWER_IS_BETTER = ("_ms", "_us", "_s", "_kib")
+HIGHER_IS_BETTER = ("_per_s", "speedup")
+
+
+def direction(key: str) -> int:
+    if any(marker in key for marker in HIGHER_IS_BETTER):
+        return 1
+    if key.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    values = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if key == "parameters":
+            continue
+        if isinstance(value, dict):
+            values.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    """Return (metric, baseline, candidate, change, regressed) rows.
+
+    change is relative and signed so that positive means better.
+    """
+    old = flatten(baseline["results"])
+    new = flatten(candidate["results"])
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        sign = direction(path.rsplit(".", 1)[-1])
+        if not sign or not old[path]:
+            continue
+        change = sign * (new[path] - old[path]) / abs(old[path])
+        rows.append((path, old[path], new[path], change, change < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark result files, e.g. the same benchmark "
+        "on two commits, and exit non-zero on regressions."
+    )
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change that counts as a regression (default 0.1)",
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline["benchmark"] != candidate["benchmark"]:
+        parser.error("the files are results of different benchmarks")
+    if baseline["results"].get("parameters") != candidate["results"].get("parameters"):
+        print("warning: the runs used different parameters", file=sys.stderr)
+
+    rows = compare(baseline, candidate, args.threshold)
+    print(f"{baseline['revision']} -> {candidate['revision']}")
+    for path, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{path:60} {old:>12.6g} {new:>12.6g} {change:+8.1%}{flag}")
+    regressions = sum(row[4] for row in rows)
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
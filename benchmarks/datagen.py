@@ -0,0 +1,191 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import reset_schema
+
+ASSETS = (
+    "btc eth usdt bnb sol xrp usdc ada doge avax trx dot link matic ton shib ltc "
+    "bch atom uni xlm etc icp fil apt arb op near vet algo"
+).split()
+PLATFORMS = (
+    ("Binance", "EXCHANGE"),
+    ("Coinbase", "EXCHANGE"),
+    ("Kraken", "EXCHANGE"),
+    ("Ledger", "BLOCKCHAIN"),
+    ("MetaMask", "BLOCKCHAIN"),
+    ("Phantom", "BLOCKCHAIN"),
+)
+TRANSACTION_TYPES = (
+    ("BUY", 50),
+    ("DEPOSIT", 20),
+    ("SELL", 15),
+    ("WITHDRAW", 10),
+    ("AIRDROP", 5),
+)
+PASSWORD = "benchmark-password"
+HISTORY_START = datetime(2019, 1, 1)
+HISTORY_DAYS = 5 * 365
+
+
+def history_sizes(
+    rng: random.Random, users: int, alpha: float, minimum: int, maximum: int
+):
+    # Pareto-distributed: most users log a few dozen transactions, a handful
+    # of traders log tens of thousands, which is what stresses per-user
+    # queries and the derived tables.
+    return [min(maximum, int(minimum * rng.paretovariate(alpha))) for _ in range(users)]
+
+
+def asset_weights(count: int) -> list:
+    # Zipf-like popularity: the top few assets dominate every portfolio.
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+def transactions_for(rng: random.Random, owner_id: int, platform_ids: list, size: int):
+    weights = asset_weights(len(ASSETS))
+    types = [name for name, _ in TRANSACTION_TYPES]
+    type_weights = [weight for _, weight in TRANSACTION_TYPES]
+    # A user trades in bursts over a random part of the history.
+    start = HISTORY_START + timedelta(days=rng.randrange(HISTORY_DAYS // 2))
+    span = (HISTORY_START + timedelta(days=HISTORY_DAYS) - start).total_seconds()
+    offsets = sorted(rng.random() ** 2 * span for _ in range(size))
+    for offset, asset, transaction_type in zip(
+        offsets,
+        rng.choices(ASSETS, weights, k=size),
+        rng.choices(types, type_weights, k=size),
+    ):
+        amount = round(rng.lognormvariate(0, 2), 8) or 1e-8
+        priced = transaction_type in ("BUY", "SELL")
+        yield {
+            "asset_name": asset,
+            "contract_type": "erc20" if asset in ("usdt", "usdc", "link") else None,
+            "amount": amount,
+            "cost": round(amount * rng.lognormvariate(5, 2), 2) if priced else None,
+            "cost_asset": rng.choice(("usd", "usd", "usd", "eur")) if priced else None,
+            # A few exports carry no date at all.
+            "date": (
+                None
+                if rng.random() < 0.01
+                else HISTORY_START + timedelta(seconds=offset)
+            ),
+            "transaction_type": transaction_type,
+            "owner_id": owner_id,
+            "platform_id": rng.choice(platform_ids),
+        }
+
+
+def generate(
+    users: int,
+    seed: int = 0,
+    alpha: float = 1.16,
+    min_history: int = 10,
+    max_history: int = 50_000,
+    derived: bool = True,
+    chunk_size: int = 5000,
+) -> list:
+    """Insert synthetic users, platforms and transactions.
+
+    Returns one dict per user with its email, id and history size, so load
+    scenarios can pick light and heavy users. Every user's password is
+    PASSWORD. The same arguments always produce the same data.
+    """
+    from app import history, holdings, lots, models
+    from app.config import settings
+    from app.database import SessionLocal
+    from app.hashing import hash_password_sync
+
+    rng = random.Random(seed)
+    hashed_password = hash_password_sync(PASSWORD, settings.BCRYPT_ROUNDS)
+    sizes = history_sizes(rng, users, alpha, min_history, max_history)
+    db = SessionLocal()
+    generated = []
+    try:
+        for index, size in enumerate(sizes):
+            user = models.User(
+                email=f"user{index}@example.com", hashed_password=hashed_password
+            )
+            db.add(user)
+            db.flush()
+            platforms = [
+                models.Platform(
+                    name=name,
+                    platform_type=models.PlatformType[platform_type],
+                    owner_id=user.id,
+                )
+                for name, platform_type in rng.sample(PLATFORMS, rng.randint(1, 4))
+            ]
+            db.add_all(platforms)
+            db.flush()
+            rows = list(transactions_for(rng, user.id, [p.id for p in platforms], size))
+            for start in range(0, len(rows), chunk_size):
+                db.execute(
+                    models.Transaction.__table__.insert(),
+                    rows[start : start + chunk_size],
+                )
+            generated.append({"email": user.email, "id": user.id, "transactions": size})
+        if derived:
+            holdings.rebuild(db)
+            history.rebuild(db)
+            lots.rebuild(db)
+        db.commit()
+    finally:
+        db.close()
+    return generated
+
+
+def seed(users: int, **kwargs) -> list:
+    from app import models
+    from app.database import engine
+
+    reset_schema()
+    models.Base.metadata.create_all(bind=engine)
+    return generate(users, **kwargs)
+
+
+def describe(generated: list) -> dict:
+    sizes = sorted(user["transactions"] for user in generated)
+    return {
+        "users": len(sizes),
+        "transactions": sum(sizes),
+        "median_history": sizes[len(sizes) // 2] if sizes else 0,
+        "p99_history": sizes[int(len(sizes) * 0.99)] if sizes else 0,
+        "max_history": sizes[-1] if sizes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fill DATABASE_URL with synthetic users whose history sizes "
+        "follow a power law. Drops the existing schema first."
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--alpha", type=float, default=1.16)
+    parser.add_argument("--min-history", type=int, default=10)
+    parser.add_argument("--max-history", type=int, default=50_000)
+    parser.add_argument(
+        "--no-derived",
+        dest="derived",
+        action="store_false",
+        help="skip rebuilding holdings, snapshots and lots",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generated = seed(
+        args.users,
+        seed=args.seed,
+        alpha=args.alpha,
+        min_history=args.min_history,
+        max_history=args.max_history,
+        derived=args.derived,
+    )
+    summary = describe(generated)
+    summary["elapsed_s"] = round(time.perf_counter() - started, 2)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
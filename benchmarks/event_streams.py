@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.common import (
+    free_port,
+    seed,
+    start_server,
+    stop_server,
+    summarize,
+    write_results,
+)
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def listen(client, token: str, ready: asyncio.Event, received: list, sent):
+    headers = {"Authorization": f"Bearer {token}"}
+    async with client.stream("GET", "/events/", headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == ": connected":
+                ready.set()
+            elif line.startswith("event: transaction.created"):
+                received.append(time.perf_counter() - sent[0])
+                return
+
+
+async def run(port: int, tokens: list, streams: int) -> dict:
+    limits = httpx.Limits(max_connections=streams + 8)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=None
+    ) as client:
+        platform_id = (
+            await client.get(
+                "/platforms/", headers={"Authorization": f"Bearer {tokens[0]}"}
+            )
+        ).json()[0]["id"]
+        ready = [asyncio.Event() for _ in range(streams)]
+        received, sent = [], [0.0]
+        started = time.perf_counter()
+        listeners = [
+            asyncio.ensure_future(listen(client, tokens[0], event, received, sent))
+            for event in ready
+        ]
+        await asyncio.gather(*(event.wait() for event in ready))
+        connect_elapsed = time.perf_counter() - started
+
+        stats_headers = {"Authorization": f"Bearer {os.environ['STATS_TOKEN']}"}
+        stats = (await client.get("/stats/", headers=stats_headers)).json()["events"]
+        sent[0] = time.perf_counter()
+        response = await client.post(
+            "/transactions/",
+            json={
+                "asset_name": "btc",
+                "amount": 1,
+                "transaction_type": "DEPOSIT",
+                "platform_id": platform_id,
+            },
+            headers={"Authorization": f"Bearer {tokens[0]}"},
+        )
+        response.raise_for_status()
+        await asyncio.wait_for(asyncio.gather(*listeners), 60)
+        return {
+            "connect_all_s": round(connect_elapsed, 3),
+            "subscribers": stats["subscribers"],
+            "fan_out": summarize(received, time.perf_counter() - sent[0]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hold many idle event streams open and measure server memory "
+        "and the time for one write to reach all of them."
+    )
+    parser.add_argument("--streams", default="100,1000", help="comma-separated")
+    args = parser.parse_args()
+
+    results = {"parameters": vars(args)}
+    for streams in [int(value) for value in args.streams.split(",")]:
+        tokens = seed(1, 10)
+        port = free_port()
+        server = start_server({"EVENT_HEARTBEAT_SECONDS": "15"}, port)
+        try:
+            idle = rss_kib(server.pid)
+            result = asyncio.run(run(port, tokens, streams))
+            result["rss_idle_kib"] = idle
+            result["rss_per_stream_kib"] = round(
+                (rss_kib(server.pid) - idle) / streams, 2
+            )
+        finally:
+            stop_server(server)
+        results[f"streams_{streams}"] = result
+        print(streams, result)
+
+    print("Results written to", write_results("event_streams", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.common import ROOT, populate, reset_schema, write_results
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    return config
+
+
+def scenarios(user_id: int, transaction_id: int) -> dict:
+    from app import crud, schemas
+
+    return {
+        "list_page": lambda db: crud.get_transactions_by_user(
+            db, user_id, schemas.TransactionQuery(limit=100)
+        ),
+        "list_filtered_desc": lambda db: crud.get_transactions_by_user(
+            db,
+            user_id,
+            schemas.TransactionQuery(asset_name="btc", order="desc", limit=100),
+        ),
+        "assets_group_by": lambda db: crud.get_assets_by_user(db, user_id),
+        "holdings": lambda db: crud.get_holdings_by_user(db, user_id),
+        "platforms": lambda db: crud.get_platforms_by_user(db, user_id),
+        "transaction_by_id": lambda db: crud.get_transaction(db, transaction_id),
+    }
+
+
+def explain(connection, statement: str, parameters) -> str:
+    if connection.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql(
+            "EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters
+        )
+        return "\n".join(row[0] for row in rows)
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def measure(user_id: int, transaction_id: int, repeat: int) -> dict:
+    from sqlalchemy import event
+
+    from app.database import SessionLocal, engine
+
+    results = {}
+    for name, scenario in scenarios(user_id, transaction_id).items():
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        db = SessionLocal()
+        try:
+            event.listen(engine, "before_cursor_execute", capture)
+            scenario(db)
+            event.remove(engine, "before_cursor_execute", capture)
+
+            timings = []
+            for _ in range(repeat):
+                db.expunge_all()
+                started = time.perf_counter()
+                scenario(db)
+                timings.append(time.perf_counter() - started)
+
+            connection = db.connection()
+            plans = [explain(connection, *statement) for statement in statements]
+        finally:
+            db.close()
+
+        results[name] = {
+            "median_ms": round(statistics.median(timings) * 1000, 3),
+            "min_ms": round(min(timings) * 1000, 3),
+            "plans": plans,
+        }
+        print(f"{name:>20}: {results[name]['median_ms']} ms")
+    return results
+
+
+def main():
+    from alembic import command
+    from sqlalchemy import func
+
+    from app import models
+    from app.database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(
+        description="Time the main query shapes before and after the index migration."
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    config = alembic_config()
+    reset_schema()
+    command.upgrade(config, "0001")
+    populate(args.users, args.transactions)
+
+    db = SessionLocal()
+    try:
+        user_id = db.query(func.max(models.User.id)).scalar()
+        transaction_id = (
+            db.query(models.Transaction.id)
+            .filter(models.Transaction.owner_id == user_id)
+            .limit(1)
+            .scalar()
+        )
+    finally:
+        db.close()
+
+    print("before indexes")
+    before = measure(user_id, transaction_id, args.repeat)
+    command.upgrade(config, "head")
+    engine.dispose()
+    print("after indexes")
+    after = measure(user_id, transaction_id, args.repeat)
+
+    results = {"parameters": vars(args), "before": before, "after": after}
+    print("Results written to", write_results("indexes", results))
+
+
+if __name__ == "__main__":
+    main()
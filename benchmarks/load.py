@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks import datagen
+from benchmarks.bulk_import import csv_rows
+from benchmarks.common import (
+    free_port,
+    start_server,
+    stop_server,
+    summarize,
+    write_results,
+)
+
+# Relative weights of what a dashboard session does once logged in.
+ACTIONS = (
+    ("poll_assets", 50),
+    ("list_transactions_page", 20),
+    ("list_platforms", 10),
+    ("list_transactions_full", 8),
+    ("import", 4),
+    ("login", 2),
+)
+
+
+class Session:
+    def __init__(self, client: httpx.AsyncClient, user: dict, rng: random.Random):
+        self.client = client
+        self.user = user
+        self.rng = rng
+        self.headers = {}
+        self.etags = {}
+        self.platform_ids = []
+
+    async def login(self) -> httpx.Response:
+        response = await self.client.post(
+            "/token/",
+            json={"email": self.user["email"], "password": datagen.PASSWORD},
+        )
+        if response.status_code == 200:
+            token = response.json()["access_token"]
+            self.headers = {"Authorization": f"Bearer {token}"}
+        return response
+
+    async def poll(self, path: str) -> httpx.Response:
+        # Replays the last ETag like a polling client would.
+        headers = dict(self.headers)
+        if path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        response = await self.client.get(path, headers=headers)
+        if "etag" in response.headers:
+            self.etags[path] = response.headers["etag"]
+        return response
+
+    async def poll_assets(self) -> httpx.Response:
+        return await self.poll("/assets/")
+
+    async def list_platforms(self) -> httpx.Response:
+        response = await self.poll("/platforms/")
+        if response.status_code == 200:
+            self.platform_ids = [platform["id"] for platform in response.json()]
+        return response
+
+    async def list_transactions_page(self) -> httpx.Response:
+        return await self.poll("/transactions/?limit=100&order=desc")
+
+    async def list_transactions_full(self) -> httpx.Response:
+        return await self.client.get("/transactions/", headers=self.headers)
+
+    async def import_(self) -> httpx.Response:
+        if not self.platform_ids:
+            await self.list_platforms()
+        body = b"".join(csv_rows(self.rng.choice(self.platform_ids), 50))
+        return await self.client.post(
+            "/transactions/import",
+            content=body,
+            headers={**self.headers, "Content-Type": "text/csv"},
+        )
+
+    async def run(self, action: str) -> httpx.Response:
+        handler = self.import_ if action == "import" else getattr(self, action)
+        return await handler()
+
+
+async def run_scenario(
+    port: int, users: list, virtual_users: int, duration: float, seed: int
+) -> dict:
+    latencies = {name: [] for name, _ in ACTIONS}
+    errors = {name: 0 for name, _ in ACTIONS}
+    names = [name for name, _ in ACTIONS]
+    weights = [weight for _, weight in ACTIONS]
+    deadline = time.monotonic() + duration
+
+    async def virtual_user(index: int, client: httpx.AsyncClient):
+        rng = random.Random(seed * 100_003 + index)
+        session = Session(client, rng.choice(users), rng)
+        action = "login"
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await session.run(action)
+                failed = response.status_code not in (200, 304)
+            except httpx.HTTPError:
+                failed = True
+            latencies[action].append(time.perf_counter() - started)
+            errors[action] += failed
+            action = rng.choices(names, weights)[0]
+
+    limits = httpx.Limits(max_connections=virtual_users)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120
+    ) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(i, client) for i in range(virtual_users)))
+        elapsed = time.perf_counter() - started
+
+    results = {
+        name: summarize(latencies[name], elapsed, errors[name]) for name in names
+    }
+    everything = [value for values in latencies.values() for value in values]
+    results["total"] = summarize(everything, elapsed, sum(errors.values()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a mixed dashboard workload (login, asset polling, "
+        "transaction listing, imports) against a generated dataset."
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--virtual-users", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--async-database", action="store_true", help="serve with ASYNC_DATABASE"
+    )
+    args = parser.parse_args()
+
+    users = datagen.seed(args.users, seed=args.seed)
+    results = {"parameters": vars(args), "dataset": datagen.describe(users)}
+    port = free_port()
+    server = start_server(
+        {"ASYNC_DATABASE": "true" if args.async_database else "false"}, port
+    )
+    try:
+        results["scenario"] = asyncio.run(
+            run_scenario(port, users, args.virtual_users, args.duration, args.seed)
+        )
+    finally:
+        stop_server(server)
+
+    for name, summary in results["scenario"].items():
+        print(name, summary)
+    print("Results written to", write_results("load", results))
+
+
+if __name__ == "__main__":
+    main()
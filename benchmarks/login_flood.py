@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import (
+    free_port,
+    seed,
+    start_server,
+    stop_server,
+    summarize,
+    write_results,
+)
+
+CREDENTIALS = {"email": "flood@example.com", "password": "benchmark-password"}
+
+
+async def probe(client: httpx.AsyncClient, token: str, deadline: float) -> list:
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/platforms/", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def flood(client: httpx.AsyncClient, deadline: float, statuses: dict) -> list:
+    latencies = []
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/token/", json=CREDENTIALS)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+        elif response.status_code == 503:
+            await asyncio.sleep(0.05)
+    return latencies
+
+
+async def run_phases(port: int, token: str, concurrency: int, duration: float):
+    limits = httpx.Limits(max_connections=concurrency + 4)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120
+    ) as client:
+        response = await client.post("/users/", json=CREDENTIALS)
+        response.raise_for_status()
+
+        started = time.perf_counter()
+        baseline = await probe(client, token, time.monotonic() + duration)
+        baseline_elapsed = time.perf_counter() - started
+
+        statuses = {}
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        probed, *logins = await asyncio.gather(
+            probe(client, token, deadline),
+            *(flood(client, deadline, statuses) for _ in range(concurrency)),
+        )
+        elapsed = time.perf_counter() - started
+
+    logins = [latency for worker in logins for latency in worker]
+    return {
+        "probe_baseline": summarize(baseline, baseline_elapsed),
+        "probe_during_flood": summarize(probed, elapsed),
+        "logins": summarize(logins, elapsed, sum(statuses.values()) - len(logins)),
+        "login_statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure login throughput and the latency other endpoints "
+        "see during a login flood."
+    )
+    parser.add_argument("--workers", default="0,2", help="comma-separated pool sizes")
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    results = {"parameters": vars(args)}
+    for workers in [int(value) for value in args.workers.split(",")]:
+        token = seed(1, 10)[0]
+        port = free_port()
+        server = start_server(
+            {
+                "BCRYPT_ROUNDS": str(args.rounds),
+                "PASSWORD_HASH_WORKERS": str(workers),
+                "PASSWORD_HASH_MAX_PENDING": str(args.max_pending),
+            },
+            port,
+        )
+        try:
+            results[f"workers_{workers}"] = asyncio.run(
+                run_phases(port, token, args.concurrency, args.duration)
+            )
+        finally:
+            stop_server(server)
+        print(workers, results[f"workers_{workers}"])
+
+    print("Results written to", write_results("login_flood", results))
+
+
+if __name__ == "__main__":
+    main()
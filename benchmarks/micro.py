@@ -0,0 +1,124 @@
+import argparse
+import time
+
+from benchmarks import datagen
+from benchmarks.common import write_results
+
+
+def _loop(fn, args, loops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(loops):
+        fn(*args)
+    return time.perf_counter() - started
+
+
+def measure(fn, *args, repeat: int = 5, min_time: float = 0.2) -> dict:
+    # Grows the loop count until one loop takes min_time, like timeit's
+    # autorange, then keeps the fastest of repeat loops.
+    loops = 1
+    elapsed = _loop(fn, args, loops)
+    while elapsed < min_time:
+        loops *= 10 if elapsed * 10 < min_time else 2
+        elapsed = _loop(fn, args, loops)
+    best = min([elapsed] + [_loop(fn, args, loops) for _ in range(repeat - 1)])
+    per_call = best / loops
+    return {
+        "loops": loops,
+        "per_call_us": round(per_call * 1e6, 3),
+        "calls_per_s": round(1 / per_call, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the hot functions behind the portfolio and list "
+        "endpoints against a generated dataset."
+    )
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from pydantic import TypeAdapter
+
+    from app import crud, schemas, serialization
+    from app.auth import create_access_token, verify_token
+    from app.database import SessionLocal
+    from app.rate_limit import rate_limiter, request_user
+    from app.routers.assets import calculate_real_assets
+
+    generated = datagen.seed(args.users, seed=args.seed, derived=True)
+    by_size = sorted(generated, key=lambda user: user["transactions"])
+    targets = {"median": by_size[len(by_size) // 2], "largest": by_size[-1]}
+
+    results = {"parameters": vars(args), "dataset": datagen.describe(generated)}
+    token = create_access_token(data={"email": targets["median"]["email"]})
+    results["verify_token"] = measure(verify_token, token, repeat=args.repeat)
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    def admit():
+        rate_limiter.check("GET /assets/", request_user(headers), "127.0.0.1")
+
+    results["rate_limit_check"] = measure(admit, repeat=args.repeat)
+
+    db = SessionLocal()
+    try:
+        for label, target in targets.items():
+            user_id = target["id"]
+            grouped = crud.get_assets_by_user(db, user_id)
+            rows = crud.get_transaction_rows_by_user(
+                db,
+                user_id,
+                schemas.TransactionQuery(),
+                serialization.transactions.fields,
+            )
+            models = [
+                schemas.TransactionResponse.model_validate(
+                    dict(zip(serialization.transactions.fields, row))
+                )
+                for row in rows
+            ]
+            adapter = TypeAdapter(list[schemas.TransactionResponse])
+
+            def validate_and_dump():
+                adapter.dump_json(
+                    [
+                        schemas.TransactionResponse.model_validate(
+                            dict(zip(serialization.transactions.fields, row))
+                        )
+                        for row in rows
+                    ]
+                )
+
+            results[label] = {
+                "transactions": target["transactions"],
+                "get_assets_by_user": measure(
+                    crud.get_assets_by_user, db, user_id, repeat=args.repeat
+                ),
+                "get_holdings_by_user": measure(
+                    crud.get_holdings_by_user, db, user_id, repeat=args.repeat
+                ),
+                "calculate_real_assets": measure(
+                    calculate_real_assets, grouped, repeat=args.repeat
+                ),
+                "serialize_pydantic_dump": measure(
+                    adapter.dump_json, models, repeat=args.repeat
+                ),
+                "serialize_pydantic_validate_and_dump": measure(
+                    validate_and_dump, repeat=args.repeat
+                ),
+                "serialize_row_encoder": measure(
+                    serialization.transactions.encode, rows, repeat=args.repeat
+                ),
+            }
+            print(label, results[label])
+    finally:
+        db.close()
+
+    print("verify_token", results["verify_token"])
+    print("rate_limit_check", results["rate_limit_check"])
+    print("Results written to", write_results("micro", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import random
+import time
+
+from app import portfolio
+from benchmarks.common import write_results
+from tests.test_portfolio import _random_rows, reference_real_assets
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the vectorized portfolio engine with the per-row loop."
+    )
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = _random_rows(random.Random(0), args.rows, owners=list(range(args.users)))
+    columns = portfolio.PortfolioColumns.from_rows(rows)
+
+    def reference_per_user():
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row["owner_id"], []).append(row)
+        return {owner: reference_real_assets(group) for owner, group in by_user.items()}
+
+    reference_s = best_of(args.repeat, reference_per_user)
+    engine_s = best_of(args.repeat, portfolio.compute_assets_by_user, rows)
+    columnar_s = best_of(args.repeat, portfolio.compute, columns)
+    results = {
+        "parameters": vars(args),
+        "reference_s": round(reference_s, 4),
+        "engine_from_rows_s": round(engine_s, 4),
+        "engine_columnar_s": round(columnar_s, 4),
+        "speedup_columnar": round(reference_s / columnar_s, 2),
+    }
+    print(results)
+    print("Results written to", write_results("portfolio", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import time
+
+import httpx
+
+from benchmarks.common import (
+    free_port,
+    seed,
+    start_server,
+    stop_server,
+    summarize,
+    write_results,
+)
+
+PATHS = ("/transactions/", "/assets/", "/platforms/")
+
+
+def measure(port: int, token: str, path: str, requests: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+        client.get(path, headers=headers).raise_for_status()
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - request_started)
+        result = summarize(latencies, time.perf_counter() - started)
+    result["bytes"] = len(response.content)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare list endpoint latency with and without the "
+        "FAST_SERIALIZATION path."
+    )
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {"parameters": vars(args)}
+    token = seed(1, args.transactions)[0]
+    for fast in (False, True):
+        port = free_port()
+        server = start_server({"FAST_SERIALIZATION": str(int(fast))}, port)
+        try:
+            mode = "fast" if fast else "validated"
+            results[mode] = {
+                path: measure(port, token, path, args.requests) for path in PATHS
+            }
+        finally:
+            stop_server(server)
+        print(mode, results[mode])
+
+    results["speedup_p50"] = {
+        path: round(
+            results["validated"][path]["p50_ms"] / results["fast"][path]["p50_ms"], 2
+        )
+        for path in PATHS
+    }
+    print("speedup (p50)", results["speedup_p50"])
+    print("Results written to", write_results("serialization", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import ROOT, free_port, seed, stop_server, write_results
+
+
+def import_time() -> float:
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            "import time; started = time.perf_counter(); import app.main; "
+            "print(time.perf_counter() - started)",
+        ],
+        cwd=ROOT,
+        text=True,
+    )
+    return float(output)
+
+
+def time_to_first_request(env: dict, token: str) -> dict:
+    # Polls every few milliseconds from the moment the process is spawned,
+    # then times the first request that needs the database.
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env={**os.environ, **env},
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            while True:
+                try:
+                    client.get("/").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        raise RuntimeError("uvicorn exited during startup")
+                    time.sleep(0.002)
+            ready = time.perf_counter() - started
+            request_started = time.perf_counter()
+            client.get(
+                "/platforms/", headers={"Authorization": f"Bearer {token}"}
+            ).raise_for_status()
+            first_query = time.perf_counter() - request_started
+    finally:
+        stop_server(process)
+    return {"ready_s": ready, "first_db_request_s": first_query}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure import time and time to first request of a fresh "
+        "worker, with and without pool warm-up."
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    token = seed(1, 100)[0]
+    results = {"parameters": vars(args)}
+    imports = [import_time() for _ in range(args.runs)]
+    results["import_app_s"] = round(min(imports), 4)
+    print("import app.main", results["import_app_s"])
+
+    for label, warmup in (("no_warmup", "0"), ("warmup", "2")):
+        runs = [
+            time_to_first_request({"DB_POOL_WARMUP": warmup}, token)
+            for _ in range(args.runs)
+        ]
+        results[label] = {
+            key: round(sorted(run[key] for run in runs)[len(runs) // 2], 4)
+            for key in ("ready_s", "first_db_request_s")
+        }
+        print(label, results[label])
+
+    print("Results written to", write_results("startup", results))
+
+
+if __name__ == "__main__":
+    main()
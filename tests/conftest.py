@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+)
+os.environ.setdefault("SECRET_KEY", "test-secret-key-that-is-at-least-32-bytes")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+# The suite fires requests far faster than any client should; the limiter
+# has its own tests against a separate app.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("STATS_TOKEN", "test-stats-token")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.asset_cache import asset_cache
+from app.auth import create_access_token
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.main import app
+from app.redis_client import FakeRedis, get_redis
+from app.user_cache import user_cache
+
+
+@pytest.fixture
+def db():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    asset_cache.clear()
+    if isinstance(get_redis(), FakeRedis):
+        get_redis().flushall()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    return TestClient(app)
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email="alice@example.com", hashed_password="unused")
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+@pytest.fixture
+def auth_headers(user):
+    token = create_access_token(data={"email": user.email})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def platform(db, user):
+    db_platform = models.Platform(
+        name="Binance", platform_type=models.PlatformType.EXCHANGE, owner_id=user.id
+    )
+    db.add(db_platform)
+    db.commit()
+    db.refresh(db_platform)
+    return db_platform
+
+
+@pytest.fixture
+def stats_headers():
+    return {"Authorization": f"Bearer {settings.STATS_TOKEN}"}
@@ -0,0 +1,233 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import event
+
+from app import crud, database, holdings, models
+from app.asset_cache import (
+    ENTRY_OVERHEAD,
+    AssetCache,
+    LocalAssetTier,
+    SharedAssetTier,
+    asset_cache,
+)
+from app.database import get_db
+from app.dependencies import get_current_user, get_read_db
+from app.main import app
+from app.redis_client import FakeRedis
+from app.routers import assets
+
+
+def _buy(client, auth_headers, platform, amount):
+    response = client.post(
+        "/transactions/",
+        json={
+            "platform_id": platform.id,
+            "asset_name": "btc",
+            "cost_asset": "usd",
+            "transaction_type": "BUY",
+            "amount": amount,
+            "cost": amount * 100,
+            "date": datetime(2024, 1, 2).isoformat(),
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+
+
+def _get_assets(client, auth_headers) -> tuple:
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = database.async_engine or database.engine
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/assets/", headers=auth_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.text
+    return response.json(), sum("FROM holdings" in s for s in statements)
+
+
+def _run(cache, user_id, version, compute):
+    return asyncio.run(cache.get_or_compute(user_id, version, compute))
+
+
+def test_assets_are_computed_once_per_data_version(
+    client, db, user, platform, auth_headers, stats_headers
+):
+    _buy(client, auth_headers, platform, 1)
+    hits = asset_cache.local_hits
+
+    first, queries = _get_assets(client, auth_headers)
+    assert queries == 1
+    second, queries = _get_assets(client, auth_headers)
+    assert queries == 0
+    assert second == first == crud.get_holdings_by_user(db, user.id)
+    assert asset_cache.local_hits - hits == 1
+
+    invalidations = asset_cache.invalidations
+    _buy(client, auth_headers, platform, 2)
+    assert asset_cache.invalidations - invalidations == 1
+    third, queries = _get_assets(client, auth_headers)
+    assert queries == 1
+    assert third[0]["total_amount"] == 3
+
+    stats = client.get("/stats/", headers=stats_headers).json()["asset_cache"]
+    assert stats["entries"] == 1
+    assert stats["bytes"] > ENTRY_OVERHEAD
+
+
+def test_rebuilding_holdings_replaces_cached_bodies(
+    client, db, user, platform, auth_headers, capsys
+):
+    _buy(client, auth_headers, platform, 1)
+    db.query(models.Holding).filter_by(asset_name="btc").update({"total_amount": 5})
+    db.commit()
+    drifted, _ = _get_assets(client, auth_headers)
+    etag = client.get("/assets/", headers=auth_headers).headers["ETag"]
+
+    assert holdings.main(["rebuild", "--user-id", str(user.id)]) == 0
+
+    repaired, queries = _get_assets(client, auth_headers)
+    assert queries == 1
+    btc = {row["asset_name"]: row["total_amount"] for row in repaired}["btc"]
+    assert btc == 1 != {row["asset_name"]: row["total_amount"] for row in drifted}["btc"]
+    response = client.get("/assets/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_local_tier_evicts_least_recently_used_users_past_its_budget():
+    tier = LocalAssetTier(max_bytes=3 * (ENTRY_OVERHEAD + 10))
+    for user_id in range(3):
+        tier.set(user_id, 1, b"x" * 10)
+    assert tier.get(0, 1) == b"x" * 10
+    tier.set(3, 1, b"y" * 10)
+
+    assert tier.get(1, 1) is None
+    assert tier.get(0, 1) is not None
+    assert tier.evictions == 1
+    assert tier.bytes == 3 * (ENTRY_OVERHEAD + 10)
+    assert tier.get(3, 2) is None
+
+    tier.set(4, 1, b"z" * tier.max_bytes)
+    assert tier.get(4, 1) is None
+    assert len(tier) == 3
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = AssetCache(LocalAssetTier(max_bytes=1 << 20))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return b"[]"
+
+    async def scenario():
+        return await asyncio.gather(
+            *(cache.get_or_compute(7, 1, compute) for _ in range(5))
+        )
+
+    assert asyncio.run(scenario()) == [b"[]"] * 5
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["hit_ratio"] == 0.8
+
+
+def test_a_disconnected_first_caller_does_not_fail_the_others():
+    cache = AssetCache(LocalAssetTier(max_bytes=1 << 20))
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return b"[]"
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get_or_compute(7, 1, compute))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_compute(7, 1, compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == (b"[]", True)
+    assert cache.local.get(7, 1) == b"[]"
+
+
+def test_a_disconnected_request_does_not_take_the_shared_session_with_it(
+    db, user, platform, auth_headers, monkeypatch
+):
+    request_sessions, compute_sessions = [], []
+
+    async def recording_read_db(
+        session=Depends(get_db), current_user=Depends(get_current_user)
+    ):
+        request_sessions.append(session)
+        yield session
+
+    render = assets._render_assets
+
+    async def slow_render(session, user_id):
+        compute_sessions.append(session)
+        await asyncio.sleep(0.1)
+        return await render(session, user_id)
+
+    monkeypatch.setattr(assets, "_render_assets", slow_render)
+    coalesced = asset_cache.coalesced
+    app.dependency_overrides[get_read_db] = recording_read_db
+    transport = httpx.ASGITransport(app=app)
+
+    async def scenario():
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            first = asyncio.ensure_future(client.get("/assets/", headers=auth_headers))
+            await asyncio.sleep(0.05)
+            second = asyncio.ensure_future(
+                client.get("/assets/", headers=auth_headers)
+            )
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first.cancelled()
+
+    try:
+        response, cancelled = asyncio.run(scenario())
+    finally:
+        app.dependency_overrides.pop(get_read_db)
+
+    assert cancelled
+    assert response.status_code == 200
+    assert response.json() == []
+    assert len(compute_sessions) == 1
+    assert all(session is not compute_sessions[0] for session in request_sessions)
+    assert asset_cache.coalesced - coalesced == 1
+
+
+def test_shared_tier_serves_other_workers_until_invalidated():
+    client = FakeRedis()
+    worker_a = AssetCache(LocalAssetTier(1 << 20), SharedAssetTier(client, ttl=60))
+    worker_b = AssetCache(LocalAssetTier(1 << 20), SharedAssetTier(client, ttl=60))
+
+    async def compute():
+        return '[{"asset_name":"é"}]'.encode()
+
+    async def fail():
+        raise AssertionError("should have been cached")
+
+    body = _run(worker_a, 7, 1, compute)
+    assert _run(worker_b, 7, 1, fail) == body
+    assert _run(worker_b, 7, 1, fail) == body
+    assert worker_b.stats()["shared_hits"] == 1
+    assert worker_b.stats()["local_hits"] == 1
+
+    worker_a.invalidate(7)
+    assert client.get("cwd:assets:7") is None
+    assert _run(worker_b, 7, 2, compute) == body
+    assert worker_b.stats()["misses"] == 1
@@ -0,0 +1,154 @@
+from sqlalchemy import event
+
+from app import database, holdings, models
+
+
+def _transaction(platform, **fields):
+    return {
+        "asset_name": "btc",
+        "amount": 1,
+        "cost": 100,
+        "cost_asset": "usd",
+        "transaction_type": "BUY",
+        "platform_id": platform.id,
+        **fields,
+    }
+
+
+def _batch(client, auth_headers, path, operations):
+    response = client.post(path, json={"operations": operations}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_transaction_batch_reports_per_item(client, db, user, platform, auth_headers):
+    other = models.User(email="mallory@example.com", hashed_password="unused")
+    db.add(other)
+    db.flush()
+    foreign = models.Transaction(
+        **{**_transaction(platform), "transaction_type": models.TransactionType.BUY},
+        owner_id=other.id,
+    )
+    db.add(foreign)
+    db.commit()
+
+    created = _batch(
+        client,
+        auth_headers,
+        "/transactions/batch",
+        [{"op": "create", "data": _transaction(platform)} for _ in range(3)],
+    )
+    assert created["applied"] == 3
+    first, second, third = (result["id"] for result in created["results"])
+
+    result = _batch(
+        client,
+        auth_headers,
+        "/transactions/batch",
+        [
+            {"op": "update", "id": first, "data": _transaction(platform, amount=5)},
+            {"op": "delete", "id": second},
+            {"op": "delete", "id": foreign.id},
+            {"op": "delete", "id": 999999},
+            {"op": "update", "id": third},
+            {"op": "create", "data": _transaction(platform, platform_id=999999)},
+            {"op": "create", "data": _transaction(platform, transaction_type="SWAP")},
+            {"op": "delete", "id": first},
+        ],
+    )
+
+    assert [item["status"] for item in result["results"]] == [
+        200,
+        200,
+        403,
+        404,
+        422,
+        422,
+        422,
+        422,
+    ]
+    assert result["applied"] == 2 and result["failed"] == 6
+    assert result["results"][0]["transaction"]["amount"] == 5
+    assert result["results"][1]["transaction"]["id"] == second
+
+    remaining = {
+        row.id: row.amount
+        for row in db.query(models.Transaction).filter_by(owner_id=user.id)
+    }
+    assert remaining == {first: 5, third: 1}
+    assert holdings.verify(db, user.id) == []
+    response = client.get("/assets/history", headers=auth_headers)
+    assert response.status_code == 200
+
+
+def test_transaction_batch_statement_count_is_constant(
+    client, db, user, platform, auth_headers
+):
+    engine = database.async_engine.sync_engine if database.async_engine else None
+    engine = engine or database.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def count(size):
+        ids = [
+            result["id"]
+            for result in _batch(
+                client,
+                auth_headers,
+                "/transactions/batch",
+                [{"op": "create", "data": _transaction(platform)}] * size,
+            )["results"]
+        ]
+        operations = [
+            {"op": "update", "id": id, "data": _transaction(platform, amount=2)}
+            for id in ids[: size // 2]
+        ] + [{"op": "delete", "id": id} for id in ids[size // 2 :]]
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            _batch(client, auth_headers, "/transactions/batch", operations)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        return len(statements)
+
+    assert count(4) == count(40)
+
+
+def test_platform_batch(client, db, user, platform, auth_headers):
+    response = client.post(
+        "/transactions/", json=_transaction(platform), headers=auth_headers
+    )
+    assert response.status_code == 200
+    transaction_id = response.json()["id"]
+
+    result = _batch(
+        client,
+        auth_headers,
+        "/platforms/batch",
+        [
+            {"op": "create", "data": {"name": "Ledger", "platform_type": "BLOCKCHAIN"}},
+            {
+                "op": "update",
+                "id": platform.id,
+                "data": {"name": "Binance US", "platform_type": "EXCHANGE"},
+            },
+            {"op": "create", "data": {"name": "Nowhere", "platform_type": "BANK"}},
+        ],
+    )
+    assert [item["status"] for item in result["results"]] == [201, 200, 422]
+    assert result["results"][0]["platform"]["platform_type"] == "BLOCKCHAIN"
+    assert result["results"][1]["platform"]["name"] == "Binance US"
+
+    result = _batch(
+        client, auth_headers, "/platforms/batch", [{"op": "delete", "id": platform.id}]
+    )
+    assert result["applied"] == 1
+    assert db.query(models.Holding).filter_by(platform_id=platform.id).count() == 0
+    names = {platform.name for platform in db.query(models.Platform)}
+    assert names == {"Ledger"}
+    # The transaction stays, without its platform.
+    db.expire_all()
+    assert db.get(models.Transaction, transaction_id).platform_id is None
+    assert holdings.verify(db) == []
@@ -0,0 +1,40 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import crud_async, schemas
+from app.config import settings
+from app.database import async_database_url
+
+
+def test_crud_async_runs_on_async_session(db, user, platform):
+    async def scenario():
+        engine = create_async_engine(async_database_url(settings.DATABASE_URL))
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            async with session_factory() as session:
+                created = await crud_async.create_transaction(
+                    session,
+                    schemas.TransactionCreate(
+                        asset_name="BTC",
+                        amount=2,
+                        transaction_type="DEPOSIT",
+                        platform_id=platform.id,
+                    ),
+                    user_id=user.id,
+                )
+                listed = await crud_async.get_transactions_by_user(
+                    session, user_id=user.id
+                )
+                assets = await crud_async.get_holdings_by_user(
+                    session, user_id=user.id
+                )
+            return created, listed, assets
+        finally:
+            await engine.dispose()
+
+    created, listed, assets = asyncio.run(scenario())
+
+    assert [transaction.id for transaction in listed] == [created.id]
+    assert assets[0]["asset_name"] == "btc"
+    assert assets[0]["total_amount"] == 2
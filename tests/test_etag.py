@@ -0,0 +1,127 @@
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+from app import database, models
+from app.auth import create_access_token
+from app.etag import matches
+
+TRANSACTION = {
+    "asset_name": "btc",
+    "amount": 1,
+    "cost": 100,
+    "cost_asset": "usd",
+    "transaction_type": "BUY",
+}
+
+
+@contextlib.contextmanager
+def _statements():
+    engine = database.async_engine.sync_engine if database.async_engine else None
+    engine = engine or database.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.mark.parametrize("path", ["/assets/", "/transactions/", "/platforms/"])
+def test_unchanged_list_returns_304_from_users_table(
+    client, platform, auth_headers, path
+):
+    first = client.get(path, headers=auth_headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    with _statements() as statements:
+        response = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert len(statements) == 1
+    assert "FROM users" in statements[0]
+
+
+def test_writes_change_the_etag(client, db, user, platform, auth_headers):
+    def etag():
+        return client.get("/transactions/", headers=auth_headers).headers["ETag"]
+
+    tags = [etag()]
+    response = client.post(
+        "/transactions/",
+        json={**TRANSACTION, "platform_id": platform.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    transaction_id = response.json()["id"]
+    tags.append(etag())
+
+    client.put(
+        f"/transactions/{transaction_id}",
+        json={**TRANSACTION, "amount": 2, "platform_id": platform.id},
+        headers=auth_headers,
+    )
+    tags.append(etag())
+    client.post(
+        "/transactions/batch",
+        json={"operations": [{"op": "delete", "id": transaction_id}]},
+        headers=auth_headers,
+    )
+    tags.append(etag())
+    client.put(
+        f"/platforms/{platform.id}",
+        json={"name": "Renamed", "platform_type": "EXCHANGE"},
+        headers=auth_headers,
+    )
+    tags.append(etag())
+    assert len(set(tags)) == len(tags)
+
+    db.expire_all()
+    assert db.get(models.User, user.id).data_version == 4
+
+    response = client.get(
+        "/transactions/", headers={**auth_headers, "If-None-Match": tags[0]}
+    )
+    assert response.status_code == 200
+
+
+def test_etag_varies_with_query_and_ignores_other_users(
+    client, db, platform, auth_headers
+):
+    plain = client.get("/transactions/", headers=auth_headers).headers["ETag"]
+    filtered = client.get(
+        "/transactions/?asset_name=btc", headers=auth_headers
+    ).headers["ETag"]
+    assert plain != filtered
+
+    other = models.User(email="mallory@example.com", hashed_password="unused")
+    db.add(other)
+    db.commit()
+    token = create_access_token(data={"email": other.email})
+    response = client.post(
+        "/platforms/",
+        json={"name": "Elsewhere", "platform_type": "EXCHANGE"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+    response = client.get(
+        "/transactions/", headers={**auth_headers, "If-None-Match": plain}
+    )
+    assert response.status_code == 304
+
+
+def test_if_none_match_parsing():
+    etag = 'W/"1-2-abc"'
+    assert matches('"1-2-abc"', etag)
+    assert matches('W/"0-1-abc", W/"1-2-abc"', etag)
+    assert matches("*", etag)
+    assert not matches('W/"1-3-abc"', etag)
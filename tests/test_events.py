@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.websockets import WebSocketDisconnect
+
+from app import events, models
+from app.auth import create_access_token
+
+TRANSACTION = {
+    "asset_name": "btc",
+    "amount": 2,
+    "cost": 100,
+    "cost_asset": "usd",
+    "transaction_type": "BUY",
+}
+
+
+def _token(user):
+    return create_access_token(data={"email": user.email})
+
+
+def test_websocket_streams_committed_changes(client, db, user, platform, auth_headers):
+    other = models.User(email="mallory@example.com", hashed_password="unused")
+    db.add(other)
+    db.commit()
+    other_headers = {"Authorization": f"Bearer {_token(other)}"}
+
+    with client.websocket_connect(f"/events/ws?token={_token(user)}") as websocket:
+        client.post(
+            "/platforms/",
+            json={"name": "Elsewhere", "platform_type": "EXCHANGE"},
+            headers=other_headers,
+        )
+        response = client.post(
+            "/transactions/",
+            json={**TRANSACTION, "platform_id": platform.id},
+            headers=auth_headers,
+        )
+        transaction_id = response.json()["id"]
+
+        created = websocket.receive_json()
+        assert created["type"] == "transaction.created"
+        assert created["data"]["id"] == transaction_id
+        changed = websocket.receive_json()
+        assert changed["type"] == "assets.changed"
+        assert {
+            (delta["asset_name"], delta["amount"], delta["cost"])
+            for delta in changed["data"]["deltas"]
+        } == {("btc", 2, 100), ("usd", -100, 0)}
+
+        # A refused write rolls back and announces nothing.
+        response = client.delete("/platforms/999999", headers=auth_headers)
+        assert response.status_code == 404
+        client.put(
+            f"/platforms/{platform.id}",
+            json={"name": "Renamed", "platform_type": "EXCHANGE"},
+            headers=auth_headers,
+        )
+        updated = websocket.receive_json()
+        assert updated["type"] == "platform.updated"
+        assert updated["data"]["name"] == "Renamed"
+
+        client.post(
+            "/transactions/batch",
+            json={"operations": [{"op": "delete", "id": transaction_id}]},
+            headers=auth_headers,
+        )
+        assert websocket.receive_json()["type"] == "transaction.deleted"
+        changed = websocket.receive_json()
+        assert {delta["amount"] for delta in changed["data"]["deltas"]} == {-2, 100}
+
+    assert events.broker.stats()["subscribers"] == 0
+
+
+def test_deleting_platforms_announces_their_holdings(
+    client, db, user, platform, auth_headers
+):
+    other = client.post(
+        "/platforms/",
+        json={"name": "Elsewhere", "platform_type": "EXCHANGE"},
+        headers=auth_headers,
+    ).json()
+    for platform_id in (platform.id, other["id"]):
+        response = client.post(
+            "/transactions/",
+            json={**TRANSACTION, "platform_id": platform_id},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200, response.text
+
+    with client.websocket_connect(f"/events/ws?token={_token(user)}") as websocket:
+        client.delete(f"/platforms/{platform.id}", headers=auth_headers)
+        assert websocket.receive_json()["type"] == "platform.deleted"
+        changed = websocket.receive_json()
+        assert changed["type"] == "assets.changed"
+        assert {
+            (delta["asset_name"], delta["platform_id"], delta["amount"], delta["cost"])
+            for delta in changed["data"]["deltas"]
+        } == {("btc", platform.id, -2, -100), ("usd", platform.id, 100, 0)}
+
+        client.post(
+            "/platforms/batch",
+            json={"operations": [{"op": "delete", "id": other["id"]}]},
+            headers=auth_headers,
+        )
+        assert websocket.receive_json()["type"] == "platform.deleted"
+        changed = websocket.receive_json()
+        assert {
+            (delta["asset_name"], delta["platform_id"], delta["amount"])
+            for delta in changed["data"]["deltas"]
+        } == {("btc", other["id"], -2), ("usd", other["id"], 100)}
+
+
+def test_websocket_rejects_invalid_token(client, db):
+    with pytest.raises(WebSocketDisconnect) as rejected:
+        with client.websocket_connect("/events/ws?token=invalid"):
+            pass
+    assert rejected.value.code == 1008
+
+
+def test_sse_stream_frames_events_and_heartbeats():
+    async def scenario():
+        stream = events.sse_stream(7, heartbeat=0.05)
+        frames = [await stream.__anext__()]
+        events.broker.publish(7, {"type": "platform.created", "data": {"id": 1}})
+        events.broker.publish(8, {"type": "platform.created", "data": {"id": 2}})
+        frames.append(await stream.__anext__())
+        frames.append(await stream.__anext__())
+        subscribers = events.broker.stats()["subscribers"]
+        await stream.aclose()
+        return frames, subscribers
+
+    frames, subscribers = asyncio.run(scenario())
+    assert frames[0] == ": connected\n\n"
+    assert frames[1] == 'event: platform.created\ndata: {"id": 1}\n\n'
+    assert frames[2].startswith(": keepalive")
+    assert subscribers == 1
+    assert events.broker.stats()["subscribers"] == 0
+
+
+def test_full_broker_refuses_streams(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(events.broker, "max_subscribers", 0)
+    response = client.get("/events/", headers=auth_headers)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_brokers_sharing_a_backend_fan_out_across_workers():
+    backend = events.LocalEventBackend()
+    publisher = events.EventBroker(backend, queue_size=10, max_subscribers=10)
+    listener = events.EventBroker(backend, queue_size=10, max_subscribers=10)
+
+    async def scenario():
+        subscription = listener.subscribe(1)
+        publisher.publish(1, {"type": "platform.deleted", "data": {"id": 3}})
+        return await asyncio.wait_for(subscription.get(), 1)
+
+    assert asyncio.run(scenario()) == {"type": "platform.deleted", "data": {"id": 3}}
+    assert listener.stats()["delivered"] == 1
+
+
+def test_slow_subscriber_is_told_to_resync():
+    broker = events.EventBroker(
+        events.LocalEventBackend(), queue_size=2, max_subscribers=1
+    )
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        with pytest.raises(HTTPException):
+            broker.subscribe(2)
+        for index in range(5):
+            broker.publish(1, {"type": "transaction.created", "data": {"id": index}})
+        await asyncio.sleep(0)
+        received = [subscription.queue.get_nowait()]
+        return received, subscription.queue.empty(), subscription.overflows
+
+    received, empty, overflows = asyncio.run(scenario())
+    assert received == [events.RESYNC] and empty
+    assert overflows == 2
+
+
+def test_oversized_payload_becomes_resync():
+    backend = events.LocalEventBackend()
+    backend.max_payload = 200
+    broker = events.EventBroker(backend, queue_size=10, max_subscribers=10)
+
+    async def scenario():
+        subscription = broker.subscribe(1)
+        broker.publish(1, {"type": "assets.changed", "data": {"deltas": ["x"] * 100}})
+        return await asyncio.wait_for(subscription.get(), 1)
+
+    assert asyncio.run(scenario()) == events.RESYNC
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import hashing, models
+from app.config import settings
+from app.hashing import PasswordHasher, password_hasher
+
+CREDENTIALS = {"email": "bob@example.com", "password": "correct-horse-battery"}
+
+
+def _stored_hash(db):
+    db.expire_all()
+    return (
+        db.query(models.User)
+        .filter_by(email=CREDENTIALS["email"])
+        .one()
+        .hashed_password
+    )
+
+
+def test_login_rehashes_when_rounds_change(client, db, monkeypatch):
+    assert client.post("/users/", json=CREDENTIALS).status_code == 200
+    assert _stored_hash(db).startswith("$2b$04$")
+
+    wrong = {**CREDENTIALS, "password": "wrong-password"}
+    assert client.post("/token/", json=wrong).status_code == 401
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 5)
+    assert client.post("/token/", json=wrong).status_code == 401
+    assert _stored_hash(db).startswith("$2b$04$")
+
+    response = client.post("/token/", json=CREDENTIALS)
+    assert response.status_code == 200, response.text
+    assert _stored_hash(db).startswith("$2b$05$")
+
+
+def test_saturated_pool_returns_503(client, db, monkeypatch):
+    assert client.post("/users/", json=CREDENTIALS).status_code == 200
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+
+    response = client.post("/token/", json=CREDENTIALS)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert password_hasher.stats()["rejected"] >= 1
+
+
+def test_process_pool_hashes_and_limits_pending():
+    hasher = PasswordHasher(workers=1, max_pending=1, retry_after=3)
+
+    async def scenario():
+        first = asyncio.ensure_future(hasher.hash("secret"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await hasher.hash("other")
+        hashed = await first
+        verified, new_hash = await hasher.verify_and_update("secret", hashed)
+        return rejected.value, hashed, verified, new_hash
+
+    try:
+        rejected, hashed, verified, new_hash = asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+
+    assert rejected.status_code == 503
+    assert rejected.headers == {"Retry-After": "3"}
+    assert verified and new_hash is None
+    # Hashed in the pool with the configured cost factor.
+    rounds = settings.BCRYPT_ROUNDS
+    assert hashing.verify_and_update_sync("secret", hashed, rounds)[0]
+    assert not hashing.verify_and_update_sync("other", hashed, rounds)[0]
+    assert hashed.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert hasher.stats()["pending"] == 0
@@ -0,0 +1,156 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import history, models
+
+
+def _post(client, auth_headers, platform, day, **fields):
+    payload = {
+        "platform_id": platform.id,
+        "asset_name": "BTC",
+        "cost_asset": "usd",
+        "date": datetime(2024, 1, day, 12).isoformat(),
+    }
+    payload.update(fields)
+    response = client.post("/transactions/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _history(client, auth_headers, **params):
+    params = {"date_from": "2024-01-01", "date_to": "2024-01-07", **params}
+    response = client.get("/assets/history", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return {
+        (series["asset_name"], series["cost_asset"]): [
+            pytest.approx(point["total_amount"]) for point in series["points"]
+        ]
+        for series in response.json()
+    }
+
+
+def _snapshots(db):
+    return {
+        (row.asset_name, row.cost_asset, row.day): (row.id, row.total_amount)
+        for row in db.query(models.HoldingSnapshot)
+    }
+
+
+def test_history_carries_balances_forward(client, db, user, platform, auth_headers):
+    _post(
+        client,
+        auth_headers,
+        platform,
+        2,
+        amount=1000,
+        transaction_type="DEPOSIT",
+        asset_name="USD",
+        cost_asset=None,
+    )
+    _post(client, auth_headers, platform, 3, amount=1, cost=400, transaction_type="BUY")
+    _post(
+        client, auth_headers, platform, 5, amount=0.5, cost=300, transaction_type="SELL"
+    )
+
+    assert _history(client, auth_headers) == {
+        ("btc", "usd"): [0, 0, 1, 1, 0.5, 0.5, 0.5],
+        ("usd", ""): [0, 1000, 600, 600, 900, 900, 900],
+    }
+    weekly = _history(client, auth_headers, interval="week", date_to="2024-01-10")
+    assert weekly[("btc", "usd")] == [0.5, 0.5]
+    assert _history(client, auth_headers, asset_name="BTC").keys() == {("btc", "usd")}
+
+    response = client.get(
+        "/assets/history",
+        params={"date_from": "2000-01-01", "date_to": "2024-01-01"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+
+def test_backdated_edits_only_rewrite_later_days(
+    client, db, user, platform, auth_headers
+):
+    _post(client, auth_headers, platform, 1, amount=1, transaction_type="DEPOSIT")
+    _post(client, auth_headers, platform, 2, amount=1, transaction_type="DEPOSIT")
+    moved = _post(
+        client, auth_headers, platform, 6, amount=2, transaction_type="DEPOSIT"
+    )
+    removed = _post(
+        client, auth_headers, platform, 6, amount=4, transaction_type="DEPOSIT"
+    )
+    before = _snapshots(db)
+
+    response = client.put(
+        f"/transactions/{moved['id']}",
+        json={**moved, "date": datetime(2024, 1, 4).isoformat()},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    response = client.delete(f"/transactions/{removed['id']}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+    after = _snapshots(db)
+    for day in (date(2024, 1, 1), date(2024, 1, 2)):
+        assert after[("btc", "usd", day)] == before[("btc", "usd", day)]
+    assert _history(client, auth_headers)[("btc", "usd")] == [1, 2, 2, 4, 4, 4, 4]
+
+    history.rebuild(db, user.id)
+    db.commit()
+    assert {key: value[1] for key, value in _snapshots(db).items()} == {
+        key: value[1] for key, value in after.items()
+    }
+
+
+def test_import_fills_snapshots(client, db, user, platform, auth_headers):
+    body = "".join(
+        f'{{"asset_name": "eth", "amount": 1, "transaction_type": "DEPOSIT", '
+        f'"date": "2024-01-0{day}T00:00:00", "platform_id": {platform.id}}}\n'
+        for day in (3, 1, 3, 5)
+    )
+    response = client.post(
+        "/transactions/import",
+        content=body,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+
+    assert _history(client, auth_headers)[("eth", "")] == [1, 1, 3, 3, 4, 4, 4]
+
+
+def test_undated_writes_only_touch_the_base_rows(
+    client, db, user, platform, auth_headers
+):
+    for day in range(1, 7):
+        _post(client, auth_headers, platform, day, amount=1, transaction_type="DEPOSIT")
+    before = _snapshots(db)
+
+    undated = _post(
+        client,
+        auth_headers,
+        platform,
+        1,
+        amount=10,
+        transaction_type="DEPOSIT",
+        date=None,
+    )
+    response = client.put(
+        f"/transactions/{undated['id']}",
+        json={**undated, "amount": 20},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+
+    # The dated rows are left alone and one base row holds the undated amount.
+    after = _snapshots(db)
+    assert after.keys() - before.keys() == {("btc", "usd", history.BASE_DAY)}
+    assert {key: after[key] for key in before} == before
+    assert after[("btc", "usd", history.BASE_DAY)][1] == 20
+    assert _history(client, auth_headers)[("btc", "usd")] == [21, 22, 23, 24, 25, 26, 26]
+
+    history.rebuild(db, user.id)
+    db.commit()
+    assert {key: value[1] for key, value in _snapshots(db).items()} == {
+        key: value[1] for key, value in after.items()
+    }
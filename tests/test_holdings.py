@@ -0,0 +1,111 @@
+import pytest
+
+from app import crud, holdings
+from app.routers.assets import calculate_real_assets
+
+
+def _post(client, auth_headers, platform, **fields):
+    payload = {"platform_id": platform.id, "cost": None, "cost_asset": None}
+    payload.update(fields)
+    response = client.post("/transactions/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _sorted(assets):
+    return [
+        {**asset, "total_amount": pytest.approx(asset["total_amount"])}
+        for asset in sorted(assets, key=lambda a: (a["asset_name"], a["cost_asset"]))
+    ]
+
+
+def test_assets_match_full_replay(client, db, user, platform, auth_headers):
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="USD",
+        amount=1000,
+        transaction_type="DEPOSIT",
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="BTC",
+        amount=0.5,
+        cost=300,
+        cost_asset="usd",
+        transaction_type="BUY",
+    )
+    sell = _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="BTC",
+        amount=0.1,
+        cost=80,
+        cost_asset="usd",
+        transaction_type="SELL",
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="ETH",
+        amount=2,
+        transaction_type="AIRDROP",
+    )
+    withdraw = _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="ETH",
+        amount=1,
+        transaction_type="WITHDRAW",
+    )
+
+    response = client.put(
+        f"/transactions/{sell['id']}",
+        json={**sell, "amount": 0.2, "cost": 150},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert (
+        client.delete(
+            f"/transactions/{withdraw['id']}", headers=auth_headers
+        ).status_code
+        == 200
+    )
+
+    response = client.get("/assets/", headers=auth_headers)
+    assert response.status_code == 200
+
+    db.expire_all()
+    expected = calculate_real_assets(crud.get_assets_by_user(db, user.id))
+    assert _sorted(response.json()) == _sorted(expected)
+    assert holdings.verify(db) == []
+
+
+def test_verify_reports_drift_and_rebuild_fixes_it(
+    client, db, user, platform, auth_headers
+):
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="BTC",
+        amount=1,
+        transaction_type="DEPOSIT",
+    )
+    db.query(holdings.models.Holding).update({"total_amount": 5})
+    db.commit()
+
+    drift = holdings.verify(db, user.id)
+    assert len(drift) == 1
+    assert drift[0]["stored_amount"] == 5
+    assert drift[0]["expected_amount"] == 1
+
+    holdings.rebuild(db, user.id)
+    db.commit()
+    assert holdings.verify(db, user.id) == []
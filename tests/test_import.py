@@ -0,0 +1,69 @@
+import json
+
+from app import crud, holdings
+from app.routers.assets import calculate_real_assets
+
+CSV = """asset_name,amount,cost,cost_asset,date,transaction_type,platform_id,contract_type
+BTC,0.5,300,usd,2024-01-01T00:00:00,BUY,{platform},
+ETH,2,,,2024-01-02T00:00:00,DEPOSIT,{platform},"multi
+line"
+x,1,,,,DEPOSIT,{platform},
+BTC,0.1,80,usd,,SELL,999,
+BTC,0.1,80,usd,,NOPE,{platform},
+"""
+
+
+def test_csv_import_reports_row_errors(client, db, user, platform, auth_headers):
+    response = client.post(
+        "/transactions/import",
+        content=CSV.format(platform=platform.id),
+        headers={**auth_headers, "Content-Type": "text/csv"},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert result["failed"] == 3
+    assert [error["row"] for error in result["errors"]] == [3, 4, 5]
+    assert "asset_name" in result["errors"][0]["errors"][0]
+    assert result["errors"][1]["errors"] == ["platform_id: platform not found"]
+
+    listed = client.get("/transactions/", headers=auth_headers).json()
+    assert [t["contract_type"] for t in listed] == [None, "multi\nline"]
+    assert holdings.verify(db) == []
+
+
+def test_ndjson_import_updates_holdings(client, db, user, platform, auth_headers):
+    rows = [
+        {"asset_name": "usd", "amount": 100, "transaction_type": "DEPOSIT"},
+        {
+            "asset_name": "sol",
+            "amount": 3,
+            "cost": 60,
+            "cost_asset": "usd",
+            "transaction_type": "BUY",
+        },
+    ]
+    body = "\n".join(json.dumps({**row, "platform_id": platform.id}) for row in rows)
+    body += "\nnot json\n"
+
+    response = client.post(
+        "/transactions/import",
+        content=body,
+        headers={**auth_headers, "Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.json()["inserted"] == 2
+    assert response.json()["errors"][0]["row"] == 3
+    assets = client.get("/assets/", headers=auth_headers).json()
+    expected = calculate_real_assets(crud.get_assets_by_user(db, user.id))
+    assert sorted(assets, key=str) == sorted(expected, key=str)
+
+
+def test_unknown_content_type_is_rejected(client, auth_headers):
+    response = client.post(
+        "/transactions/import",
+        content="whatever",
+        headers={**auth_headers, "Content-Type": "text/plain"},
+    )
+    assert response.status_code == 415
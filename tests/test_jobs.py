@@ -0,0 +1,207 @@
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app import jobs, models
+from app.config import settings
+from app.database import SessionLocal
+
+
+def _work() -> int:
+    return jobs.work(SessionLocal, "test-worker", once=True)
+
+
+def _job(client, auth_headers, job_id) -> dict:
+    response = client.get(f"/jobs/{job_id}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_repeated_rebuilds_collapse_into_one_job(client, db, platform, auth_headers):
+    first = client.post("/jobs/rebuild", headers=auth_headers)
+    second = client.post("/jobs/rebuild", headers=auth_headers)
+
+    assert first.status_code == second.status_code == 202
+    job_id = first.json()["id"]
+    assert second.json()["id"] == job_id
+    assert first.headers["Location"] == f"/jobs/{job_id}"
+    assert first.json()["status"] == "QUEUED"
+
+    assert _work() == 1
+    job = _job(client, auth_headers, job_id)
+    assert job["status"] == "SUCCEEDED"
+    assert job["progress"] == 1
+    assert job["attempts"] == 1
+    assert set(job["result"]) == {"holdings", "history_platforms", "positions"}
+
+    # Once finished, a new trigger queues a new job.
+    third = client.post("/jobs/rebuild", headers=auth_headers)
+    assert third.json()["id"] != job_id
+    assert [job["id"] for job in client.get("/jobs/", headers=auth_headers).json()] == [
+        third.json()["id"],
+        job_id,
+    ]
+
+
+def test_imports_run_in_the_background(client, db, platform, auth_headers):
+    body = (
+        "platform_id,asset_name,amount,transaction_type,date\n"
+        f"{platform.id},btc,1.5,DEPOSIT,2024-01-02T00:00:00\n"
+        f"{platform.id},eth,3,DEPOSIT,2024-01-03T00:00:00\n"
+        f"{platform.id},btc,oops,DEPOSIT,2024-01-04T00:00:00\n"
+    )
+    headers = {**auth_headers, "Content-Type": "text/csv"}
+    response = client.post("/jobs/import", content=body, headers=headers)
+    assert response.status_code == 202, response.text
+    again = client.post("/jobs/import", content=body, headers=headers)
+    assert again.json()["id"] == response.json()["id"]
+    assert client.get("/transactions/", headers=auth_headers).json() == []
+
+    assert _work() == 1
+
+    job = _job(client, auth_headers, response.json()["id"])
+    assert job["status"] == "SUCCEEDED"
+    assert job["result"]["inserted"] == 2
+    assert job["result"]["failed"] == 1
+    assert len(client.get("/transactions/", headers=auth_headers).json()) == 2
+    assert db.get(models.Job, job["id"]).input is None
+
+
+def test_import_rejects_unknown_formats(client, auth_headers):
+    response = client.post(
+        "/jobs/import",
+        content="x",
+        headers={**auth_headers, "Content-Type": "text/plain"},
+    )
+    assert response.status_code == 415
+
+
+def test_failed_jobs_are_retried_until_out_of_attempts(db, user, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_SECONDS", 0)
+    runs = []
+
+    def flaky(session, context):
+        runs.append(context.attempt)
+        if len(runs) < 2:
+            raise RuntimeError("transient")
+        return {"runs": len(runs)}
+
+    def broken(session, context):
+        raise RuntimeError("permanent")
+
+    monkeypatch.setitem(jobs.handlers, "flaky", flaky)
+    monkeypatch.setitem(jobs.handlers, "broken", broken)
+    flaky_job, _ = jobs.enqueue(db, "flaky", owner_id=user.id)
+    broken_job, _ = jobs.enqueue(db, "broken", owner_id=user.id, dedup_key="broken")
+
+    assert _work() == 2 + settings.JOB_MAX_ATTEMPTS
+
+    db.expire_all()
+    assert runs == [1, 2]
+    assert flaky_job.status == models.JobStatus.SUCCEEDED
+    assert flaky_job.result == {"runs": 2}
+    assert broken_job.status == models.JobStatus.FAILED
+    assert broken_job.attempts == settings.JOB_MAX_ATTEMPTS
+    assert "RuntimeError: permanent" in broken_job.error
+    assert broken_job.dedup_key is None
+
+
+def test_jobs_of_a_vanished_worker_are_requeued(db, user):
+    job, _ = jobs.enqueue(db, "rebuild", owner_id=user.id)
+    claimed = jobs.claim(db, "worker-a")
+    assert claimed.id == job.id
+    assert jobs.claim(db, "worker-b") is None
+
+    claimed = db.get(models.Job, job.id)
+    claimed.heartbeat_at = datetime.utcnow() - timedelta(
+        seconds=settings.JOB_LEASE_SECONDS + 1
+    )
+    db.commit()
+    assert jobs.requeue_expired(db) == 1
+
+    assert jobs.claim(db, "worker-b").attempts == 2
+
+
+def test_jobs_are_private(client, db, user, auth_headers):
+    other = models.User(email="mallory@example.com", hashed_password="unused")
+    db.add(other)
+    db.commit()
+    job, _ = jobs.enqueue(db, "rebuild", owner_id=other.id)
+
+    assert client.get(f"/jobs/{job.id}", headers=auth_headers).status_code == 404
+    assert client.get("/jobs/").status_code == 401
+
+
+def test_cli_queues_and_runs_a_rebuild(db, user, capsys):
+    assert jobs.main(["enqueue", "rebuild", "--user-id", str(user.id)]) == 0
+    assert jobs.main(["enqueue", "rebuild", "--user-id", str(user.id)]) == 0
+    assert jobs.main(["worker", "--once"]) == 0
+
+    output = capsys.readouterr().out
+    assert "Queued: job" in output
+    assert "Already queued: job" in output
+    assert "Ran 1 jobs" in output
+
+
+def test_a_worker_that_lost_its_lease_does_not_commit_its_import(
+    db, user, platform, monkeypatch
+):
+    body = (
+        "platform_id,asset_name,amount,transaction_type\n"
+        f"{platform.id},btc,1,DEPOSIT\n"
+    )
+    job, _ = jobs.enqueue(
+        db, "import", owner_id=user.id, payload={"format": "csv"}, input=body.encode()
+    )
+    claimed = jobs.claim(db, "worker-a")
+    importer = jobs.handlers["import"]
+
+    async def stalled(session, context):
+        # worker-a stalls past its lease and worker-b takes the job over
+        # before worker-a's import completes.
+        other = SessionLocal()
+        try:
+            other.execute(
+                update(models.Job).values(
+                    heartbeat_at=datetime.utcnow()
+                    - timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+                )
+            )
+            other.commit()
+            assert jobs.requeue_expired(other) == 1
+            assert jobs.claim(other, "worker-b") is not None
+        finally:
+            other.close()
+        return await importer(session, context)
+
+    monkeypatch.setitem(jobs.handlers, "import", stalled)
+    assert not jobs.run_job(claimed, "worker-a", SessionLocal)
+    monkeypatch.setitem(jobs.handlers, "import", importer)
+    assert db.query(models.Transaction).count() == 0
+
+    assert jobs.run_job(db.get(models.Job, job.id), "worker-b", SessionLocal)
+    db.expire_all()
+    assert db.query(models.Transaction).count() == 1
+    assert db.get(models.Job, job.id).status == models.JobStatus.SUCCEEDED
+
+
+def test_the_lease_is_renewed_while_a_handler_runs(db, user, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.3)
+
+    def slow(session, context):
+        time.sleep(0.6)
+        other = SessionLocal()
+        try:
+            return {"requeued": jobs.requeue_expired(other)}
+        finally:
+            other.close()
+
+    monkeypatch.setitem(jobs.handlers, "slow", slow)
+    job, _ = jobs.enqueue(db, "slow", owner_id=user.id)
+
+    assert _work() == 1
+    db.expire_all()
+    assert job.status == models.JobStatus.SUCCEEDED
+    assert job.result == {"requeued": 0}
+    assert job.attempts == 1
@@ -0,0 +1,55 @@
+import logging
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app import lifespan
+from app.config import settings
+from app.main import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_does_not_touch_the_database(tmp_path):
+    # The directory does not exist, so any connection attempt would fail.
+    url = f"sqlite:///{tmp_path}/missing/cwd.db"
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.main"],
+        cwd=ROOT,
+        env={**os.environ, "DATABASE_URL": url, "ASYNC_DATABASE": "false"},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert not (tmp_path / "missing").exists()
+
+
+def test_startup_warms_the_pools_and_shutdown_releases_them(db, stats_headers):
+    engine = lifespan.serving_engines()[0]
+    getattr(engine, "sync_engine", engine).dispose()
+    expected = min(settings.DB_POOL_WARMUP, settings.DB_POOL_SIZE)
+
+    with TestClient(app) as client:
+        assert engine.pool.checkedin() == expected
+        startup = client.get("/stats/", headers=stats_headers).json()["startup"]
+        assert startup["warmed_connections"] == expected
+        assert startup["warmup_s"] >= 0
+
+    assert engine.pool.checkedin() == 0
+
+
+def test_an_unreachable_database_does_not_block_startup(
+    db, tmp_path, monkeypatch, caplog
+):
+    unreachable = create_engine(f"sqlite:///{tmp_path}/missing/cwd.db")
+    monkeypatch.setattr(lifespan, "serving_engines", lambda: [unreachable])
+
+    with caplog.at_level(logging.WARNING, logger="app.lifespan"):
+        with TestClient(app) as client:
+            assert client.get("/").status_code == 200
+
+    assert lifespan.startup_stats["warmed_connections"] == 0
+    assert "Could not warm the connection pool" in caplog.text
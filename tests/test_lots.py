@@ -0,0 +1,250 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import crud, lots, models, schemas
+
+
+def _post(client, auth_headers, platform, **fields):
+    payload = {
+        "platform_id": platform.id,
+        "asset_name": "BTC",
+        "cost_asset": "usd",
+    }
+    payload.update(fields)
+    response = client.post("/transactions/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _cost_basis(client, auth_headers, method, asset_name="btc"):
+    response = client.get(
+        "/assets/cost-basis", params={"method": method}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    (position,) = [
+        position
+        for position in response.json()
+        if position["asset_name"] == asset_name
+    ]
+    return position
+
+
+def _positions(db, user_id):
+    return {
+        (position.asset_name, position.cost_asset, position.method): (
+            pytest.approx(position.quantity),
+            pytest.approx(position.cost_basis),
+            pytest.approx(position.realized_proceeds),
+            pytest.approx(position.realized_cost_basis),
+        )
+        for position in db.query(models.Position).filter(
+            models.Position.owner_id == user_id
+        )
+    }
+
+
+def test_cost_basis_methods(client, db, user, platform, auth_headers):
+    day = datetime(2024, 1, 1)
+    _post(
+        client,
+        auth_headers,
+        platform,
+        amount=1,
+        cost=100,
+        transaction_type="BUY",
+        date=day.isoformat(),
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        amount=1,
+        cost=300,
+        transaction_type="BUY",
+        date=(day + timedelta(days=1)).isoformat(),
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        amount=1.5,
+        cost=600,
+        transaction_type="SELL",
+        date=(day + timedelta(days=2)).isoformat(),
+    )
+
+    fifo = _cost_basis(client, auth_headers, "FIFO")
+    assert fifo["quantity"] == pytest.approx(0.5)
+    assert fifo["cost_basis"] == pytest.approx(150)
+    assert fifo["realized_cost_basis"] == pytest.approx(250)
+    assert fifo["realized_pnl"] == pytest.approx(350)
+
+    lifo = _cost_basis(client, auth_headers, "LIFO")
+    assert lifo["cost_basis"] == pytest.approx(50)
+    assert lifo["realized_pnl"] == pytest.approx(250)
+
+    average = _cost_basis(client, auth_headers, "AVERAGE")
+    assert average["average_cost"] == pytest.approx(200)
+    assert average["realized_pnl"] == pytest.approx(300)
+
+    # Once replayed, appending a later transaction is applied incrementally.
+    _post(
+        client,
+        auth_headers,
+        platform,
+        amount=0.5,
+        cost=250,
+        transaction_type="SELL",
+        date=(day + timedelta(days=3)).isoformat(),
+    )
+    stale = db.query(models.Position).filter(models.Position.stale.is_(True))
+    assert stale.count() == 0
+    fifo = _cost_basis(client, auth_headers, "FIFO")
+    assert fifo["quantity"] == pytest.approx(0)
+    assert fifo["realized_pnl"] == pytest.approx(450)
+
+
+def test_backdated_writes_replay_before_commit(
+    client, db, user, platform, auth_headers
+):
+    day = datetime(2024, 1, 2)
+    _post(
+        client,
+        auth_headers,
+        platform,
+        amount=1,
+        cost=200,
+        transaction_type="BUY",
+        date=day.isoformat(),
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        amount=1,
+        cost=100,
+        transaction_type="BUY",
+        date=(day - timedelta(days=1)).isoformat(),
+    )
+    stale = db.query(models.Position).filter(models.Position.stale.is_(True))
+    assert stale.count() == 0
+
+    # Reads do not replay: a position left stale stays stale.
+    db.query(models.Position).update({"stale": True})
+    db.commit()
+    fifo = _cost_basis(client, auth_headers, "FIFO")
+    assert fifo["quantity"] == pytest.approx(2)
+    assert fifo["cost_basis"] == pytest.approx(300)
+    assert stale.count() == db.query(models.Position).count()
+
+
+def test_incremental_updates_match_replay(db, user, platform):
+    rng = random.Random(7)
+    day = datetime(2024, 1, 1)
+    for n in range(200):
+        # Every tenth transaction is backdated, which forces a replay.
+        date = day + timedelta(hours=n if n % 10 else n - 50)
+        crud.create_transaction(
+            db,
+            schemas.TransactionCreate(
+                asset_name=rng.choice(["btc", "eth"]),
+                amount=rng.uniform(0.1, 2),
+                cost=rng.uniform(10, 100),
+                cost_asset="usd",
+                date=date,
+                transaction_type=rng.choice(
+                    ["BUY", "BUY", "SELL", "DEPOSIT", "WITHDRAW"]
+                ),
+                platform_id=platform.id,
+            ),
+            user.id,
+        )
+        if n % 25 == 0:
+            lots.refresh(db, user.id)
+            db.commit()
+    lots.refresh(db, user.id)
+    db.commit()
+
+    incremental = _positions(db, user.id)
+    lots.rebuild(db, user.id)
+    db.commit()
+    assert _positions(db, user.id) == incremental
+
+
+def test_trades_move_the_cost_asset_position(
+    client, db, user, platform, auth_headers
+):
+    day = datetime(2024, 1, 1)
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="USDT",
+        cost_asset=None,
+        amount=1000,
+        cost=1000,
+        transaction_type="DEPOSIT",
+        date=day.isoformat(),
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        cost_asset="USDT",
+        amount=1,
+        cost=400,
+        transaction_type="BUY",
+        date=(day + timedelta(days=1)).isoformat(),
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        cost_asset="USDT",
+        amount=0.5,
+        cost=300,
+        transaction_type="SELL",
+        date=(day + timedelta(days=2)).isoformat(),
+    )
+
+    usdt = _cost_basis(client, auth_headers, "FIFO", "usdt")
+    assert usdt["quantity"] == pytest.approx(900)
+    assert usdt["cost_basis"] == pytest.approx(600)
+    assert usdt["realized_proceeds"] == 0
+
+    held = {
+        (holding.asset_name, holding.cost_asset): holding.total_amount
+        for holding in db.query(models.Holding).filter(
+            models.Holding.owner_id == user.id
+        )
+    }
+    for method in ("FIFO", "LIFO", "AVERAGE"):
+        response = client.get(
+            "/assets/cost-basis", params={"method": method}, headers=auth_headers
+        )
+        positions = {
+            (position["asset_name"], position["cost_asset"]): position["quantity"]
+            for position in response.json()
+        }
+        assert positions == pytest.approx(held)
+
+    # A replay from the history lands on the same positions.
+    incremental = _positions(db, user.id)
+    lots.rebuild(db, user.id)
+    db.commit()
+    assert _positions(db, user.id) == incremental
+
+
+def test_deleted_history_drops_positions(client, db, user, platform, auth_headers):
+    transaction = _post(
+        client, auth_headers, platform, amount=1, cost=100, transaction_type="BUY"
+    )
+    assert _cost_basis(client, auth_headers, "FIFO")["quantity"] == 1
+
+    response = client.delete(f"/transactions/{transaction['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    response = client.get("/assets/cost-basis", headers=auth_headers)
+    assert response.json() == []
+    assert db.query(models.Lot).count() == 0
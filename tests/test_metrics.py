@@ -0,0 +1,128 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import metrics
+from app.config import settings
+from app.database import SessionLocal
+
+
+def _sample(body: str, prefix: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{prefix} not in /metrics")
+
+
+def test_requests_are_recorded_by_route_template(client, platform, auth_headers):
+    route = "/platforms/{platform_id}"
+    before = metrics.requests_total.value("GET", route, "200")
+    queries_before = metrics.request_queries.sum("GET", route)
+
+    assert (
+        client.get(f"/platforms/{platform.id}", headers=auth_headers).status_code == 200
+    )
+    # The user lookup and the platform query.
+    assert metrics.request_queries.sum("GET", route) - queries_before == 2
+    assert client.get("/platforms/999", headers=auth_headers).status_code == 404
+    assert client.get("/no-such-page").status_code == 404
+
+    assert metrics.requests_total.value("GET", route, "200") == before + 1
+    assert metrics.requests_total.value("GET", route, "404") >= 1
+    assert metrics.requests_total.value("GET", "unmatched", "404") >= 1
+    assert metrics.requests_in_flight.value() == 0
+
+
+def test_metrics_endpoint_speaks_prometheus(
+    client, platform, auth_headers, stats_headers
+):
+    client.get("/platforms/", headers=auth_headers)
+    response = client.get("/metrics", headers=stats_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    count = _sample(
+        body, 'http_request_duration_seconds_count{method="GET",route="/platforms/"}'
+    )
+    inf = _sample(
+        body,
+        'http_request_duration_seconds_bucket{method="GET",route="/platforms/",le="+Inf"}',
+    )
+    assert count == inf >= 1
+    # Numbers from GET /stats/ are exported as gauges too.
+    assert _sample(body, 'cwd_pool_checked_out{pool="sync"}') >= 0
+    assert "cwd_user_cache_hits " in body
+    assert "cwd_read_routing_primary_unconfigured " in body
+    assert "/metrics" not in client.get("/openapi.json").json()["paths"]
+
+
+def test_server_timing_is_opt_in(client, platform, auth_headers, monkeypatch):
+    assert (
+        "server-timing" not in client.get("/platforms/", headers=auth_headers).headers
+    )
+
+    monkeypatch.setattr(settings, "SERVER_TIMING", True)
+    header = client.get("/platforms/", headers=auth_headers).headers["server-timing"]
+    db, app = header.split(", ")
+    assert db.startswith("db;dur=") and db.endswith('desc="2 queries"')
+    assert app.startswith("app;dur=")
+
+
+def _probe_app(repeat: int) -> TestClient:
+    probe = FastAPI()
+    probe.add_middleware(metrics.MetricsMiddleware)
+
+    @probe.get("/probe/{n}")
+    def run(n: int):
+        db = SessionLocal()
+        try:
+            for _ in range(repeat):
+                db.execute(text("SELECT 1")).scalar()
+        finally:
+            db.close()
+        return {}
+
+    return TestClient(probe)
+
+
+def test_repeated_selects_are_flagged(db, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 3)
+    before = metrics.n_plus_one.value("/probe/{n}")
+
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        _probe_app(repeat=2).get("/probe/1")
+        assert metrics.n_plus_one.value("/probe/{n}") == before
+        _probe_app(repeat=3).get("/probe/1")
+
+    assert metrics.n_plus_one.value("/probe/{n}") == before + 1
+    assert "Possible N+1 on GET /probe/{n}: ran 3 times: SELECT 1" in caplog.text
+
+
+def test_slow_statements_are_logged_and_counted(db, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+    before = metrics.slow_queries.value("/probe/{n}")
+
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        _probe_app(repeat=2).get("/probe/1")
+
+    assert metrics.slow_queries.value("/probe/{n}") == before + 2
+    assert "Slow statement" in caplog.text
+    assert "route /probe/{n}): SELECT 1" in caplog.text
+
+
+def test_histogram_rendering():
+    histogram = metrics.Histogram("t_seconds", "Test.", ("path",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe('a"b', value=value)
+
+    assert histogram.samples() == [
+        't_seconds_bucket{path="a\\"b",le="0.1"} 2',
+        't_seconds_bucket{path="a\\"b",le="1"} 3',
+        't_seconds_bucket{path="a\\"b",le="+Inf"} 4',
+        't_seconds_sum{path="a\\"b"} 3.65',
+        't_seconds_count{path="a\\"b"} 4',
+    ]
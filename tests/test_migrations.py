@@ -0,0 +1,53 @@
+import os
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect
+
+from app import models
+from app.config import settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_migrations_match_models(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+
+    command.upgrade(config, "head")
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            context = MigrationContext.configure(connection)
+            assert compare_metadata(context, models.Base.metadata) == []
+    finally:
+        engine.dispose()
+
+    command.downgrade(config, "base")
+
+
+def test_initial_revision_is_the_pre_migration_schema(tmp_path, monkeypatch):
+    # Databases created by create_all before migrations existed are stamped
+    # with 0001, so it must create exactly the tables those versions had.
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+
+    command.upgrade(config, "0001")
+    engine = create_engine(url)
+    try:
+        assert set(inspect(engine).get_table_names()) == {
+            "alembic_version",
+            "platforms",
+            "transactions",
+            "users",
+        }
+        command.upgrade(config, "head")
+        assert "holdings" in inspect(engine).get_table_names()
+    finally:
+        engine.dispose()
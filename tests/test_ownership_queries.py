@@ -0,0 +1,146 @@
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+from app import database, holdings, models
+
+TRANSACTION = {
+    "asset_name": "btc",
+    "amount": 1,
+    "cost": 100,
+    "cost_asset": "usd",
+    "transaction_type": "BUY",
+}
+
+
+@contextlib.contextmanager
+def _statements():
+    engine = database.async_engine.sync_engine if database.async_engine else None
+    engine = engine or database.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def _count(client, auth_headers, method, path, **kwargs):
+    with _statements() as statements:
+        response = client.request(method, path, headers=auth_headers, **kwargs)
+    return response, statements
+
+
+@pytest.fixture
+def foreign(db):
+    other = models.User(email="mallory@example.com", hashed_password="unused")
+    db.add(other)
+    db.flush()
+    platform = models.Platform(
+        name="Elsewhere", platform_type=models.PlatformType.EXCHANGE, owner_id=other.id
+    )
+    db.add(platform)
+    db.flush()
+    transaction = models.Transaction(
+        **{**TRANSACTION, "transaction_type": models.TransactionType.BUY},
+        platform_id=platform.id,
+        owner_id=other.id,
+    )
+    db.add(transaction)
+    holdings.apply_transaction(db, transaction)
+    db.commit()
+    return {"transactions": transaction.id, "platforms": platform.id}
+
+
+@pytest.fixture
+def owned(client, db, platform, auth_headers):
+    response = client.post(
+        "/transactions/",
+        json={**TRANSACTION, "platform_id": platform.id},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    return {"transactions": response.json()["id"], "platforms": platform.id}
+
+
+def _body(resource, platform_id):
+    if resource == "transactions":
+        return {**TRANSACTION, "amount": 3, "platform_id": platform_id}
+    return {"name": "Renamed", "platform_type": "EXCHANGE"}
+
+
+# Statements per successful request. Each route touches its own table once,
+# except a transaction update, which reads the old row for the holdings,
+# lots and snapshot deltas; writes also bump the user's data version and the
+# rest is derived-state maintenance.
+EXPECTED = {
+    ("GET", "transactions"): 1,
+    ("PUT", "transactions"): 20,
+    ("DELETE", "transactions"): 17,
+    ("GET", "platforms"): 1,
+    ("PUT", "platforms"): 2,
+    ("DELETE", "platforms"): 7,
+}
+
+
+@pytest.mark.parametrize("method, resource", sorted(EXPECTED))
+def test_owned_route_statement_count(
+    client, db, platform, auth_headers, owned, method, resource
+):
+    path = f"/{resource}/{owned[resource]}"
+    kwargs = {}
+    if method == "PUT":
+        kwargs["json"] = _body(resource, platform.id)
+    response, statements = _count(client, auth_headers, method, path, **kwargs)
+    assert response.status_code == 200, response.text
+    assert len(statements) == EXPECTED[method, resource]
+
+
+@pytest.mark.parametrize("method, resource", sorted(EXPECTED))
+def test_denied_routes_keep_404_and_403(
+    client, db, platform, auth_headers, foreign, method, resource
+):
+    name = resource[:-1]
+    action = {"GET": "view", "PUT": "update", "DELETE": "delete"}[method]
+    kwargs = {"json": _body(resource, platform.id)} if method == "PUT" else {}
+
+    response = client.request(
+        method, f"/{resource}/999999", headers=auth_headers, **kwargs
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == f"{name.capitalize()} not found"
+
+    response = client.request(
+        method, f"/{resource}/{foreign[resource]}", headers=auth_headers, **kwargs
+    )
+    assert response.status_code == 403
+    assert (
+        response.json()["detail"]
+        == f"You do not have permission to {action} this {name}"
+    )
+
+    db.expire_all()
+    foreign_transaction = db.get(models.Transaction, foreign["transactions"])
+    assert foreign_transaction.amount == 1
+    assert foreign_transaction.platform_id == foreign["platforms"]
+    assert db.get(models.Platform, foreign["platforms"]).name == "Elsewhere"
+    assert holdings.verify(db) == []
+
+
+def test_deleting_a_platform_keeps_its_transactions_without_it(
+    client, db, platform, auth_headers, owned
+):
+    response = client.delete(f"/platforms/{platform.id}", headers=auth_headers)
+    assert response.status_code == 200
+
+    db.expire_all()
+    transaction = db.get(models.Transaction, owned["transactions"])
+    assert transaction is not None
+    assert transaction.platform_id is None
+    assert db.query(models.Holding).count() == 0
+    assert holdings.verify(db) == []
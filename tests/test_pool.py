@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from app.config import settings
+from app.database import InstrumentedQueuePool
+
+
+def test_stats_endpoint_reports_pool_usage(client, auth_headers, stats_headers):
+    assert client.get("/platforms/", headers=auth_headers).status_code == 200
+
+    pools = client.get("/stats/", headers=stats_headers).json()["pool"]
+    pool = pools.get("async", pools["sync"])
+
+    assert pool["checkouts"] > 0
+    assert pool["size"] == settings.DB_POOL_SIZE
+
+
+def test_stats_need_the_stats_token(client, auth_headers, monkeypatch):
+    for path in ("/stats/", "/metrics"):
+        assert client.get(path).status_code == 401
+        assert client.get(path, headers=auth_headers).status_code == 401
+
+    monkeypatch.setattr(settings, "STATS_TOKEN", None)
+    assert client.get("/stats/").status_code == 404
+
+
+def test_checkout_timeouts_are_counted():
+    engine = create_engine(
+        settings.DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.01,
+    )
+    held = engine.connect()
+    try:
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        snapshot = engine.pool.snapshot()
+    finally:
+        held.close()
+        engine.dispose()
+
+    assert snapshot["checked_out"] == 1
+    assert snapshot["checkout_timeouts"] == 1
+    assert snapshot["wait_time_max_s"] >= 0.01
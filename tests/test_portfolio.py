@@ -0,0 +1,120 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from app import portfolio
+from app.models import TransactionType
+
+
+def reference_real_assets(assets: list) -> list:
+    # The original per-row implementation of calculate_real_assets, kept as
+    # the oracle for the vectorized engine.
+    grouped_assets = defaultdict(lambda: {"total_amount": 0, "total_cost": 0})
+
+    for asset in assets:
+        key = (
+            asset["asset_name"],
+            asset["cost_asset"],
+            asset["platform_name"],
+        )
+        transaction_type = asset["transaction_type"].value
+        total_amount = asset["total_amount"]
+        total_cost = asset["total_cost"]
+
+        if transaction_type == TransactionType.DEPOSIT.value:
+            grouped_assets[key]["total_amount"] += total_amount
+        elif transaction_type == TransactionType.BUY.value:
+            grouped_assets[key]["total_amount"] += total_amount
+            grouped_assets[key]["total_cost"] += total_cost
+            if asset["cost_asset"]:
+                cost_key = (asset["cost_asset"], "", asset["platform_name"])
+                grouped_assets[cost_key]["total_amount"] -= total_cost
+        elif transaction_type == TransactionType.SELL.value:
+            grouped_assets[key]["total_amount"] -= total_amount
+            grouped_assets[key]["total_cost"] -= total_cost
+            cost_key = (asset["cost_asset"], "", asset["platform_name"])
+            grouped_assets[cost_key]["total_amount"] += total_cost
+        elif transaction_type == TransactionType.AIRDROP.value:
+            grouped_assets[key]["total_amount"] += total_amount
+        elif transaction_type == TransactionType.WITHDRAW.value:
+            grouped_assets[key]["total_amount"] -= total_amount
+
+    return [
+        {
+            "asset_name": key[0],
+            "cost_asset": key[1],
+            "platform_name": key[2],
+            "total_amount": values["total_amount"],
+            "total_cost": values["total_cost"],
+        }
+        for key, values in grouped_assets.items()
+        if values["total_amount"] > 0
+    ]
+
+
+def _random_rows(rng, count, owners=None):
+    assets = ["btc", "eth", "usd", "eur", "sol", "usdt"]
+    platforms = ["Binance", "Kraken", "Ledger"]
+    rows = []
+    for _ in range(count):
+        row = {
+            "asset_name": rng.choice(assets),
+            "cost_asset": rng.choice(assets + ["", ""]),
+            "transaction_type": rng.choice(list(TransactionType)),
+            "platform_name": rng.choice(platforms),
+            "total_amount": rng.choice(
+                [rng.uniform(0, 10), rng.uniform(0, 1e6), 0.1, 0.2, 0.3, 0]
+            ),
+            "total_cost": rng.choice([rng.uniform(0, 1e4), 0.1, 0]),
+        }
+        if owners:
+            row["owner_id"] = rng.choice(owners)
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_engine_matches_reference_exactly(seed):
+    rng = random.Random(seed)
+    rows = _random_rows(rng, rng.randint(0, 400))
+
+    assert portfolio.compute_assets(rows) == reference_real_assets(rows)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_batch_matches_reference_per_user(seed):
+    rng = random.Random(seed)
+    rows = _random_rows(rng, 1000, owners=[3, 1, 7, 42])
+
+    by_user = portfolio.compute_assets_by_user(rows)
+
+    for owner in {row["owner_id"] for row in rows}:
+        expected = reference_real_assets(
+            [row for row in rows if row["owner_id"] == owner]
+        )
+        assert by_user.get(owner, []) == expected
+
+
+def test_engine_edge_cases():
+    assert portfolio.compute_assets([]) == []
+
+    rows = [
+        {
+            "asset_name": "btc",
+            "cost_asset": "",
+            "transaction_type": TransactionType.SELL,
+            "platform_name": "Binance",
+            "total_amount": 1.0,
+            "total_cost": 5.0,
+        },
+        {
+            "asset_name": "btc",
+            "cost_asset": "",
+            "transaction_type": TransactionType.BUY,
+            "platform_name": "Binance",
+            "total_amount": 3.0,
+            "total_cost": 20.0,
+        },
+    ]
+    assert portfolio.compute_assets(rows) == reference_real_assets(rows)
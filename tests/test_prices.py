@@ -0,0 +1,270 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app import models, prices
+
+
+def _ts(*args) -> float:
+    return prices.to_timestamp(datetime(*args))
+
+
+@pytest.fixture(autouse=True)
+def clear_prices():
+    prices.price_cache.clear()
+    prices.price_store.clear()
+    yield
+    prices.price_cache.clear()
+    prices.price_store.clear()
+
+
+class SlowSource:
+    def __init__(self, quotes, delay=0.05):
+        self.quotes = quotes
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def latest(self, pairs):
+        with self.lock:
+            self.calls.append(list(pairs))
+        time.sleep(self.delay)
+        if isinstance(self.quotes, Exception):
+            raise self.quotes
+        return {pair: self.quotes[pair] for pair in pairs if pair in self.quotes}
+
+
+def _post(client, auth_headers, platform, **fields):
+    payload = {
+        "platform_id": platform.id,
+        "date": datetime(2024, 1, 2, 12).isoformat(),
+        **fields,
+    }
+    response = client.post("/transactions/", json=payload, headers=auth_headers)
+    assert response.status_code == 200, response.text
+
+
+def _portfolio(client, auth_headers, platform):
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="usd",
+        amount=1000,
+        transaction_type="DEPOSIT",
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="btc",
+        cost_asset="usd",
+        amount=2,
+        cost=400,
+        transaction_type="BUY",
+    )
+    _post(
+        client,
+        auth_headers,
+        platform,
+        asset_name="xyz",
+        amount=5,
+        transaction_type="AIRDROP",
+    )
+
+
+def test_price_series_looks_up_the_last_price_at_or_before():
+    series = prices.PriceSeries([(30, 3.0), (10, 1.0)])
+    series.add(20, 2.0)
+    series.add(20, 2.5)
+
+    assert len(series) == 3
+    assert series.at(5) is None
+    assert series.at(10) == 1.0
+    assert series.at(25) == 2.5
+    assert series.at(99) == 3.0
+    assert series.latest() == (30, 3.0)
+    assert series.between(10, 20) == [(10, 1.0), (20, 2.5)]
+
+
+def test_concurrent_misses_share_one_fetch():
+    source = SlowSource({("btc", "usd"): (1.0, 100.0)})
+    cache = prices.PriceCache(source, ttl=60)
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(cache.latest([("btc", "usd"), ("xyz", "usd")]) for _ in range(5))
+        )
+        return results + [await cache.latest([("btc", "usd"), ("xyz", "usd")])]
+
+    results = asyncio.run(scenario())
+
+    assert len(source.calls) == 1
+    assert all(
+        result == {("btc", "usd"): (1.0, 100.0), ("xyz", "usd"): None}
+        for result in results
+    )
+    stats = cache.stats()
+    assert stats["fetches"] == 1
+    assert stats["coalesced"] == 8
+    assert stats["hits"] == 2
+
+
+def test_expired_quotes_are_refetched():
+    source = SlowSource({("btc", "usd"): (1.0, 100.0)}, delay=0)
+    cache = prices.PriceCache(source, ttl=0)
+
+    for _ in range(2):
+        assert asyncio.run(cache.latest([("btc", "usd")])) == {
+            ("btc", "usd"): (1.0, 100.0)
+        }
+
+    assert len(source.calls) == 2
+
+
+def test_a_failed_fetch_is_raised_to_every_waiter():
+    source = SlowSource(RuntimeError("feed down"))
+    cache = prices.PriceCache(source, ttl=60)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(cache.latest([("btc", "usd")]) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+
+    assert [str(result) for result in results] == ["feed down"] * 3
+    assert len(source.calls) == 1
+    assert cache.stats()["errors"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_a_cancelled_caller_does_not_fail_the_others():
+    source = SlowSource({("btc", "usd"): (1.0, 100.0)})
+    cache = prices.PriceCache(source, ttl=60)
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.latest([("btc", "usd")]))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.latest([("btc", "usd")]))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    quotes, cancelled = asyncio.run(scenario())
+
+    assert cancelled
+    assert quotes == {("btc", "usd"): (1.0, 100.0)}
+    assert len(source.calls) == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_ingest_stores_file_prices_once(db, tmp_path, capsys):
+    path = tmp_path / "prices.csv"
+    path.write_text(
+        "asset_name,quote,timestamp,price\n"
+        "BTC,USD,2024-01-01T00:00:00,40000\n"
+        "btc,usd,2024-01-02T00:00:00,42000\n"
+        "eth,usd,2024-01-01T00:00:00,2200\n"
+    )
+
+    assert prices.main(["ingest", "--file", str(path)]) == 0
+    assert "Stored 3 prices for 2 pairs" in capsys.readouterr().out
+    prices.price_store.clear()
+    assert prices.main(["ingest", "--file", str(path)]) == 0
+    assert "Stored 0 prices" in capsys.readouterr().out
+
+    rows = db.query(models.Price).order_by(models.Price.id).all()
+    assert [(row.asset_name, row.timestamp.day, row.price) for row in rows] == [
+        ("btc", 1, 40000),
+        ("btc", 2, 42000),
+        ("eth", 1, 2200),
+    ]
+
+
+def test_stored_series_change_only_when_the_insert_commits(db):
+    store = prices.price_store
+    pair = ("btc", "usd")
+    assert len(store.series(db, [pair])[pair]) == 0
+
+    store.record(db, {pair: [(_ts(2024, 1, 1), 300.0), (_ts(2024, 1, 1), 310.0)]})
+    assert len(store.series(db, [pair])[pair]) == 0
+    db.rollback()
+    assert len(store.series(db, [pair])[pair]) == 0
+
+    assert store.record(db, {pair: [(_ts(2024, 1, 2), 320.0)]}) == 1
+    cached = store.series(db, [pair])[pair]
+    db.commit()
+    assert len(cached) == 0
+    assert store.series(db, [pair])[pair].latest() == (_ts(2024, 1, 2), 320.0)
+
+
+def test_valuation_prices_holdings_at_the_latest_quote(
+    client, db, platform, auth_headers, stats_headers
+):
+    _portfolio(client, auth_headers, platform)
+    prices.price_store.record(
+        db,
+        {
+            ("btc", "usd"): [
+                (_ts(2024, 1, 1), 300.0),
+                (_ts(2024, 1, 3), 350.0),
+            ]
+        },
+    )
+    db.commit()
+
+    response = client.get("/assets/valuation", headers=auth_headers)
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    holdings = {row["asset_name"]: row for row in body["holdings"]}
+    assert body["quote"] == "usd"
+    assert body["market_value"] == pytest.approx(2 * 350 + 600)
+    assert body["unpriced_assets"] == ["xyz"]
+    assert holdings["btc"]["price"] == 350
+    assert holdings["btc"]["priced_at"] == "2024-01-03T00:00:00"
+    assert holdings["btc"]["unrealized_pnl"] == pytest.approx(300)
+    assert holdings["usd"]["market_value"] == pytest.approx(600)
+    assert holdings["xyz"]["market_value"] is None
+
+    response = client.get(
+        "/assets/valuation", params={"quote": "EUR"}, headers=auth_headers
+    )
+    assert response.json()["unpriced_assets"] == ["btc", "usd", "xyz"]
+    assert client.get("/stats/", headers=stats_headers).json()["prices"]["fetches"] == 2
+
+
+def test_valuation_history_prices_each_day_at_its_close(
+    client, db, platform, auth_headers
+):
+    _portfolio(client, auth_headers, platform)
+    prices.price_store.record(
+        db,
+        {
+            ("btc", "usd"): [(_ts(2024, 1, 2, 18), 300.0), (_ts(2024, 1, 4), 500.0)],
+            ("xyz", "usd"): [(_ts(2024, 1, 3), 1.0)],
+        },
+    )
+    db.commit()
+
+    response = client.get(
+        "/assets/valuation/history",
+        params={"date_from": "2024-01-01", "date_to": "2024-01-04"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    points = response.json()["points"]
+    assert [point["market_value"] for point in points] == pytest.approx(
+        [0, 600 + 600, 600 + 600 + 5, 600 + 1000 + 5]
+    )
+    assert [point["unpriced_assets"] for point in points] == [[], ["xyz"], [], []]
+
+
+def test_valuation_requires_authentication(client):
+    assert client.get("/assets/valuation").status_code == 401
@@ -0,0 +1,182 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.config import settings
+from app.rate_limit import (
+    ConcurrencyGate,
+    LocalBucketStore,
+    RateLimiter,
+    RateLimitMiddleware,
+    SharedBucketStore,
+    request_user,
+)
+from app.redis_client import FakeRedis
+from app.routers.stats import collect_stats
+
+
+def _limited_app(limiter: RateLimiter) -> FastAPI:
+    probe = FastAPI()
+
+    @probe.get("/light")
+    async def light():
+        return {"ok": True}
+
+    @probe.get("/heavy")
+    async def heavy():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    probe.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return probe
+
+
+def _limiter(store=None, max_concurrent=8, max_queued=8, timeout=5.0):
+    return RateLimiter(
+        store or LocalBucketStore(max_keys=100),
+        costs={"GET /heavy": 5},
+        expensive=["GET /heavy"],
+        gate=ConcurrencyGate(max_concurrent, max_queued, timeout),
+    )
+
+
+def _bearer(email: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'email': email})}"}
+
+
+def test_users_are_limited_by_their_own_bucket(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_RATE", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_USER_BURST", 10)
+    limiter = _limiter()
+    client = TestClient(_limited_app(limiter))
+    alice, bob = _bearer("alice@example.com"), _bearer("bob@example.com")
+
+    assert client.get("/heavy", headers=alice).status_code == 200
+    assert client.get("/heavy", headers=alice).status_code == 200
+    response = client.get("/light", headers=alice)
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many requests"}
+    assert int(response.headers["Retry-After"]) >= 100
+    assert client.get("/heavy", headers=bob).status_code == 200
+    assert limiter.stats()["limited_user"] == 1
+
+    # A token that fails verification does not spend alice's bucket.
+    forged = {"Authorization": alice["Authorization"][:-2] + "xx"}
+    assert request_user([(b"authorization", forged["Authorization"].encode())]) is None
+    assert client.get("/light", headers=forged).status_code == 200
+
+
+def test_anonymous_clients_are_limited_by_address(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_RATE", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_IP_BURST", 2)
+    limiter = _limiter()
+    client = TestClient(_limited_app(limiter))
+
+    assert client.get("/light").status_code == 200
+    assert client.get("/light").status_code == 200
+    assert client.get("/light").status_code == 429
+    assert limiter.stats()["limited_ip"] == 1
+
+
+def test_buckets_refill_over_time():
+    store = LocalBucketStore(max_keys=2)
+    bucket = [("ip:a", 1000, 5)]
+
+    assert store.take(bucket, 5) == (0, -1)
+    assert store.take(bucket, 5)[0] > 0
+    time.sleep(0.01)
+    assert store.take(bucket, 5) == (0, -1)
+
+    store.take([("ip:b", 1, 5)], 1)
+    store.take([("ip:c", 1, 5)], 1)
+    assert len(store) == 2
+
+
+def test_shared_buckets_are_spent_by_every_worker():
+    client = FakeRedis()
+    worker_a = SharedBucketStore(client)
+    worker_b = SharedBucketStore(client)
+
+    assert worker_a.take([("user:alice", 0.01, 5)], 3) == (0, -1)
+    retry_after, index = worker_b.take([("user:alice", 0.01, 5)], 3)
+    assert 99 < retry_after <= 100 and index == 0
+    assert worker_b.take([("user:bob", 0.01, 5)], 3) == (0, -1)
+
+
+def test_a_request_one_bucket_rejects_takes_nothing_from_the_others():
+    for store in (LocalBucketStore(max_keys=100), SharedBucketStore(FakeRedis())):
+        user, ip = ("user:alice", 0.01, 10), ("ip:a", 0.01, 4)
+
+        assert store.take([user, ip], 3) == (0, -1)
+        retry_after, index = store.take([user, ip], 3)
+        assert retry_after > 0 and index == 1
+        # alice still has 7 tokens from another address.
+        assert store.take([user, ("ip:b", 0.01, 10)], 7) == (0, -1)
+
+
+def test_a_failing_store_admits_requests_and_is_counted(caplog):
+    class BrokenStore:
+        def take(self, buckets, cost):
+            raise ConnectionError("redis is down")
+
+    limiter = _limiter(BrokenStore())
+    client = TestClient(_limited_app(limiter))
+
+    assert client.get("/light").status_code == 200
+    assert client.get("/heavy", headers=_bearer("alice@example.com")).status_code == 200
+    assert limiter.stats()["store_errors"] == 2
+    assert caplog.text.count("Rate limit store failed") == 1
+
+
+def test_gate_queues_then_rejects():
+    async def scenario():
+        gate = ConcurrencyGate(limit=1, max_queued=1, timeout=1)
+        assert await gate.acquire()
+        waiting = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.queued == 1
+        # The queue is full.
+        assert not await gate.acquire()
+        gate.release()
+        assert await waiting
+        assert gate.active == 1 and gate.queued == 0
+
+        gate.timeout = 0.01
+        assert not await gate.acquire()
+        assert gate.queued == 0
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_expensive_routes_beyond_the_cap_get_503():
+    limiter = _limiter(max_concurrent=1, max_queued=0)
+    transport = httpx.ASGITransport(app=_limited_app(limiter))
+
+    async def scenario():
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return await asyncio.gather(
+                client.get("/heavy"), client.get("/heavy"), client.get("/light")
+            )
+
+    responses = asyncio.run(scenario())
+
+    assert sorted(response.status_code for response in responses) == [200, 200, 503]
+    busy = next(response for response in responses if response.status_code == 503)
+    assert busy.headers["Retry-After"] == "1"
+    stats = limiter.stats()
+    assert stats["rejected_busy"] == 1
+    assert stats["expensive_active"] == 0
+
+
+def test_limiter_reports_in_stats():
+    stats = collect_stats()["rate_limit"]
+    assert stats["backend"] in {"LocalBucketStore", "SharedBucketStore"}
+    assert stats["expensive_queued"] == 0
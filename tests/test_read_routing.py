@@ -0,0 +1,152 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+from app.config import settings
+from app.read_routing import read_router
+from app.redis_client import FakeRedis, get_redis
+from app.user_cache import user_cache
+
+
+@pytest.fixture
+def replica(db, monkeypatch):
+    # A second SQLite file stands in for the replica. Nothing replicates to
+    # it, which makes it easy to tell which database answered.
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "replica.db")
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "ReadSessionLocal", factory)
+    async_engine = None
+    if settings.ASYNC_DATABASE:
+        async_engine = create_async_engine(database.async_database_url(url))
+        monkeypatch.setattr(
+            database,
+            "AsyncReadSessionLocal",
+            async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False),
+        )
+    read_router.pins.clear()
+    session = factory()
+    try:
+        yield session
+    finally:
+        session.close()
+        read_router.pins.clear()
+        engine.dispose()
+        if async_engine is not None:
+            async_engine.sync_engine.dispose()
+
+
+def _forget_pins_and_users():
+    read_router.pins.clear()
+    user_cache.clear()
+    if isinstance(get_redis(), FakeRedis):
+        get_redis().flushall()
+
+
+def _copy_user(replica, user):
+    replica.add(models.User(id=user.id, email=user.email, hashed_password="unused"))
+    replica.commit()
+
+
+def _platform_names(client, auth_headers):
+    response = client.get("/platforms/", headers=auth_headers)
+    assert response.status_code == 200
+    return [platform["name"] for platform in response.json()]
+
+
+def _delta(before: dict, after: dict) -> dict:
+    return {
+        key: after[key] - before[key]
+        for key in before
+        if isinstance(before[key], int) and not isinstance(before[key], bool)
+    }
+
+
+def test_list_endpoints_read_from_the_replica(
+    client, user, platform, auth_headers, replica
+):
+    _copy_user(replica, user)
+    replica.add(
+        models.Platform(
+            name="Replica", platform_type=models.PlatformType.EXCHANGE, owner_id=user.id
+        )
+    )
+    replica.commit()
+
+    before = read_router.stats()
+    assert _platform_names(client, auth_headers) == ["Replica"]
+    assert client.get("/transactions/", headers=auth_headers).json() == []
+    assert client.get("/assets/", headers=auth_headers).json() == []
+    lines = client.get("/transactions/?format=ndjson", headers=auth_headers)
+    assert lines.text == ""
+
+    after = read_router.stats()
+    assert after["enabled"] is True
+    assert _delta(before, after)["replica"] == 4
+    assert _delta(before, after)["primary_pinned"] == 0
+
+
+def test_writes_pin_the_user_to_the_primary(
+    client, user, platform, auth_headers, replica
+):
+    _copy_user(replica, user)
+    assert _platform_names(client, auth_headers) == []
+
+    response = client.post(
+        "/platforms/",
+        json={"name": "Kraken", "platform_type": "EXCHANGE"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+
+    before = read_router.stats()
+    assert _platform_names(client, auth_headers) == ["Binance", "Kraken"]
+    lines = client.get("/transactions/?format=ndjson", headers=auth_headers)
+    assert lines.status_code == 200
+    assert _delta(before, read_router.stats())["primary_pinned"] == 2
+
+    # Once the pin runs out, reads go back to the replica.
+    _forget_pins_and_users()
+    assert _platform_names(client, auth_headers) == []
+
+
+def test_failed_writes_do_not_pin(client, user, auth_headers, replica):
+    _copy_user(replica, user)
+    response = client.put(
+        "/platforms/999",
+        json={"name": "Kraken", "platform_type": "EXCHANGE"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
+    assert not read_router.pins.is_pinned(user.id)
+
+
+def test_user_lookup_falls_back_to_the_primary(client, user, auth_headers, replica):
+    before = read_router.stats()
+    assert client.get("/platforms/", headers=auth_headers).status_code == 200
+    assert _delta(before, read_router.stats())["user_lookup_fallbacks"] == 1
+
+    _copy_user(replica, user)
+    _forget_pins_and_users()
+    before = read_router.stats()
+    assert client.get("/platforms/", headers=auth_headers).status_code == 200
+    delta = _delta(before, read_router.stats())
+    assert delta["user_lookup_replica"] == 1
+    assert delta["user_lookup_fallbacks"] == 0
+
+
+def test_without_a_replica_everything_reads_the_primary(
+    client, user, platform, auth_headers
+):
+    before = read_router.stats()
+    assert _platform_names(client, auth_headers) == ["Binance"]
+    after = read_router.stats()
+    assert after["enabled"] is False
+    assert _delta(before, after)["primary_unconfigured"] == 1
+    assert _delta(before, after)["user_lookup_replica"] == 0
@@ -0,0 +1,41 @@
+import time
+
+from app.redis_client import FakeRedis
+from app.revocation import MemoryRevocationStore, SharedRevocationStore
+
+
+def test_logout_revokes_the_token(client, auth_headers):
+    assert client.get("/token/", headers=auth_headers).status_code == 200
+
+    assert client.delete("/token/", headers=auth_headers).status_code == 200
+
+    assert client.get("/token/", headers=auth_headers).status_code == 401
+    assert client.get("/platforms/", headers=auth_headers).status_code == 401
+
+
+def test_memory_store_drops_expired_entries():
+    store = MemoryRevocationStore()
+    store.revoke("expired", time.time() - 1)
+    store.revoke("short", time.time() + 0.05)
+    store.revoke("long", time.time() + 60)
+
+    assert not store.is_revoked("expired")
+    assert store.is_revoked("short")
+
+    time.sleep(0.06)
+    store.prune()
+
+    assert not store.is_revoked("short")
+    assert store.is_revoked("long")
+    assert store.stats()["entries"] == 1
+
+
+def test_shared_store_is_visible_to_every_worker():
+    client = FakeRedis()
+    worker_a = SharedRevocationStore(client)
+    worker_b = SharedRevocationStore(client)
+
+    worker_a.revoke("abc", time.time() + 60)
+
+    assert worker_b.is_revoked("abc")
+    assert not worker_b.is_revoked("def")
@@ -0,0 +1,99 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import TypeAdapter
+
+from app import models, schemas, serialization
+from app.config import settings
+from app.main import app
+
+
+def _seed(db, user, platform, count=50):
+    rng = random.Random(3)
+    start = datetime(2021, 5, 1, 12, 30, 15, 250000)
+    rows = [
+        {
+            "asset_name": rng.choice(["btc", "eth", "sol"]),
+            "contract_type": rng.choice([None, "erc20"]),
+            "amount": rng.choice([1.0, 0.1, 1e-7, 12345.678]),
+            "cost": rng.choice([None, 0.0, 99.99, 1e6]),
+            "cost_asset": rng.choice([None, "usd"]),
+            "date": rng.choice([None, start + timedelta(minutes=n)]),
+            "transaction_type": rng.choice(
+                [models.TransactionType.BUY, models.TransactionType.DEPOSIT]
+            ),
+            "platform_id": platform.id,
+            "owner_id": user.id,
+        }
+        for n in range(count)
+    ]
+    db.execute(models.Transaction.__table__.insert(), rows)
+    db.commit()
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/transactions/",
+        "/transactions/?limit=7&order=asc",
+        "/transactions/?asset_name=btc&limit=5",
+        "/platforms/",
+        "/assets/",
+    ],
+)
+def test_fast_path_matches_validated_responses(
+    client, db, user, platform, auth_headers, monkeypatch, path
+):
+    _seed(db, user, platform)
+    client.post(
+        "/transactions/",
+        json={
+            "asset_name": "btc",
+            "amount": 3,
+            "cost": 10,
+            "cost_asset": "usd",
+            "transaction_type": "BUY",
+            "platform_id": platform.id,
+        },
+        headers=auth_headers,
+    )
+
+    monkeypatch.setattr(settings, "FAST_SERIALIZATION", False)
+    slow = client.get(path, headers=auth_headers)
+    monkeypatch.setattr(settings, "FAST_SERIALIZATION", True)
+    fast = client.get(path, headers=auth_headers)
+
+    assert slow.status_code == fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == slow.json()
+    assert fast.json()
+    for header in ("ETag", "X-Next-Cursor"):
+        assert fast.headers.get(header) == slow.headers.get(header)
+
+
+def test_row_encoder_is_byte_identical_to_pydantic():
+    fields = serialization.transactions.fields
+    rows = [
+        ("btc", None, 1.5, None, "usd", datetime(2020, 1, 2, 3, 4, 5, 123456))
+        + (models.TransactionType.BUY, 1, 2, 3),
+        ("eth", "erc20", 1e-7, 12345678.9, None, None)
+        + (models.TransactionType.WITHDRAW, 1, 3, 3),
+    ]
+    expected = TypeAdapter(list[schemas.TransactionResponse]).dump_json(
+        [
+            schemas.TransactionResponse.model_validate(dict(zip(fields, row)))
+            for row in rows
+        ]
+    )
+    assert serialization.transactions.encode(rows) == expected
+
+
+def test_openapi_still_describes_the_response_models():
+    paths = app.openapi()["paths"]
+    for path, model in (
+        ("/transactions/", "TransactionResponse"),
+        ("/platforms/", "PlatformResponse"),
+    ):
+        schema = paths[path]["get"]["responses"]["200"]["content"]["application/json"]
+        assert schema["schema"]["items"]["$ref"].endswith(f"/{model}")
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, timedelta
+
+from app import models
+
+
+def _seed(db, user, platform, count=7):
+    start = datetime(2024, 1, 1)
+    rows = [
+        models.Transaction(
+            asset_name="btc" if n % 2 else "eth",
+            amount=1 + n,
+            date=None if n == 3 else start + timedelta(days=n % 4),
+            transaction_type=models.TransactionType.DEPOSIT,
+            owner_id=user.id,
+            platform_id=platform.id,
+        )
+        for n in range(count)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
+
+
+def _walk(client, auth_headers, **params):
+    ids, cursor = [], None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/transactions/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        ids += [transaction["id"] for transaction in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+
+def _sort_key(transaction):
+    return (
+        transaction.date is not None,
+        transaction.date or datetime.min,
+        transaction.id,
+    )
+
+
+def test_keyset_pages_cover_every_row_in_order(
+    client, db, user, platform, auth_headers
+):
+    rows = _seed(db, user, platform)
+    ascending = [row.id for row in sorted(rows, key=_sort_key)]
+
+    assert _walk(client, auth_headers, limit=2) == ascending
+    assert _walk(client, auth_headers, limit=3, order="desc") == ascending[::-1]
+
+
+def test_filters(client, db, user, platform, auth_headers):
+    rows = _seed(db, user, platform)
+
+    response = client.get(
+        "/transactions/",
+        params={"asset_name": "BTC", "date_from": "2024-01-02T00:00:00"},
+        headers=auth_headers,
+    )
+
+    expected = {
+        row.id
+        for row in rows
+        if row.asset_name == "btc" and row.date and row.date >= datetime(2024, 1, 2)
+    }
+    assert {transaction["id"] for transaction in response.json()} == expected
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    response = client.get(
+        "/transactions/", params={"cursor": "not-a-cursor"}, headers=auth_headers
+    )
+    assert response.status_code == 400
+
+
+def test_ndjson_stream_matches_json_listing(client, db, user, platform, auth_headers):
+    _seed(db, user, platform)
+
+    listed = client.get("/transactions/", headers=auth_headers).json()
+    streamed = client.get(
+        "/transactions/",
+        headers={**auth_headers, "Accept": "application/x-ndjson"},
+    )
+
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in streamed.text.splitlines()] == listed
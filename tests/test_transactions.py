@@ -1,39 +1,60 @@
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-
-from app import models
-from app.database import SessionLocal, engine
-from app.main import app
-
-client = TestClient(app)
-
+def _transaction(platform, **overrides) -> dict:
+    return {
+        "asset_name": "BTC",
+        "amount": 0.5,
+        "cost": 10000,
+        "cost_asset": "USD",
+        "transaction_type": "DEPOSIT",
+        "platform_id": platform.id,
+        **overrides,
+    }
+
+
+def test_create_transaction(client, user, platform, auth_headers):
+    response = client.post(
+        "/transactions/", json=_transaction(platform), headers=auth_headers
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["asset_name"] == "btc"
+    assert body["cost_asset"] == "usd"
+    assert body["amount"] == 0.5
+    assert body["transaction_type"] == "DEPOSIT"
+    assert body["owner_id"] == user.id
+    assert body["platform_id"] == platform.id
+
+
+def test_transaction_round_trip(client, platform, auth_headers):
+    created = client.post(
+        "/transactions/", json=_transaction(platform), headers=auth_headers
+    ).json()
+    path = f"/transactions/{created['id']}"
+
+    assert client.get(path, headers=auth_headers).json() == created
+    assert client.get("/transactions/", headers=auth_headers).json() == [created]
+
+    updated = client.put(
+        path, json=_transaction(platform, amount=2), headers=auth_headers
+    )
+    assert updated.status_code == 200
+    assert updated.json() == {**created, "amount": 2.0}
 
-def override_get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    assert client.delete(path, headers=auth_headers).status_code == 200
+    assert client.get(path, headers=auth_headers).status_code == 404
+    assert client.get("/transactions/", headers=auth_headers).json() == []
 
 
-app.dependency_overrides[get_db] = override_get_db
+def test_invalid_transactions_are_rejected(client, platform, auth_headers):
+    for overrides in ({"amount": 0}, {"asset_name": "x"}, {"cost": -1}):
+        response = client.post(
+            "/transactions/",
+            json=_transaction(platform, **overrides),
+            headers=auth_headers,
+        )
+        assert response.status_code == 422, overrides
 
 
-def test_create_transaction():
-    response = client.post(
-        "/transactions/",
-        json={
-            "name": "Bitcoin Deposit",
-            "symbol": "BTC",
-            "platform": "Binance",
-            "platform_type": "exchange",
-            "blockchain": "Bitcoin",
-            "holding": 0.5,
-            "cost": 10000,
-            "cost_asset": "USD",
-            "transaction_type": "deposit",
-        },
-    )
-    assert response.status_code == 200
-    assert response.json()["name"] == "Bitcoin Deposit"
+def test_transactions_require_a_token(client, platform):
+    assert client.get("/transactions/").status_code == 401
+    response = client.post("/transactions/", json=_transaction(platform))
+    assert response.status_code == 401
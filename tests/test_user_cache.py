@@ -0,0 +1,66 @@
+from sqlalchemy import event
+
+from app import database
+from app.redis_client import FakeRedis
+from app.schemas import UserResponse
+from app.user_cache import SharedUserCacheBackend, UserCache, user_cache
+
+
+def _count_user_queries(client, auth_headers, requests: int) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = database.async_engine or database.engine
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for _ in range(requests):
+            assert client.get("/platforms/", headers=auth_headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    # The list endpoints also read users.data_version for their ETag; only the
+    # lookup by email done for authentication is what the cache saves.
+    return sum("WHERE users.email" in statement for statement in statements)
+
+
+def test_authenticated_requests_hit_the_cache(client, auth_headers):
+    hits = user_cache.hits
+
+    assert _count_user_queries(client, auth_headers, 3) == 1
+    assert user_cache.hits - hits == 2
+
+
+def test_user_changes_invalidate_the_cache(client, db, user, auth_headers):
+    client.get("/platforms/", headers=auth_headers)
+    assert user_cache.get(user.email) is not None
+
+    user.hashed_password = "changed"
+    db.commit()
+
+    assert user_cache.get("alice@example.com") is None
+
+
+def test_deleted_user_is_rejected(client, db, user, auth_headers):
+    client.get("/platforms/", headers=auth_headers)
+
+    db.delete(user)
+    db.commit()
+
+    assert client.get("/platforms/", headers=auth_headers).status_code == 401
+
+
+def test_shared_backend_is_consistent_across_workers():
+    client = FakeRedis()
+    worker_a = UserCache(SharedUserCacheBackend(client, ttl=60))
+    worker_b = UserCache(SharedUserCacheBackend(client, ttl=60))
+    user = UserResponse(id=7, email="bob@example.com")
+
+    worker_a.set(user.email, user)
+    assert worker_b.get(user.email) == user
+
+    worker_b.invalidate(user.email)
+    assert worker_a.get(user.email) is None
+    assert worker_a.stats()["hits"] == 0
+    assert worker_b.stats()["hits"] == 1